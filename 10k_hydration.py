@@ -1,110 +1,296 @@
-import fitz
-import camelot
-import re
+import hashlib
+import json
 import os
-from elasticsearch import Elasticsearch
-from sentence_transformers import SentenceTransformer
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import camelot
+import fitz
+from elasticsearch import helpers
+from searchiq.backends import connect
+from searchiq.cache import IngestGenerations
+from searchiq.chunking import Chunker
+from searchiq.dedup import Deduplicator
+from searchiq.embedding_service import get_encoder
+from searchiq.indexing import bulk_index
+from searchiq.suggest import replace_actions
+from searchiq.terms import TermStats
+from searchiq.vectors import supported_mode, vector_mapping
 
 # === CONFIGURATION ===
 pdf_path = "10-Q4-2024-As-Filed.pdf"
 es_host = "http://localhost:9200"
 es_index = "sec-filings"
 embedding_dim = 384  # For all-MiniLM-L6-v2
-
-# === LOAD EMBEDDING MODEL ===
-model = SentenceTransformer('all-MiniLM-L6-v2')
-
-# === CONNECT TO ELASTICSEARCH ===
-es = Elasticsearch(es_host)
-
-# === CREATE INDEX WITH VECTOR MAPPING IF NEEDED ===
-if not es.indices.exists(index=es_index):
-    es.indices.create(index=es_index, body={
-        "mappings": {
-            "properties": {
-                "filename": {"type": "keyword"},
-                "section_title": {"type": "text"},
-                "section_content": {"type": "text"},
-                "section_page": {"type": "integer"},
-                "section_content_vector": {"type": "dense_vector", "dims": embedding_dim},
-                "tables": {
-                    "type": "nested",
-                    "properties": {
-                        "table_title": {"type": "text"},
-                        "table_data": {"type": "object"},
-                        "table_vector": {"type": "dense_vector", "dims": embedding_dim}
-                    }
-                }
-            }
-        }
-    })
-
-filename = os.path.basename(pdf_path)
-doc = fitz.open(pdf_path)
-page_texts = [page.get_text() for page in doc]
-full_text = "\n".join(page_texts)
+table_flavors = ("stream", "lattice")
+table_cache_dir = os.path.join(".cache", "tables")
+table_pages_per_task = 8
+table_workers = os.cpu_count() or 2
 
 section_pattern = re.compile(
     r'(Item\s+\d+[A-Z]?(?:\.\d+)?\.?.*?)(?=\n\s*Item\s+\d+[A-Z]?(?:\.\d+)?\.?|$)',
     re.IGNORECASE | re.DOTALL
 )
 
-# Extract tables once for all pages (to avoid repeated extraction)
-tables_stream = camelot.read_pdf(pdf_path, pages="all", flavor="stream")
-tables_lattice = camelot.read_pdf(pdf_path, pages="all", flavor="lattice")
-all_tables = tables_stream + tables_lattice
-
-# Build a mapping from page number to tables
-page_to_tables = {}
-for table in all_tables:
-    page_num = table.page
-    table_title = " | ".join(table.data[0]) if table.data else "Extracted Table"
-    table_str = "\n".join(["\t".join(row) for row in table.data])
-    table_obj = {
-        "table_title": table_title,
-        "table_data": table.data,
-        "table_str": table_str
+stage_times = {}
+
+
+@contextmanager
+def stage(name):
+    """Time a pipeline stage and print how long it took."""
+    start = time.perf_counter()
+    yield
+    stage_times[name] = time.perf_counter() - start
+    print(f"[{name}] {stage_times[name]:.2f}s")
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_tables(path, pages, flavor):
+    """Extract tables from one page range (runs in a worker process)."""
+    tables = []
+    for table in camelot.read_pdf(path, pages=pages, flavor=flavor):
+        tables.append({
+            "page": int(table.page),
+            "table_title": " | ".join(table.data[0]) if table.data else "Extracted Table",
+            "table_data": table.data,
+            "table_str": "\n".join(["\t".join(row) for row in table.data])
+        })
+    return tables
+
+
+def extract_tables(path, page_count, pdf_hash):
+    """Extract tables for every flavor across a process pool, cached on disk per PDF hash and flavor."""
+    os.makedirs(table_cache_dir, exist_ok=True)
+    ranges = [
+        f"{start}-{min(start + table_pages_per_task - 1, page_count)}"
+        for start in range(1, page_count + 1, table_pages_per_task)
+    ]
+    all_tables = []
+    pending = {}
+    with ProcessPoolExecutor(max_workers=table_workers) as pool:
+        for flavor in table_flavors:
+            cache_path = os.path.join(table_cache_dir, f"{pdf_hash}-{flavor}.json")
+            if os.path.exists(cache_path):
+                with open(cache_path) as f:
+                    all_tables.extend(json.load(f))
+                print(f"Loaded {flavor} tables from cache")
+            else:
+                pending[flavor] = (cache_path, [pool.submit(read_tables, path, pages, flavor) for pages in ranges])
+
+        for flavor, (cache_path, futures) in pending.items():
+            tables = [table for future in futures for table in future.result()]
+            with open(cache_path, "w") as f:
+                json.dump(tables, f)
+            all_tables.extend(tables)
+    return all_tables
+
+
+def find_sections(page_texts):
+    """Split the filing into "Item N." sections with their starting page, title and content."""
+    full_text = "\n".join(page_texts)
+    sections = []
+    for match in section_pattern.finditer(full_text):
+        section_text = match.group(0).strip()
+        # Find which page this section starts on
+        for i, page in enumerate(page_texts):
+            if section_text[:20] in page:
+                section_page = i + 1
+                break
+        else:
+            section_page = None
+        lines = section_text.splitlines()
+        title = " ".join(lines[:2]).strip() if len(lines) > 1 and len(lines[0]) < 20 else lines[0]
+        content = "\n".join(lines[1:]).strip() if len(lines) > 1 else ""
+        # "n" is the section's position in the filing; its doc ids keep it even if earlier sections are dropped
+        sections.append({"n": len(sections), "title": title, "content": content, "page": section_page})
+    return sections
+
+
+def term_stats(page_texts, sections):
+    """Term statistics for the filing's suggestions, with each section title counted on its first page."""
+    titles = {}
+    for section in sections:
+        titles.setdefault(section["page"], []).append(section["title"])
+    stats = TermStats()
+    for i, text in enumerate(page_texts):
+        stats.add_page(i, text, titles.get(i + 1, []))
+    return stats
+
+
+def section_id(filename, n, chunk_index=0):
+    return f"{filename}-section-{n}-chunk-{chunk_index}"
+
+
+def drop_duplicates(filename, sections, dedup):
+    """Mark sections that near-duplicate an indexed one (boilerplate, repeated disclaimers).
+
+    Marked sections aren't embedded; with DEDUP_MODE=skip they aren't indexed at all.
+    """
+    for section in sections:
+        section["duplicate_of"] = dedup.canonical(section_id(filename, section["n"]), section["content"])
+    if dedup.skips:
+        return [section for section in sections if not section["duplicate_of"]]
+    return sections
+
+
+def reference_action(filename, section):
+    """A duplicate section's stand-in: where it is and which section holds its content."""
+    return {
+        "_index": es_index,
+        "_id": section_id(filename, section["n"]),
+        "_source": {
+            "filename": filename,
+            "section_title": section["title"],
+            "section_page": section["page"],
+            "duplicate_of": section["duplicate_of"]["doc_id"],
+            "duplicate_file": section["duplicate_of"]["file_name"]
+        }
     }
-    page_to_tables.setdefault(page_num, []).append(table_obj)
-
-# Sequentially process and upload each section
-for match in section_pattern.finditer(full_text):
-    section_text = match.group(0).strip()
-    # Find which page this section starts on
-    for i, page in enumerate(page_texts):
-        if section_text[:20] in page:
-            section_page = i + 1
-            break
-    else:
-        section_page = None
-    lines = section_text.splitlines()
-    title = " ".join(lines[:2]).strip() if len(lines) > 1 and len(lines[0]) < 20 else lines[0]
-    content = "\n".join(lines[1:]).strip() if len(lines) > 1 else ""
-
-    # Embed section content
-    section_vector = model.encode(content or "", normalize_embeddings=True).tolist()
-
-    # Get tables for this section's page and embed them
-    tables_with_vectors = []
-    for t in page_to_tables.get(section_page, []):
-        table_vector = model.encode(t["table_str"] or "", normalize_embeddings=True).tolist()
-        tables_with_vectors.append({
+
+
+def build_actions(filename, sections, page_to_tables, encoder, chunker):
+    """Embed all section chunks and tables in two batched calls and return one bulk action per chunk."""
+    for section in sections:
+        if section.get("duplicate_of"):
+            section["chunks"] = []
+            continue
+        section["chunks"] = chunker.sentence_chunks(section["content"]) or [section["content"]]
+
+    chunk_texts = [chunk for section in sections for chunk in section["chunks"]]
+    table_texts = [t["table_str"] or "" for tables in page_to_tables.values() for t in tables]
+    chunk_vectors = iter(encoder.encode(chunk_texts, normalize=True))
+    table_vectors = iter(encoder.encode(table_texts, normalize=True))
+
+    tables_with_vectors = {
+        page: [{
             "table_title": t["table_title"],
             "table_data": t["table_data"],
-            "table_vector": table_vector
+            "table_vector": next(table_vectors)
+        } for t in tables]
+        for page, tables in page_to_tables.items()
+    }
+
+    actions = []
+    for section in sections:
+        if section.get("duplicate_of"):
+            actions.append(reference_action(filename, section))
+            continue
+        # One document per chunk; the section's tables ride on its first chunk
+        for chunk_index, chunk in enumerate(section["chunks"]):
+            actions.append({
+                "_index": es_index,
+                "_id": section_id(filename, section["n"], chunk_index),
+                "_source": {
+                    "filename": filename,
+                    "section_title": section["title"],
+                    "section_content": chunk,
+                    "section_page": section["page"],
+                    "chunk_index": chunk_index,
+                    "section_content_vector": next(chunk_vectors),
+                    "tables": tables_with_vectors.get(section["page"], []) if chunk_index == 0 else []
+                }
+            })
+    return actions
+
+
+def indexed_ids(es, filename):
+    """Ids of the docs an earlier run indexed for ``filename``."""
+    if not es.indices.exists(index=es_index):
+        return set()
+    hits = helpers.scan(es, index=es_index, query={"query": {"term": {"filename": filename}}, "_source": False})
+    return {hit["_id"] for hit in hits}
+
+
+def stale_actions(previous_ids, actions):
+    """Deletes for docs of an earlier run that this one didn't write again.
+
+    Chunk ids are positional, so a section that now splits into fewer chunks (or a
+    section that's gone) would otherwise keep its old trailing chunks.
+    """
+    written = {action["_id"] for action in actions}
+    for doc_id in sorted(previous_ids - written):
+        yield {"_op_type": "delete", "_index": es_index, "_id": doc_id}
+
+
+def main():
+    # === LOAD EMBEDDING MODEL ===
+    with stage("load model"):
+        encoder = get_encoder()
+        # Chunks sized to the model's input window, never crossing a section boundary
+        chunker = Chunker.for_model(encoder.model)
+
+    # === CONNECT TO ELASTICSEARCH (or the local backend, see SEARCH_BACKEND) ===
+    es = connect(es_host)
+
+    # === CREATE INDEX WITH VECTOR MAPPING IF NEEDED ===
+    if not es.indices.exists(index=es_index):
+        es.indices.create(index=es_index, body={
+            "mappings": {
+                "properties": {
+                    "filename": {"type": "keyword"},
+                    "section_title": {"type": "text"},
+                    "section_content": {"type": "text"},
+                    "section_page": {"type": "integer"},
+                    "chunk_index": {"type": "integer"},
+                    "duplicate_of": {"type": "keyword"},
+                    "duplicate_file": {"type": "keyword"},
+                    "section_content_vector": vector_mapping(embedding_dim, mode=supported_mode(es)),
+                    "tables": {
+                        "type": "nested",
+                        "properties": {
+                            "table_title": {"type": "text"},
+                            "table_data": {"type": "object"},
+                            "table_vector": {"type": "dense_vector", "dims": embedding_dim}
+                        }
+                    }
+                }
+            }
         })
 
-    doc_body = {
-        "filename": filename,
-        "section_title": title,
-        "section_content": content,
-        "section_page": section_page,
-        "section_content_vector": section_vector,
-        "tables": tables_with_vectors
-    }
+    filename = os.path.basename(pdf_path)
+    with stage("extract text"):
+        doc = fitz.open(pdf_path)
+        page_texts = [page.get_text() for page in doc]
+        page_count = doc.page_count
+        doc.close()
+        sections = find_sections(page_texts)
+
+    with stage("extract tables"):
+        page_to_tables = {}
+        for table in extract_tables(pdf_path, page_count, file_hash(pdf_path)):
+            page_to_tables.setdefault(table["page"], []).append(table)
+
+    with stage("dedup"):
+        dedup = Deduplicator(es_index, filename)
+        sections = drop_duplicates(filename, sections, dedup)
+
+    with stage("embed"):
+        actions = build_actions(filename, sections, page_to_tables, encoder, chunker)
+
+    with stage("bulk index"):
+        previous_ids = indexed_ids(es, filename)
+        success, failed = bulk_index(es, actions)
+        removed, _ = bulk_index(es, stale_actions(previous_ids, actions))
+
+    with stage("suggestions"):
+        stats = term_stats(page_texts, sections)
+        suggested, _ = bulk_index(es, replace_actions(es, es_index, {es_index}, filename, stats))
+    # Cached searches of the index, in the web app or elsewhere, are now stale
+    IngestGenerations().record(es, es_index)
+
+    print(f"Indexed {success} chunks from {len(sections)} sections ({failed} failed), "
+          f"{dedup.duplicates} near-duplicate sections, {removed} stale chunks removed, {suggested} suggestions.")
+    print("Stage timings: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in stage_times.items()))
 
-    # Upload to Elasticsearch
-    es.index(index=es_index, body=doc_body)
-    print(f"Uploaded section: {title}")
 
-print("All sections processed and uploaded sequentially.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+# benchmark.py
+#
+# Reproducible ingestion and query-latency benchmark that needs no network and no
+# cluster. Synthetic PDFs are generated with PyMuPDF, the web app's ingestion
+# path (run_hydration) and search path (/semantic-search through Flask's test
+# client) run against an in-process Elasticsearch stand-in that records bulk
+# payloads, and the numbers are saved as JSON for comparing runs.
+#
+#   python benchmark.py --pages 200 --words-per-page 400 --output before.json
+#   python benchmark.py --pages 200 --words-per-page 400 --output after.json --compare before.json
+#   python benchmark.py --fake-encoder        # leave the model out to isolate app overhead
+#
+# Search latency covers query building, query encoding, the (instant) stand-in
+# search and response rendering; it says nothing about a real cluster's speed.
+
+import argparse
+import atexit
+import fnmatch
+import hashlib
+import html
+import itertools
+import json
+import math
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import fitz  # PyMuPDF
+from elasticsearch import NotFoundError
+from elasticsearch.serializer import JSONSerializer
+
+# === Config ===
+VECTOR_DIM = 384
+BENCH_INDEX = "bench"
+BENCH_FILE = "bench.pdf"
+VOCABULARY = [
+    "revenue", "growth", "operating", "income", "quarter", "company", "risk", "market", "customers",
+    "cloud", "services", "margin", "expenses", "capital", "liquidity", "cash", "flow", "segment",
+    "international", "products", "demand", "supply", "inventory", "guidance", "fiscal", "year",
+    "the", "and", "of", "to", "in", "for", "with", "on", "by", "from", "increased", "decreased"
+]
+SECTION_TITLES = ["Overview", "Results of Operations", "Liquidity", "Risk Factors", "Outlook", "Segments"]
+QUERY_KINDS = ("lexical", "semantic", "hybrid", "filtered")
+
+
+# === Synthetic PDFs ===
+def sentence(rng, words=14):
+    text = " ".join(rng.choice(VOCABULARY) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def make_pdf(path, pages, words_per_page, seed=0):
+    """Write a PDF whose pages carry ``words_per_page`` words under section headings extract_sections detects."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for i in range(pages):
+        lines = [f"Section {i + 1}: {rng.choice(SECTION_TITLES)}"]
+        words = 0
+        while words < words_per_page:
+            if words and rng.random() < 0.1:
+                lines.append(f"{i + 1}.{rng.randint(1, 9)} {rng.choice(SECTION_TITLES)}")
+            lines.append(sentence(rng))
+            words += 14
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(36, 36, page.rect.width - 36, page.rect.height - 36),
+                            "\n".join(lines), fontsize=max(4, 11 - words_per_page // 150))
+    doc.set_metadata({"title": "Synthetic Benchmark Filing", "author": "benchmark.py"})
+    doc.save(path)
+    doc.close()
+
+
+# === Elasticsearch stand-in ===
+class FakeIndices:
+    def __init__(self, es):
+        self.es = es
+
+    def exists(self, index):
+        return bool(self.es.resolve(index))
+
+    def create(self, index, body=None):
+        body = body or {}
+        self.es.docs[index] = {}
+        self.es.mappings[index] = body.get("mappings", {})
+        self.es.aliases[index] = set((body.get("aliases") or {}).keys())
+
+    def exists_alias(self, name):
+        return any(name in aliases for aliases in self.es.aliases.values())
+
+    def get_alias(self, name=None, index=None):
+        if index is not None:
+            return {index: {"aliases": {alias: {} for alias in self.es.aliases.get(index, ())}}}
+        return {i: {"aliases": {name: {}}} for i, aliases in self.es.aliases.items() if name in aliases}
+
+    def get_mapping(self, index):
+        return {i: {"mappings": self.es.mappings[i]} for i in self.es.resolve(index)}
+
+    def refresh(self, index=None):
+        pass
+
+    def delete(self, index):
+        for i in self.es.resolve(index):
+            self.es.docs.pop(i, None)
+
+
+class FakeElasticsearch:
+    """Just enough of the client for ingestion and search, recording every bulk request.
+
+    Searches return the stored chunk docs in insertion order with synthetic scores
+    and highlights, so the search path is timed without any cluster work.
+    """
+
+    def __init__(self):
+        self.transport = SimpleNamespace(serializer=JSONSerializer())
+        self.indices = FakeIndices(self)
+        self.docs = {}
+        self.mappings = {}
+        self.aliases = {}
+        self.pits = {}
+        self.bulk_requests = 0
+        self.bulk_bytes = 0
+        self.bulk_items = 0
+        self._searchable = {}
+
+    def info(self):
+        return {"version": {"number": "8.11.0"}}
+
+    def resolve(self, names):
+        resolved = []
+        for name in str(names).split(","):
+            for index, aliases in self.aliases.items():
+                if fnmatch.fnmatch(index, name) or name in aliases:
+                    resolved.append(index)
+        return resolved
+
+    def bulk(self, body, **kwargs):
+        self.bulk_requests += 1
+        self.bulk_bytes += len(body.encode("utf-8"))
+        lines = iter(body.splitlines())
+        items = []
+        for line in lines:
+            op, meta = next(iter(json.loads(line).items()))
+            store = self.docs.setdefault(meta["_index"], {})
+            if op == "delete":
+                store.pop(meta["_id"], None)
+                items.append({op: {"_index": meta["_index"], "_id": meta["_id"], "status": 200}})
+                continue
+            if op == "update":
+                store.setdefault(meta["_id"], {}).update(json.loads(next(lines))["doc"])
+                items.append({op: {"_index": meta["_index"], "_id": meta["_id"], "status": 200}})
+                continue
+            store[meta["_id"]] = json.loads(next(lines))
+            items.append({op: {"_index": meta["_index"], "_id": meta["_id"], "status": 201}})
+        self.bulk_items += len(items)
+        self._searchable.clear()
+        return {"took": 0, "errors": False, "items": items}
+
+    def delete_by_query(self, index, body, **kwargs):
+        # Only suggestion cleanup uses it, and benchmark runs start from empty indices
+        return {"deleted": 0}
+
+    def searchable(self, index):
+        if index not in self._searchable:
+            self._searchable[index] = [
+                (i, doc_id, source)
+                for i in self.resolve(index)
+                for doc_id, source in self.docs.get(i, {}).items()
+                if source.get("doc_type") == "chunk"
+            ]
+        return self._searchable[index]
+
+    def search(self, index=None, body=None, **kwargs):
+        body = body or {}
+        if "scroll" in kwargs:
+            # Reconciler scans: every benchmark run starts from an empty index
+            return {"_scroll_id": "bench", "_shards": {"total": 1, "successful": 1, "skipped": 0},
+                    "hits": {"total": {"value": 0}, "hits": []}}
+        if "pit" in body:
+            index = self.pits[body["pit"]["id"]]
+        docs = self.searchable(index)
+        start = body.get("search_after", [0, -1])[1] + 1
+        size = body.get("size", 10)
+        fields = body.get("_source")
+        hits = []
+        for position in range(start, min(start + size, len(docs))):
+            i, doc_id, source = docs[position]
+            score = 1.0 / (1 + position)
+            hits.append({
+                "_index": i,
+                "_id": doc_id,
+                "_score": score,
+                "_source": {k: v for k, v in source.items() if k in fields} if isinstance(fields, list) else source,
+                "highlight": {"content": [html.escape(source.get("content", "")[:150])]},
+                "sort": [score, position]
+            })
+        response = {"took": 0, "hits": {"total": {"value": len(docs)}, "hits": hits}}
+        if "pit" in body:
+            response["pit_id"] = body["pit"]["id"]
+        return response
+
+    def msearch(self, body):
+        return {"responses": [self.search(index=header["index"], body=query)
+                              for header, query in zip(body[::2], body[1::2])]}
+
+    def mget(self, body):
+        found = []
+        for doc in body["docs"]:
+            source = next((self.docs[i].get(doc["_id"]) for i in self.resolve(doc["_index"])
+                           if doc["_id"] in self.docs[i]), None)
+            found.append({"_id": doc["_id"], "found": source is not None, "_source": source})
+        return {"docs": found}
+
+    def get(self, index, id, **kwargs):
+        for i in self.resolve(index):
+            if id in self.docs[i]:
+                return {"_index": i, "_id": id, "_source": self.docs[i][id]}
+        raise NotFoundError(404, "document_missing_exception", {"_id": id})
+
+    def count(self, index):
+        return {"count": sum(len(self.docs[i]) for i in self.resolve(index))}
+
+    def open_point_in_time(self, index, keep_alive, **kwargs):
+        pit_id = f"pit-{len(self.pits)}"
+        self.pits[pit_id] = index
+        return {"id": pit_id}
+
+    def close_point_in_time(self, body):
+        self.pits.pop(body["id"], None)
+
+    def scroll(self, **kwargs):
+        return {"_scroll_id": "bench", "hits": {"hits": []}}
+
+    def clear_scroll(self, **kwargs):
+        pass
+
+
+class HashEncoder:
+    """Deterministic stand-in for the embedding model (``--fake-encoder``)."""
+
+    model = None
+
+    def encode(self, texts, normalize=False, memory=False):
+        return [self._vector(text) for text in texts]
+
+    def encode_query(self, text, normalize=False):
+        return self._vector(text)
+
+    @staticmethod
+    def _vector(text):
+        seed = hashlib.sha256(text.encode("utf-8")).digest()
+        rng = random.Random(seed)
+        return [rng.uniform(-1, 1) for _ in range(VECTOR_DIM)]
+
+
+# === Harness ===
+def load_app(fake_encoder):
+    """Import the web app with empty on-disk caches, optionally without the model."""
+    work_dir = tempfile.mkdtemp(prefix="searchiq-bench-")
+    # The app keeps these SQLite files open until the process exits
+    atexit.register(shutil.rmtree, work_dir, ignore_errors=True)
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(work_dir, "cache.sqlite3")
+    os.environ["DEDUP_INDEX_PATH"] = os.path.join(work_dir, "signatures.sqlite3")
+    os.environ["JOB_STORE_PATH"] = os.path.join(work_dir, "jobs.sqlite3")
+    os.environ["INGEST_GENERATIONS_PATH"] = os.path.join(work_dir, "generations.sqlite3")
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend"))
+    import app as webapp
+    # The app loads its model lazily, so swapping the encoder here avoids loading it at all
+    if fake_encoder:
+        webapp.encoder = HashEncoder()
+    return webapp
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def latency_summary(latencies):
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "mean_ms": round(sum(values) / len(values) * 1000, 2)
+    }
+
+
+def bench_ingest(webapp, pdf_path, pages, runs):
+    """Run the /hydrate ingestion path ``runs`` times against a fresh stand-in each time."""
+    from searchiq.embeddings import EmbeddingCache
+    from searchiq.jobs import Job
+
+    results = []
+    for run in range(runs):
+        es = webapp.es = FakeElasticsearch()
+        if not isinstance(webapp.encoder, HashEncoder) and webapp.encoder.client is None:
+            # Cold cache every run, so each one pays for the model like a first upload
+            webapp.encoder.local.cache = EmbeddingCache(path=None)
+        with tempfile.TemporaryDirectory(prefix="searchiq-bench-") as work_dir:
+            work_path = os.path.join(work_dir, BENCH_FILE)
+            shutil.copy(pdf_path, work_path)  # run_hydration deletes its input
+
+            start = time.perf_counter()
+            outcome = webapp.run_hydration(Job(), work_path, BENCH_FILE, BENCH_INDEX)
+            elapsed = time.perf_counter() - start
+        results.append({
+            "seconds": round(elapsed, 3),
+            "pages_per_sec": round(pages / elapsed, 1),
+            "docs_per_sec": round(es.bulk_items / elapsed, 1),
+            "docs": es.bulk_items,
+            "failed": outcome["failed"],
+            "bulk_requests": es.bulk_requests,
+            "payload_bytes": es.bulk_bytes
+        })
+        print(f"ingest run {run + 1}/{runs}: {results[-1]['pages_per_sec']} pages/sec, "
+              f"{results[-1]['docs_per_sec']} docs/sec, {es.bulk_bytes} payload bytes")
+
+    best = max(results, key=lambda r: r["pages_per_sec"])
+    return {"runs": results, "best": best, "peak_rss_mb": peak_rss_mb()}
+
+
+def query_mix(count, seed=0):
+    """A reproducible list of ``(kind, form fields)`` cycling through lexical, semantic, hybrid and filtered searches."""
+    rng = random.Random(seed)
+    terms = [w for w in VOCABULARY if len(w) > 3]
+    queries = []
+    for kind in itertools.islice(itertools.cycle(QUERY_KINDS), count):
+        text = " ".join(rng.sample(terms, rng.randint(1, 3)))
+        params = {"index": BENCH_INDEX}
+        if kind in ("lexical", "hybrid", "filtered"):
+            params["query"] = text
+        if kind in ("semantic", "hybrid"):
+            params["semantic_query"] = f"how did {text} change"
+        if kind == "filtered":
+            params["doc_type"] = "PDF"
+            params["section"] = rng.choice(SECTION_TITLES)
+        queries.append((kind, params))
+    return queries
+
+
+def bench_queries(webapp, queries, with_cache=False, warmup=10):
+    """Replay ``queries`` through /semantic-search and summarize latency per query kind."""
+    if not with_cache:
+        webapp.result_cache.max_entries = 0
+        webapp.query_vector_cache.max_entries = 0
+    client = webapp.app.test_client()
+    for _, params in queries[:warmup]:
+        client.post("/semantic-search", data=params)
+
+    latencies, errors = {}, 0
+    for kind, params in queries:
+        start = time.perf_counter()
+        response = client.post("/semantic-search", data=params)
+        elapsed = time.perf_counter() - start
+        if response.status_code != 200:
+            errors += 1
+            continue
+        latencies.setdefault(kind, []).append(elapsed)
+
+    summary = {kind: latency_summary(values) for kind, values in latencies.items()}
+    summary["all"] = latency_summary([v for values in latencies.values() for v in values])
+    summary["errors"] = errors
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(previous, current):
+    """Print headline metrics of two result files side by side."""
+    rows = [
+        ("pages/sec", ("ingest", "best", "pages_per_sec")),
+        ("docs/sec", ("ingest", "best", "docs_per_sec")),
+        ("payload bytes", ("ingest", "best", "payload_bytes")),
+        ("peak RSS MB", ("ingest", "peak_rss_mb")),
+        ("query p50 ms", ("queries", "all", "p50_ms")),
+        ("query p95 ms", ("queries", "all", "p95_ms")),
+        ("query p99 ms", ("queries", "all", "p99_ms")),
+    ]
+    print(f"{'metric':<16}{'previous':>14}{'current':>14}{'ratio':>10}")
+    for label, path in rows:
+        old, new = previous, current
+        for key in path:
+            old = (old or {}).get(key)
+            new = (new or {}).get(key)
+        ratio = f"{new / old:.2f}x" if old and new is not None else ""
+        print(f"{label:<16}{old!s:>14}{new!s:>14}{ratio:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ingestion throughput and search latency offline.")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--words-per-page", type=int, default=400, help="text density of the synthetic pages")
+    parser.add_argument("--runs", type=int, default=3, help="ingestion runs (the best one is reported)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--with-cache", action="store_true", help="leave the search caches on while replaying")
+    parser.add_argument("--fake-encoder", action="store_true", help="use hashed vectors instead of the model")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    args = parser.parse_args()
+
+    webapp = load_app(args.fake_encoder)
+    with tempfile.TemporaryDirectory(prefix="searchiq-bench-") as pdf_dir:
+        pdf_path = os.path.join(pdf_dir, f"synthetic-{args.pages}x{args.words_per_page}-{args.seed}.pdf")
+        make_pdf(pdf_path, args.pages, args.words_per_page, seed=args.seed)
+        results = {
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "pdf_bytes": os.path.getsize(pdf_path),
+            "ingest": bench_ingest(webapp, pdf_path, args.pages, args.runs),
+        }
+    results["queries"] = bench_queries(webapp, query_mix(args.queries, args.seed), with_cache=args.with_cache)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
@@ -0,0 +1,188 @@
+# compare_layouts.py
+#
+# Size/throughput comparison between the original index layout (every section doc
+# copies the page doc, two vectors per doc, vectors in _source) and the compact
+# layout in searchiq/layout.py.
+#
+#   python compare_layouts.py 10-Q4-2024-As-Filed.pdf
+#   python compare_layouts.py 10-Q4-2024-As-Filed.pdf --es-host http://localhost:9200
+#
+# Without --es-host only the bulk payloads are measured. With it, both layouts are
+# indexed into throwaway indices to measure indexing throughput and on-disk size.
+
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime
+
+import fitz  # PyMuPDF
+from searchiq.chunking import Chunker
+from searchiq.extraction import extract_page
+from searchiq.layout import SOURCE_EXCLUDES, document_action, index_mapping, page_actions
+
+VECTOR_DIM = 384
+
+LEGACY_MAPPING = {
+    "properties": {
+        "content": {"type": "text"},
+        "vector": {"type": "dense_vector", "dims": VECTOR_DIM, "index": False},
+        "page_number": {"type": "integer"},
+        "file_name": {"type": "keyword"},
+        "file_size": {"type": "long"},
+        "upload_timestamp": {"type": "date"},
+        "total_pages": {"type": "integer"},
+        "title": {"type": "text"},
+        "author": {"type": "text"},
+        "producer": {"type": "text"},
+        "content_length": {"type": "integer"},
+        "has_images": {"type": "boolean"},
+        "page_width": {"type": "float"},
+        "page_height": {"type": "float"},
+        "file_type": {"type": "keyword"},
+        "section": {"type": "keyword"},
+        "section_content": {"type": "text"},
+        "section_vector": {"type": "dense_vector", "dims": VECTOR_DIM, "index": False},
+        "keywords": {"type": "keyword"},
+        "language": {"type": "keyword"},
+        "word_count": {"type": "integer"},
+        "reading_time": {"type": "integer"},
+        "last_modified": {"type": "date"}
+    }
+}
+
+
+def fake_vector():
+    # Same JSON footprint as a real embedding without loading the model
+    return [random.uniform(-0.2, 0.2) for _ in range(VECTOR_DIM)]
+
+
+def legacy_actions(pages, index_name, file_meta):
+    """The layout /hydrate wrote before: a page doc plus a full copy of it per section."""
+    for page_info in pages:
+        text = page_info["text"]
+        word_count = len(text.split())
+        doc_base = {
+            **file_meta,
+            "content": text,
+            "vector": fake_vector(),
+            "page_number": page_info["index"] + 1,
+            "content_length": len(text),
+            "has_images": page_info["has_images"],
+            "page_width": page_info["page_width"],
+            "page_height": page_info["page_height"],
+            "word_count": word_count,
+            "reading_time": max(1, word_count // 200),
+            "keywords": list(set([w for w in text.lower().split() if len(w) > 4]))[:10],
+            "language": "en",
+            "last_modified": file_meta["upload_timestamp"]
+        }
+        yield {"_index": index_name, "_id": f"page-{page_info['index']}", "_source": doc_base}
+        for section in page_info["sections"]:
+            section_vector = fake_vector()
+            yield {
+                "_index": index_name,
+                "_id": f"page-{page_info['index']}-section-{section['name']}",
+                "_source": {
+                    **doc_base,
+                    "section": section["name"],
+                    "section_content": section["content"],
+                    "section_vector": section_vector,
+                    "content": section["content"],
+                    "vector": section_vector
+                }
+            }
+
+
+def compact_actions(pages, index_name, file_meta):
+    yield document_action(index_name, file_meta)
+    for page_info in pages:
+        vectors = iter([fake_vector() for _ in page_info["chunks"]])
+        yield from page_actions(page_info, vectors, index_name, file_meta)
+
+
+def measure(actions, excludes=()):
+    """Build every action and tally doc count, bulk payload bytes and stored _source bytes."""
+    docs = payload_bytes = source_bytes = vector_floats = 0
+    start = time.perf_counter()
+    built = []
+    for action in actions:
+        source = action["_source"]
+        body = json.dumps(source)
+        stored = {k: v for k, v in source.items() if k not in excludes}
+        docs += 1
+        payload_bytes += len(json.dumps({"index": {"_id": action["_id"]}})) + len(body) + 2
+        source_bytes += len(json.dumps(stored))
+        vector_floats += sum(len(v) for k, v in source.items() if k.endswith("vector"))
+        built.append(action)
+    elapsed = time.perf_counter() - start
+    return built, {
+        "docs": docs,
+        "bulk_payload_bytes": payload_bytes,
+        "stored_source_bytes": source_bytes,
+        "vector_floats": vector_floats,
+        "build_seconds": round(elapsed, 3),
+    }
+
+
+def index_and_measure(es, actions, index_name, mapping):
+    from searchiq.indexing import bulk_index
+
+    es.indices.create(index=index_name, body={"mappings": mapping})
+    try:
+        start = time.perf_counter()
+        success, failed = bulk_index(es, actions)
+        elapsed = time.perf_counter() - start
+        es.indices.refresh(index=index_name)
+        es.indices.forcemerge(index=index_name, max_num_segments=1)
+        store = es.indices.stats(index=index_name)["_all"]["primaries"]["store"]["size_in_bytes"]
+        return {
+            "indexed": success,
+            "failed": failed,
+            "index_seconds": round(elapsed, 3),
+            "docs_per_sec": round(success / elapsed, 1) if elapsed else None,
+            "store_size_bytes": store,
+        }
+    finally:
+        es.indices.delete(index=index_name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the legacy and compact index layouts for a PDF.")
+    parser.add_argument("pdf")
+    parser.add_argument("--es-host", help="also index both layouts into temporary indices")
+    args = parser.parse_args()
+
+    random.seed(0)
+    chunker = Chunker()
+    doc = fitz.open(args.pdf)
+    pages = [p for p in (extract_page(i, page, chunker) for i, page in enumerate(doc)) if p]
+    metadata = doc.metadata or {}
+    file_meta = {
+        "file_name": os.path.basename(args.pdf),
+        "file_size": os.path.getsize(args.pdf),
+        "upload_timestamp": datetime.utcnow().isoformat(),
+        "total_pages": doc.page_count,
+        "title": metadata.get("title", ""),
+        "author": metadata.get("author", ""),
+        "producer": metadata.get("producer", ""),
+        "file_type": "PDF"
+    }
+    doc.close()
+
+    legacy_built, legacy = measure(legacy_actions(pages, "layout-legacy", file_meta))
+    compact_built, compact = measure(compact_actions(pages, "layout-compact", file_meta), SOURCE_EXCLUDES)
+
+    if args.es_host:
+        from elasticsearch import Elasticsearch
+
+        es = Elasticsearch(args.es_host)
+        legacy.update(index_and_measure(es, legacy_built, "layout-legacy", LEGACY_MAPPING))
+        compact.update(index_and_measure(es, compact_built, "layout-compact", index_mapping(VECTOR_DIM)))
+
+    print(f"{'metric':<22}{'legacy':>16}{'compact':>16}{'ratio':>10}")
+    for metric in legacy:
+        old, new = legacy[metric], compact.get(metric)
+        ratio = f"{new / old:.2f}x" if isinstance(old, (int, float)) and old and new is not None else ""
+        print(f"{metric:<22}{old!s:>16}{new!s:>16}{ratio:>10}")
@@ -0,0 +1,166 @@
+# consolidate_indices.py
+#
+# Move per-file indices (the original one-index-per-upload storage) into the
+# shared index used when STORAGE_MODE=shared. Doc ids are namespaced by file,
+# docs are routed by file_name, and the old index name is kept as a filtered
+# alias so existing links and scripts that search it keep working.
+#
+#   STORAGE_MODE=shared python consolidate_indices.py report-2023 report-2024
+#   STORAGE_MODE=shared python consolidate_indices.py report-2023 --tenant acme --keep
+#
+# Both layouts are handled: legacy indices (page docs plus a full copy per
+# section) are converted to the compact layout, compact indices are copied with
+# their chunk vectors re-embedded since those are kept out of _source. Copied
+# pages are registered for near-duplicate checks under the shared alias.
+
+import argparse
+
+from elasticsearch import Elasticsearch, helpers
+from migrate_vectors import reembedded_actions
+from searchiq.cache import IngestGenerations
+from searchiq.dedup import REFERENCE, Deduplicator, signature_index
+from searchiq.embedding_service import get_encoder
+from searchiq.indexing import bulk_index
+from searchiq.layout import CHUNK, DOCUMENT, PAGE, supported_index_mapping
+from searchiq.storage import SHARED_INDEX_ALIAS, ensure_index, id_prefix, is_shared, partition_index, routing
+
+ES_HOST = "http://localhost:9200"
+VECTOR_DIM = 384
+
+# File-level fields the legacy layout copied onto every page and section doc
+DOCUMENT_FIELDS = (
+    "file_name", "file_size", "upload_timestamp", "total_pages", "title", "author",
+    "producer", "file_type", "language", "last_modified", "creation_date", "modification_date"
+)
+PAGE_FIELDS = (
+    "content", "page_number", "content_length", "has_images", "page_width", "page_height",
+    "word_count", "reading_time", "keywords"
+)
+
+
+def rehome(action, target):
+    """Point a copied action at the shared index, with a file-scoped id and routing."""
+    source = action["_source"]
+    file_name = source["file_name"]
+    action["_index"] = target
+    action["_id"] = f"{id_prefix(file_name)}{action['_id']}"
+    if source.get("page_id"):
+        source["page_id"] = f"{id_prefix(file_name)}{source['page_id']}"
+    if source.get("duplicate_of"):
+        # Stand-ins point at a page of duplicate_file, whose ids get that file's prefix
+        source["duplicate_of"] = f"{id_prefix(source.get('duplicate_file') or file_name)}{source['duplicate_of']}"
+    action["_routing"] = routing(file_name)
+    return action
+
+
+def registered(actions, signatures=None):
+    """Pass actions through, registering each copied page's text as canonical under the shared alias.
+
+    Later uploads are then checked for near-duplicates against the migrated pages,
+    even if DEDUP_MODE is only turned on after the migration.
+    """
+    dedups = {}
+    for action in actions:
+        source = action["_source"]
+        if source.get("doc_type") == PAGE and source.get("content"):
+            file_name = source["file_name"]
+            if file_name not in dedups:
+                # Any mode but "none" keeps signatures
+                dedups[file_name] = Deduplicator(SHARED_INDEX_ALIAS, file_name, mode=REFERENCE, signatures=signatures)
+            dedups[file_name].register(action["_id"], source["content"])
+        yield action
+
+
+def converted_actions(es, source_index, target):
+    """Convert a legacy index: one document doc per file, page docs without vectors, sections as chunks."""
+    documented = set()
+    for hit in helpers.scan(es, index=source_index, query={"query": {"match_all": {}}}):
+        old = hit["_source"]
+        file_name = old["file_name"]
+        shared = {
+            "file_name": file_name,
+            "file_type": old.get("file_type"),
+            "upload_timestamp": old.get("upload_timestamp"),
+            "doc_title": old.get("title", "")
+        }
+        if file_name not in documented:
+            documented.add(file_name)
+            document = {field: old[field] for field in DOCUMENT_FIELDS if field in old}
+            yield rehome({"_id": DOCUMENT, "_source": {**document, "doc_type": DOCUMENT}}, target)
+
+        page_index = old.get("page_number", 1) - 1
+        if old.get("section"):
+            yield rehome({"_id": hit["_id"], "_source": {
+                **shared,
+                "doc_type": CHUNK,
+                "content": old.get("section_content", old.get("content", "")),
+                "page_id": f"page-{page_index}",
+                "page_number": old.get("page_number"),
+                "section": old["section"],
+                "vector": old.get("section_vector") or old.get("vector")
+            }}, target)
+        else:
+            page = {field: old[field] for field in PAGE_FIELDS if field in old}
+            yield rehome({"_id": hit["_id"], "_source": {**shared, **page, "doc_type": PAGE}}, target)
+
+
+def file_names(es, index_name):
+    response = es.search(index=index_name, body={
+        "size": 0,
+        "aggs": {"files": {"terms": {"field": "file_name", "size": 10000}}}
+    })
+    return [bucket["key"] for bucket in response["aggregations"]["files"]["buckets"]]
+
+
+def consolidate(es, source_index, target, encoder, keep=False):
+    mapping = es.indices.get_mapping(index=source_index)[source_index]["mappings"]
+    files = file_names(es, source_index)
+
+    if mapping.get("properties", {}).get("doc_type"):
+        print(f"Copying compact index '{source_index}' -> '{target}' ({len(files)} files)")
+        actions = (rehome(a, target) for a in reembedded_actions(es, source_index, target, encoder))
+    else:
+        print(f"Converting legacy index '{source_index}' -> '{target}' ({len(files)} files)")
+        actions = converted_actions(es, source_index, target)
+
+    copied, failed = bulk_index(es, registered(actions))
+    if failed:
+        raise SystemExit(f"{failed} documents failed to copy; '{source_index}' left unchanged")
+    es.indices.refresh(index=target)
+    print(f"Copied {copied} documents")
+
+    if keep:
+        IngestGenerations().record(es, target)
+        print(f"Kept '{source_index}'; its name can't become an alias until it is deleted")
+        return
+
+    # A concrete index can't share its name with an alias, so it must go first
+    es.indices.delete(index=source_index)
+    signature_index().forget_scope(source_index)
+    alias = {"filter": {"terms": {"file_name": files}}}
+    if len(files) == 1:
+        alias["routing"] = routing(files[0])
+    es.indices.put_alias(index=target, name=source_index, body=alias)
+    # Stales cached searches of the target, the shared alias and the old name
+    IngestGenerations().record(es, target)
+    print(f"✅ '{source_index}' now aliases its files in '{target}'")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move per-file indices into the shared index.")
+    parser.add_argument("indices", nargs="+", help="per-file indices to consolidate")
+    parser.add_argument("--tenant", help="tenant partition to write to (SHARED_INDEX_PARTITION=tenant)")
+    parser.add_argument("--keep", action="store_true", help="keep the source indices instead of aliasing their names")
+    parser.add_argument("--es-host", default=ES_HOST)
+    args = parser.parse_args()
+
+    if not is_shared():
+        raise SystemExit("Set STORAGE_MODE=shared so ids and routing match what /hydrate writes")
+
+    es = Elasticsearch(args.es_host)
+    target = partition_index(tenant=args.tenant)
+    if ensure_index(es, target, supported_index_mapping(es, VECTOR_DIM)):
+        print(f"Created '{target}' behind alias '{SHARED_INDEX_ALIAS}'")
+    encoder = get_encoder()
+    for name in args.indices:
+        consolidate(es, name, target, encoder, keep=args.keep)
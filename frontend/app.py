@@ -1,14 +1,46 @@
 import os
-import re
+import sys
+import gzip
 import fitz  # PyMuPDF
-from flask import Flask, request, jsonify, render_template, session
+from flask import Flask, Response, request, jsonify, render_template, session, url_for
 from werkzeug.utils import secure_filename
-from elasticsearch import Elasticsearch, helpers
-from sentence_transformers import SentenceTransformer
+from elasticsearch import NotFoundError
 import logging
 from datetime import datetime
 import json
 import mimetypes
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from searchiq.backends import connect
+from searchiq.cache import IngestGenerations, TTLCache, normalize_text
+from searchiq.chunking import Chunker
+from searchiq.dedup import Deduplicator, referencing_files
+from searchiq.embedding_service import get_encoder
+from searchiq.extraction import extract_page
+from searchiq.fusion import HYBRID_LEXICAL_WEIGHT, HYBRID_VECTOR_WEIGHT, HYBRID_WINDOW, fuse
+from searchiq.incremental import Reconciler
+from searchiq.indexing import batched, bulk_index
+from searchiq.jobs import JobManager, JobQueueFull, JobStore
+from searchiq.layout import (
+    DOCUMENT, DUPLICATE, document_action, document_id, page_actions, page_id, supported_index_mapping
+)
+from searchiq.metrics import (
+    REQUEST_SECONDS, finish_request_timing, render, server_timing_header, start_request_timing, timed
+)
+from searchiq.paging import (
+    EXPORT_BATCH_SIZE, MAX_PAGE_SIZE, CursorExpired, scan_hits, search_page, snapshot_cursor
+)
+from searchiq.storage import (
+    SHARED_INDEX_ALIAS, concrete_index, ensure_index, is_shared, partition_index, routing, sanitize_name,
+    search_params
+)
+from searchiq.quantization import pageable, semantic_search_body
+from searchiq.query import cache_stats as compiled_query_stats, compile_query
+from searchiq.suggest import file_actions, suggest
+from searchiq.terms import TermStats
+from searchiq.vectors import exact_vector_query
 
 # === Config ===
 UPLOAD_FOLDER = "uploads"
@@ -16,6 +48,35 @@ ALLOWED_EXTENSIONS = {"pdf"}
 ES_HOST = "http://localhost:9200"
 VECTOR_DIM = 384
 MAX_SEARCH_HISTORY = 10
+SEARCH_SIZE = 10
+# Only what a result card shows is fetched; text comes back as highlighted fragments
+RESULT_FIELDS = [
+    "file_name", "file_type", "upload_timestamp", "title", "author", "page_number", "page_id",
+    "section", "reading_time", "keywords"
+]
+# Fields an NDJSON export includes unless the request picks its own
+EXPORT_FIELDS = RESULT_FIELDS + ["content"]
+HIGHLIGHT_FRAGMENT_SIZE = 150
+HIGHLIGHT_FRAGMENTS = 3
+SNIPPET_CHARS = 300
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+COMPRESS_LEVEL = int(os.environ.get("COMPRESS_LEVEL", 6))
+COMPRESS_MIMETYPES = {"text/html", "application/json", "text/css", "text/javascript"}
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", 64))
+EMBED_WINDOW_PAGES = int(os.environ.get("EMBED_WINDOW_PAGES", 16))
+BULK_CHUNK_SIZE = int(os.environ.get("BULK_CHUNK_SIZE", 500))
+BULK_MAX_CHUNK_BYTES = int(os.environ.get("BULK_MAX_CHUNK_BYTES", 10 * 1024 * 1024))
+BULK_THREADS = int(os.environ.get("BULK_THREADS", 2))
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", 2))
+INGEST_MAX_PENDING = int(os.environ.get("INGEST_MAX_PENDING", 8))
+# Adds a Server-Timing header with each request's per-stage breakdown
+TIMING_HEADER = os.environ.get("TIMING_HEADER", "0") == "1"
+QUERY_CACHE_ENTRIES = int(os.environ.get("QUERY_CACHE_ENTRIES", 1024))
+QUERY_CACHE_TTL = int(os.environ.get("QUERY_CACHE_TTL", 3600))
+RESULT_CACHE_ENTRIES = int(os.environ.get("RESULT_CACHE_ENTRIES", 512))
+RESULT_CACHE_TTL = int(os.environ.get("RESULT_CACHE_TTL", 60))
+SUGGEST_CACHE_ENTRIES = int(os.environ.get("SUGGEST_CACHE_ENTRIES", 4096))
+SUGGEST_CACHE_TTL = int(os.environ.get("SUGGEST_CACHE_TTL", 30))
 
 # === Logging ===
 logging.basicConfig(level=logging.INFO)
@@ -28,19 +89,34 @@ app.secret_key = os.urandom(24)  # Required for session
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 # === Model & Elasticsearch ===
-model = SentenceTransformer("all-MiniLM-L6-v2")
-es = Elasticsearch(ES_HOST)
+# Neither loads a model nor opens a connection until first used, so workers start fast;
+# set EMBEDDING_SERVICE_URL to share one model process between all workers
+encoder = get_encoder(batch_size=EMBED_BATCH_SIZE)
+es = connect(ES_HOST)
+jobs = JobManager(max_workers=INGEST_WORKERS, max_pending=INGEST_MAX_PENDING, store=JobStore())
+_chunker = None
+
+def get_chunker():
+    """Chunker sized to the model's tokenizer, built on the first upload."""
+    global _chunker
+    if _chunker is None:
+        _chunker = Chunker.for_model(encoder.model)
+    return _chunker
+
+# === Search Caches ===
+# Query vectors only depend on the text; results and suggestions are keyed by index
+# and stamped with its ingest generation, which every worker and ingest script shares
+query_vector_cache = TTLCache(max_entries=QUERY_CACHE_ENTRIES, ttl=QUERY_CACHE_TTL)
+result_cache = TTLCache(max_entries=RESULT_CACHE_ENTRIES, ttl=RESULT_CACHE_TTL)
+suggest_cache = TTLCache(max_entries=SUGGEST_CACHE_ENTRIES, ttl=SUGGEST_CACHE_TTL)
+ingest_generations = IngestGenerations()
 
 # === Utils ===
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def sanitize_index_name(filename):
-    name = os.path.splitext(filename)[0].lower()
-    name = re.sub(r'[^a-z0-9-]', '-', name)
-    name = re.sub(r'-+', '-', name)
-    name = name.strip('-')
-    return name
+    return sanitize_name(os.path.splitext(filename)[0])
 
 def get_file_type(filename):
     mime_type, _ = mimetypes.guess_type(filename)
@@ -48,73 +124,18 @@ def get_file_type(filename):
         return mime_type.split('/')[-1].upper()
     return os.path.splitext(filename)[1].upper().lstrip('.')
 
-def extract_sections(text):
-    """Extract potential sections from text based on common patterns."""
-    sections = []
-    # Look for common section patterns
-    section_patterns = [
-        r'^(?:Chapter|Section)\s+\d+[.:]\s*(.+)$',
-        r'^(\d+\.\d+\s+.+)$',
-        r'^([A-Z][A-Za-z\s]+):$'
-    ]
-    
-    lines = text.split('\n')
-    current_section = "main"
-    section_text = []
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-            
-        # Check if line matches any section pattern
-        is_section = False
-        for pattern in section_patterns:
-            match = re.match(pattern, line)
-            if match:
-                if section_text:
-                    sections.append({
-                        "name": current_section,
-                        "content": "\n".join(section_text)
-                    })
-                current_section = match.group(1)
-                section_text = []
-                is_section = True
-                break
-        
-        if not is_section:
-            section_text.append(line)
-    
-    # Add the last section
-    if section_text:
-        sections.append({
-            "name": current_section,
-            "content": "\n".join(section_text)
-        })
-    
-    return sections
-
 def build_search_query(query_params):
     must_conditions = []
     filter_conditions = []
     
-    # Text search with operators
+    # Text search with operators, parentheses, phrases and field prefixes
     if query_params.get('query'):
-        query = query_params['query']
-        if ' AND ' in query:
-            terms = query.split(' AND ')
-            must_conditions.append({"multi_match": {"query": " ".join(terms), "fields": ["content", "title"]}})
-        elif ' OR ' in query:
-            terms = query.split(' OR ')
-            should_conditions = [{"multi_match": {"query": term, "fields": ["content", "title"]}} for term in terms]
-            must_conditions.append({"bool": {"should": should_conditions, "minimum_should_match": 1}})
-        elif ' NOT ' in query:
-            terms = query.split(' NOT ')
-            must_conditions.append({"multi_match": {"query": terms[0], "fields": ["content", "title"]}})
-            must_not_conditions = [{"multi_match": {"query": term, "fields": ["content", "title"]}} for term in terms[1:]]
-            must_conditions.append({"bool": {"must_not": must_not_conditions}})
-        else:
-            must_conditions.append({"multi_match": {"query": query, "fields": ["content", "title"]}})
+        compiled = compile_query(query_params['query'])
+        must_conditions.extend(compiled["must"])
+        # Constraints and negations also narrow the vector leg of a hybrid search
+        filter_conditions.extend(compiled["filter"])
+        if compiled["must_not"]:
+            filter_conditions.append({"bool": {"must_not": compiled["must_not"]}})
     
     # Date range filter
     if query_params.get('date_from') or query_params.get('date_to'):
@@ -125,14 +146,21 @@ def build_search_query(query_params):
             date_filter["range"]["upload_timestamp"]["lte"] = query_params['date_to']
         filter_conditions.append(date_filter)
     
+    # Single document filter (also how a document is picked out of the shared index)
+    if query_params.get('file_name'):
+        filter_conditions.append({"term": {"file_name": query_params['file_name']}})
+
     # Document type filter
     if query_params.get('doc_type'):
         filter_conditions.append({"term": {"file_type": query_params['doc_type']}})
     
-    # Section filter
+    # Section filter (non-scoring, so it also applies to the vector leg of hybrid search)
     if query_params.get('section'):
-        must_conditions.append({"match": {"section": query_params['section']}})
+        filter_conditions.append({"match": {"section": query_params['section']}})
     
+    # Metadata-only docs hold no text to show; duplicate pages are found through their canonical page
+    filter_conditions.append({"bool": {"must_not": {"terms": {"doc_type": [DOCUMENT, DUPLICATE]}}}})
+
     # Build final query
     query = {
         "bool": {
@@ -143,6 +171,124 @@ def build_search_query(query_params):
     
     return query
 
+def document_metadata(hits):
+    """File-level metadata from the document docs of the files in ``hits``, keyed by file name.
+
+    Files indexed with the older layout have no document doc and are simply missing.
+    """
+    docs = metadata_docs(hits)
+    if not docs:
+        return {}
+    with timed("es_metadata"):
+        response = es.mget(body={"docs": docs})
+    return metadata_by_file(response)
+
+def metadata_docs(hits):
+    """``mget`` entries for the document docs of the files in ``hits``."""
+    files = {(hit["_index"], hit["_source"].get("file_name")) for hit in hits}
+    docs = []
+    for hit_index, file_name in files:
+        if not file_name:
+            continue
+        doc = {"_index": hit_index, "_id": document_id(file_name)}
+        if routing(file_name):
+            doc["routing"] = routing(file_name)
+        docs.append(doc)
+    return docs
+
+def metadata_by_file(response):
+    return {
+        found["_source"]["file_name"]: found["_source"]
+        for found in response["docs"] if found.get("found")
+    }
+
+def display_options(highlight_text=None):
+    """``_source`` filtering and highlighting for a search body, so no vectors or page text go over the wire.
+
+    Vector hits match no text query, so ``highlight_text`` (the semantic query)
+    picks their fragments; hits with no matching terms get the start of the text.
+    """
+    highlight = {
+        "encoder": "html",
+        "pre_tags": ["<mark>"],
+        "post_tags": ["</mark>"],
+        "fields": {
+            "content": {
+                "fragment_size": HIGHLIGHT_FRAGMENT_SIZE,
+                "number_of_fragments": HIGHLIGHT_FRAGMENTS,
+                "no_match_size": SNIPPET_CHARS
+            }
+        }
+    }
+    if highlight_text:
+        highlight["highlight_query"] = {"match": {"content": highlight_text}}
+    return {"_source": RESULT_FIELDS, "highlight": highlight}
+
+def hybrid_search(index, search_query, query_vector, size, file_name=None, highlight_text=None):
+    """Run the lexical and vector legs as one multi-search and fuse their rankings.
+
+    Both legs see the same filters, so the vector leg never scores filtered-out
+    documents. Returns ``(hits, total)`` where ``total`` counts lexical matches.
+    """
+    filters = search_query["bool"]["filter"]
+    window = max(size, HYBRID_WINDOW)
+    lexical_body = {"query": search_query, "size": window, **display_options()}
+    vector_body = {**semantic_search_body(es, index, query_vector, window, filter=filters),
+                   **display_options(highlight_text)}
+
+    header = {"index": index, **search_params(file_name)}
+    with timed("es_search"):
+        responses = es.msearch(body=[header, lexical_body, header, vector_body])["responses"]
+    for leg in responses:
+        if "error" in leg:
+            raise RuntimeError(f"Search leg failed: {leg['error']}")
+    lexical_hits, vector_hits = (leg["hits"]["hits"] for leg in responses)
+    return fused_hits(lexical_hits, vector_hits, size), responses[0]["hits"]["total"]["value"]
+
+def fused_hits(lexical_hits, vector_hits, size):
+    """Top ``size`` hits of the two legs' fused rankings, scored by the fusion."""
+    fused = fuse([lexical_hits, vector_hits], weights=[HYBRID_LEXICAL_WEIGHT, HYBRID_VECTOR_WEIGHT])
+    return [{**hit, "_score": score} for hit, score in fused[:size]]
+
+# === Instrumentation ===
+@app.before_request
+def start_timing():
+    request.start_time = time.perf_counter()
+    start_request_timing()
+
+@app.after_request
+def record_timing(response):
+    """Record request latency and, when enabled, expose the stage breakdown as ``Server-Timing``."""
+    elapsed = time.perf_counter() - request.start_time
+    REQUEST_SECONDS.observe(elapsed, endpoint=request.endpoint or "unknown")
+    timings = finish_request_timing()
+    if TIMING_HEADER:
+        timings["total"] = elapsed
+        response.headers["Server-Timing"] = server_timing_header(timings)
+    return response
+
+@app.route("/metrics")
+def metrics():
+    return Response(render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# === Response Compression ===
+@app.after_request
+def compress_response(response):
+    """Gzip larger text responses for clients that accept it (streamed responses are left alone)."""
+    if (response.is_streamed or response.direct_passthrough
+            or response.status_code < 200 or response.status_code >= 300
+            or response.mimetype not in COMPRESS_MIMETYPES
+            or "Content-Encoding" in response.headers
+            or "gzip" not in request.headers.get("Accept-Encoding", "").lower()):
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=COMPRESS_LEVEL))
+    response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response
+
 # === Routes ===
 @app.route("/")
 def index():
@@ -159,7 +305,11 @@ def save_search():
     search_query = request.json
     if not search_query:
         return jsonify({"error": "No search query provided"}), 400
-    
+
+    add_to_history(search_query)
+    return jsonify({"message": "Search saved successfully"})
+
+def add_to_history(search_query):
     # Get existing search history
     search_history = session.get('search_history', [])
     
@@ -174,98 +324,312 @@ def save_search():
     
     # Save back to session
     session['search_history'] = search_history
-    
-    return jsonify({"message": "Search saved successfully"})
+
+def query_vector(text):
+    """Embedding for a (normalized) semantic query, served from the query-vector cache when possible."""
+    vector = query_vector_cache.get(text)
+    if vector is None:
+        with timed("model_encode"):
+            vector = encoder.encode([text])[0]
+        query_vector_cache.put(text, vector)
+    return vector
+
+def run_search(index, query_params, search_query, size=SEARCH_SIZE, cursor=None):
+    """Execute a search against Elasticsearch and return ``(results, total_hits, next_cursor)``.
+
+    Lexical and exact-scored semantic searches are paged: the first page opens a point
+    in time and later pages continue from that snapshot with ``search_after``. Hybrid, kNN and quantized (rescored)
+    results are a top-k and come back as a single page.
+    """
+    file_name = query_params.get('file_name')
+    next_cursor = None
+
+    if query_params.get('query') and query_params.get('semantic_query'):
+        if cursor:
+            raise ValueError("Hybrid search results cannot be paged")
+        # Hybrid: separate lexical and vector retrievals fused client-side
+        hits, total_hits = hybrid_search(index, search_query, query_vector(query_params['semantic_query']),
+                                         size, file_name, highlight_text=query_params['semantic_query'])
+    else:
+        body = {
+            "query": search_query,
+            "size": size,
+            "sort": [{"_score": "desc"}],
+            **display_options()
+        }
+
+        # Pure semantic search when only a semantic query is given
+        if query_params.get('semantic_query'):
+            body = semantic_search_body(es, index, query_vector(query_params['semantic_query']), size,
+                                        filter=search_query["bool"]["filter"])
+            body.update(display_options(query_params['semantic_query']))
+
+        if pageable(body):
+            with timed("es_search"):
+                response, next_cursor = search_page(es, index, body, size, cursor, routing(file_name))
+        elif cursor:
+            raise ValueError("kNN and rescored search results cannot be paged")
+        else:
+            with timed("es_search"):
+                response = es.search(index=index, body=body, **search_params(file_name))
+        hits = response["hits"]["hits"]
+        total_hits = response["hits"]["total"]["value"]
+
+    # Title/author live once on the document doc (older indices copy them onto every hit)
+    meta = document_metadata(hits)
+    return [format_hit(hit, meta) for hit in hits], total_hits, next_cursor
+
+def format_hit(hit, meta):
+    """What a result card (or JSON client) gets for one hit: metadata, snippet and a link to the full page."""
+    source = hit["_source"]
+    file_name = source.get("file_name", "")
+    page_number = source.get("page_number")
+    # Chunks point at their page doc; legacy section docs share the page's number
+    page_doc = source.get("page_id") or (page_id(file_name, page_number - 1) if page_number else hit["_id"])
+    return {
+        "score": hit["_score"],
+        "snippet": " … ".join(hit.get("highlight", {}).get("content", [])),
+        "page": page_number or "?",
+        "page_url": url_for("page_content", index=hit["_index"], id=page_doc, file_name=file_name),
+        "file_name": file_name,
+        "title": source.get("title") or meta.get(file_name, {}).get("title", ""),
+        "author": source.get("author") or meta.get(file_name, {}).get("author", ""),
+        "upload_date": source.get("upload_timestamp", ""),
+        "file_type": source.get("file_type", ""),
+        "section": source.get("section", ""),
+        "reading_time": source.get("reading_time", 0),
+        "keywords": source.get("keywords", [])
+    }
+
+def invalidate_results(index_name):
+    """Stale cached results that may include ``index_name`` in every worker, once its new docs are searchable.
+
+    This worker's entries are also dropped right away to free their memory.
+    """
+    names = ingest_generations.record(es, index_name)
+    if names is None:
+        logger.warning(f"Could not resolve aliases of {index_name}, clearing the whole result cache")
+        result_cache.invalidate()
+        return
+    # Comma lists and wildcards may also cover the index
+    dropped = result_cache.invalidate(lambda key: key[0] in names or any(c in key[0] for c in ",*"))
+    logger.info(f"Invalidated {dropped} cached searches for {index_name}")
+
+def cached_search(raw_params):
+    """Normalize request params and run the search, reusing a cached result list when possible.
+
+    Returns ``(query_params, results, total_hits, next_cursor)``; raises ValueError for a
+    bad request. Only first pages are cached; a cursor always continues its own snapshot.
+    """
+    query_params, index = search_params_from(raw_params)
+    cursor = query_params.pop('cursor', None)
+    size = page_size(query_params)
+
+    with timed("query_build"):
+        search_query = build_search_query(query_params)
+    if cursor:
+        return (query_params, *run_search(index, query_params, search_query, size, cursor))
+
+    cache_key = result_key(index, query_params, search_query, size)
+    generation = result_cache.generation
+    stamp = ingest_generations.stamp(index)
+    cached = result_cache.get(cache_key, stamp)
+    if cached is None:
+        results, total_hits, next_cursor = run_search(index, query_params, search_query, size)
+        # Only whether there is a next page is cached; each request gets its own cursor
+        result_cache.put(cache_key, (results, total_hits, next_cursor is not None), generation, stamp)
+        return query_params, results, total_hits, next_cursor
+    results, total_hits, more = cached
+    # The stamp guarantees nothing was ingested since, so a snapshot opened now matches the cached page
+    next_cursor = snapshot_cursor(es, index, size, routing(query_params.get('file_name'))) if more else None
+    return query_params, results, total_hits, next_cursor
+
+def page_size(query_params):
+    try:
+        return max(1, min(int(query_params.get('size', SEARCH_SIZE)), MAX_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("size must be an integer")
+
+def result_key(index, query_params, search_query, size):
+    return (index, json.dumps(search_query, sort_keys=True), query_params.get('semantic_query', ''), size)
+
+def search_params_from(raw_params):
+    """Normalized request params plus the index to search.
+
+    Normalized params make equivalent requests share one result-cache entry.
+    """
+    query_params = {k: normalize_text(str(v)) for k, v in raw_params.items() if normalize_text(str(v))}
+    index = query_params.get('index')
+    if not index:
+        if not is_shared():
+            raise ValueError("Missing index")
+        # Shared storage: search the whole corpus, narrowed by the file filter if given
+        index = SHARED_INDEX_ALIAS
+    return query_params, index
 
 @app.route("/semantic-search", methods=["POST"])
 def semantic_search():
-    query_params = request.form.to_dict()
-    index = query_params.pop('index', None)
-    
-    if not index:
-        return jsonify({"error": "Missing index"}), 400
-    
     try:
-        # Build the search query
-        search_query = build_search_query(query_params)
-        
-        # Add vector search if there's a semantic query
-        if query_params.get('semantic_query'):
-            query_vector = model.encode(query_params['semantic_query']).tolist()
-            search_query = {
-                "bool": {
-                    "must": [
-                        search_query,
-                        {
-                            "script_score": {
-                                "query": {"match_all": {}},
-                                "script": {
-                                    "source": "cosineSimilarity(params.query_vector, 'vector') + 1.0",
-                                    "params": {"query_vector": query_vector}
-                                }
-                            }
-                        }
-                    ]
-                }
-            }
-        
-        response = es.search(
-            index=index,
-            body={
-                "query": search_query,
-                "size": 10,
-                "sort": [{"_score": "desc"}]
-            }
-        )
-        
-        hits = [{
-            "score": hit["_score"],
-            "text": hit["_source"]["content"],
-            "page": hit["_source"].get("page_number", "?"),
-            "title": hit["_source"].get("title", ""),
-            "author": hit["_source"].get("author", ""),
-            "upload_date": hit["_source"].get("upload_timestamp", ""),
-            "file_type": hit["_source"].get("file_type", ""),
-            "section": hit["_source"].get("section", ""),
-            "reading_time": hit["_source"].get("reading_time", 0),
-            "keywords": hit["_source"].get("keywords", [])
-        } for hit in response["hits"]["hits"]]
+        query_params, hits, total_hits, next_cursor = cached_search(request.form.to_dict())
         
         # Save search to history
         if query_params.get('query'):
-            save_search(query_params)
+            add_to_history(query_params)
         
         return render_template("results.html", 
                              query=query_params.get('query', ''),
                              results=hits,
-                             total_hits=response["hits"]["total"]["value"])
+                             total_hits=total_hits,
+                             params=query_params,
+                             next_cursor=next_cursor)
     
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except CursorExpired as e:
+        return jsonify({"error": str(e)}), 410
     except Exception as e:
         logger.error(f"Error during search: {str(e)}")
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
-@app.route("/hydrate", methods=["POST"])
-def hydrate():
-    if "file" not in request.files:
-        return jsonify({"error": "No file part"}), 400
+@app.route("/api/semantic-search", methods=["POST"])
+def semantic_search_json():
+    """JSON variant of /semantic-search for programmatic clients; takes a JSON body or form fields."""
+    try:
+        query_params, hits, total_hits, next_cursor = cached_search(
+            request.get_json(silent=True) or request.form.to_dict()
+        )
+        return jsonify({"query": query_params, "total_hits": total_hits, "results": hits,
+                        "next_cursor": next_cursor})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except CursorExpired as e:
+        return jsonify({"error": str(e)}), 410
+    except Exception as e:
+        logger.error(f"Error during search: {str(e)}")
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
-    file = request.files["file"]
-    if not file or not allowed_file(file.filename):
-        return jsonify({"error": "Invalid file type"}), 400
+@app.route("/export", methods=["GET", "POST"])
+def export_results():
+    """Stream every hit matching a search as NDJSON, one hit per line, in constant memory.
 
-    filename = secure_filename(file.filename)
-    file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-    file.save(file_path)
+    Takes the same fields as /semantic-search plus ``fields`` (comma-separated
+    ``_source`` fields). Semantic exports score every filtered doc exactly; with a
+    text query too, the text matches are exported ranked by semantic similarity.
+    """
+    try:
+        query_params, index = search_params_from(request.values.to_dict())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    index_name = sanitize_index_name(filename)
-    logger.info(f"Processing file: {filename} for index: {index_name}")
+    fields = [f.strip() for f in query_params.get('fields', '').split(",") if f.strip()] or EXPORT_FIELDS
+    # Vectors never go out in exports
+    fields = [f for f in fields if not f.endswith("vector")]
+    search_query = build_search_query(query_params)
+    if query_params.get('semantic_query'):
+        filters = [search_query] if query_params.get('query') else search_query["bool"]["filter"]
+        search_query = exact_vector_query(query_vector(query_params['semantic_query']), filter=filters)
+    body = {"query": search_query, "_source": fields}
+    file_name = query_params.get('file_name')
+
+    def generate():
+        exported = 0
+        try:
+            for hit in scan_hits(es, index, body, EXPORT_BATCH_SIZE, routing(file_name)):
+                exported += 1
+                yield json.dumps({"_index": hit["_index"], "_id": hit["_id"], "_score": hit["_score"],
+                                  **hit["_source"]}) + "\n"
+        except Exception as e:
+            # Headers are already sent, so report the failure in-band
+            logger.error(f"Export from {index} failed after {exported} hits: {str(e)}")
+            yield json.dumps({"error": str(e), "exported": exported}) + "\n"
+        else:
+            logger.info(f"Exported {exported} hits from {index}")
+
+    return Response(generate(), mimetype="application/x-ndjson",
+                    headers={"Content-Disposition": "attachment; filename=search-export.ndjson"})
+
+@app.route("/page")
+def page_content():
+    """Full text of one page, fetched on demand instead of with every search hit."""
+    index = request.args.get("index")
+    doc_id = request.args.get("id")
+    file_name = request.args.get("file_name")
+    if not index or not doc_id:
+        return jsonify({"error": "Missing index or id"}), 400
+
+    params = {"routing": routing(file_name)} if routing(file_name) else {}
+    try:
+        found = es.get(index=index, id=doc_id, _source_includes=["content", "page_number", "file_name"], **params)
+    except NotFoundError:
+        return jsonify({"error": "Page not found"}), 404
+    return jsonify(found["_source"])
+
+@app.route("/cache/stats")
+def cache_stats():
+    return jsonify({
+        "query_vectors": query_vector_cache.stats(),
+        "results": result_cache.stats(),
+        "suggestions": suggest_cache.stats(),
+        "compiled_queries": compiled_query_stats()
+    })
+
+def generate_actions(job, doc, index_name, file_meta, reconciler, dedup, stats):
+    """Lazily produce bulk actions for a PDF: its metadata doc, then pages a window at a time.
+
+    Each window's changed pages have their chunks embedded in one batched call, so
+    only EMBED_WINDOW_PAGES pages of text and vectors are held in memory at once.
+    Pages the reconciler reports unchanged are skipped, near-duplicates of indexed
+    pages are dropped or written as references without chunks, and deletes for
+    orphaned docs from a previous upload of the file close the stream. Every page
+    that stays indexed is added to the file's term ``stats``.
+    """
+    yield from reconciler.track([document_action(index_name, file_meta)])
+
+    chunker = get_chunker()
+    pages = (extract_page(i, page, chunker) for i, page in enumerate(doc))
+    job.update(stage="extracting")
+    for window in batched(pages, EMBED_WINDOW_PAGES):
+        job.check_cancelled()
+        job.update(stage="embedding")
+        window_pages = []
+        for page_info in window:
+            if page_info is None:
+                continue
+            if reconciler.unchanged(page_info):
+                # A duplicate's stand-in has no chunks, so it can't be the canonical copy
+                if not reconciler.is_duplicate(page_info):
+                    dedup.register_page(page_info)
+            elif dedup.keep(page_info):
+                window_pages.append(page_info)
+            else:
+                continue
+            stats.add_page_info(page_info)
+
+        texts = [chunk["text"] for page_info in window_pages if not page_info.get("duplicate_of")
+                 for chunk in page_info["chunks"]]
+        vectors = iter(encoder.encode(texts))
+
+        job.update(stage="indexing")
+        for page_info in window_pages:
+            yield from reconciler.track(page_actions(page_info, vectors, index_name, file_meta))
+            logger.info(f"Processed page {page_info['index'] + 1} with {len(page_info['chunks'])} chunks")
+        job.increment(pages_done=len(window))
+        job.update(stage="extracting", pages_skipped=reconciler.pages_skipped, pages_duplicate=dedup.duplicates)
 
+    yield from reconciler.delete_actions()
+
+def run_hydration(job, file_path, filename, index_name):
+    """Extract, embed and bulk-index one uploaded PDF, reporting progress on ``job``."""
+    logger.info(f"Processing file: {filename} for index: {index_name}")
+    doc = None
     try:
+        job.check_cancelled()
         file_size = os.path.getsize(file_path)
         upload_timestamp = datetime.utcnow().isoformat()
         file_type = get_file_type(filename)
 
-        doc = fitz.open(file_path)
+        with timed("pdf_open"):
+            doc = fitz.open(file_path)
         total_pages = doc.page_count
         metadata = doc.metadata or {}
 
@@ -275,133 +639,155 @@ def hydrate():
         creation_date = metadata.get("creationDate", "")
         modification_date = metadata.get("modDate", "")
 
-        if not es.indices.exists(index=index_name):
-            logger.info(f"Creating new index: {index_name}")
-            es.indices.create(index=index_name, body={
-                "mappings": {
-                    "properties": {
-                        "content": {"type": "text"},
-                        "vector": {"type": "dense_vector", "dims": VECTOR_DIM, "index": False},
-                        "page_number": {"type": "integer"},
-                        "file_name": {"type": "keyword"},
-                        "file_size": {"type": "long"},
-                        "upload_timestamp": {"type": "date"},
-                        "total_pages": {"type": "integer"},
-                        "title": {"type": "text"},
-                        "author": {"type": "text"},
-                        "producer": {"type": "text"},
-                        "creation_date": {"type": "date"},
-                        "modification_date": {"type": "date"},
-                        "content_length": {"type": "integer"},
-                        "has_images": {"type": "boolean"},
-                        "page_width": {"type": "float"},
-                        "page_height": {"type": "float"},
-                        "file_type": {"type": "keyword"},
-                        "section": {"type": "keyword"},
-                        "section_content": {"type": "text"},
-                        "section_vector": {"type": "dense_vector", "dims": VECTOR_DIM, "index": False},
-                        "keywords": {"type": "keyword"},
-                        "language": {"type": "keyword"},
-                        "word_count": {"type": "integer"},
-                        "reading_time": {"type": "integer"},
-                        "last_modified": {"type": "date"}
-                    }
-                }
-            })
-
-        actions = []
-        for i, page in enumerate(doc):
-            text = page.get_text()
-            if text.strip():
-                # Extract sections from the page
-                sections = extract_sections(text)
-                
-                # Calculate reading time (assuming average reading speed of 200 words per minute)
-                word_count = len(text.split())
-                reading_time = max(1, word_count // 200)
-                
-                # Generate keywords (simple implementation - can be enhanced with NLP)
-                words = text.lower().split()
-                keywords = list(set([w for w in words if len(w) > 4]))[:10]
-                
-                # Create embeddings for the full text and each section
-                embedding = model.encode(text).tolist()
-                section_embeddings = {
-                    section["name"]: model.encode(section["content"]).tolist()
-                    for section in sections
-                }
-                
-                content_length = len(text)
-                has_images = bool(page.get_images())
-                rect = page.rect
-
-                # Create base document
-                doc_base = {
-                    "content": text,
-                    "vector": embedding,
-                    "page_number": i + 1,
-                    "file_name": filename,
-                    "file_size": file_size,
-                    "upload_timestamp": upload_timestamp,
-                    "total_pages": total_pages,
-                    "title": title,
-                    "author": author,
-                    "producer": producer,
-                    "creation_date": creation_date,
-                    "modification_date": modification_date,
-                    "content_length": content_length,
-                    "has_images": has_images,
-                    "page_width": float(rect.width),
-                    "page_height": float(rect.height),
-                    "file_type": file_type,
-                    "word_count": word_count,
-                    "reading_time": reading_time,
-                    "keywords": keywords,
-                    "language": "en",  # Can be enhanced with language detection
-                    "last_modified": upload_timestamp
-                }
-
-                # Add the main document
-                actions.append({
-                    "_index": index_name,
-                    "_id": f"page-{i}",
-                    "_source": doc_base
-                })
-
-                # Add section documents
-                for section in sections:
-                    section_id = f"page-{i}-section-{section['name']}"
-                    actions.append({
-                        "_index": index_name,
-                        "_id": section_id,
-                        "_source": {
-                            **doc_base,
-                            "section": section["name"],
-                            "section_content": section["content"],
-                            "section_vector": section_embeddings[section["name"]],
-                            "content": section["content"],  # Override main content with section content
-                            "vector": section_embeddings[section["name"]]  # Override main vector with section vector
-                        }
-                    })
-
-                logger.info(f"Processed page {i+1} with {len(sections)} sections")
-
-        doc.close()
-        success, failed = helpers.bulk(es, actions, stats_only=True)
-        logger.info(f"Indexed {success} documents, {failed} failed")
-
-        return jsonify({
-            "message": f"✅ Successfully indexed {success} documents to '{index_name}'",
+        if ensure_index(es, index_name, supported_index_mapping(es, VECTOR_DIM)):
+            logger.info(f"Created new index: {index_name}")
+        # Names a search box may be scoped to, for typeahead suggestions
+        search_names = {index_name, SHARED_INDEX_ALIAS} if is_shared() else {index_name}
+        # Write to the concrete index so bulk targets match what the reconciler scans
+        index_name = concrete_index(es, index_name)
+
+        file_meta = {
+            "file_name": filename,
+            "file_size": file_size,
+            "upload_timestamp": upload_timestamp,
+            "total_pages": total_pages,
+            "title": title,
+            "author": author,
+            "producer": producer,
+            "creation_date": creation_date,
+            "modification_date": modification_date,
+            "file_type": file_type
+        }
+
+        job.update(pages_total=total_pages)
+        # Compare against what a previous upload of this file indexed
+        scope = SHARED_INDEX_ALIAS if is_shared() else index_name
+        reconciler = Reconciler.load(es, scope, filename)
+        dedup = Deduplicator(scope, filename)
+        stats = TermStats()
+
+        try:
+            success, failed = bulk_index(
+                es, generate_actions(job, doc, index_name, file_meta, reconciler, dedup, stats),
+                chunk_size=BULK_CHUNK_SIZE,
+                max_chunk_bytes=BULK_MAX_CHUNK_BYTES,
+                threads=BULK_THREADS,
+                on_chunk=lambda ok, bad: job.increment(docs_indexed=ok, docs_failed=bad)
+            )
+            job.update(stage="suggestions")
+            update_suggestions(index_name, search_names, filename, stats)
+        finally:
+            # Even a failed or cancelled ingest may have written some docs
+            invalidate_results(index_name)
+        logger.info(f"Indexed {success} documents, {failed} failed, {reconciler.pages_skipped} pages unchanged,"
+                    f" {dedup.duplicates} near-duplicate pages")
+        stale = referencing_files(es, scope, filename, reconciler.replaced_pages())
+        if stale:
+            logger.warning(f"{len(stale)} files reference changed pages of {filename} as near-duplicates;"
+                           f" re-upload them to re-check: {', '.join(stale)}")
+
+        return {
+            "message": f"✅ Successfully indexed {success} documents to '{index_name}'"
+                       f" ({reconciler.pages_skipped} unchanged pages skipped,"
+                       f" {dedup.duplicates} near-duplicate pages not embedded)",
             "failed": failed,
+            "pages_skipped": reconciler.pages_skipped,
+            "pages_duplicate": dedup.duplicates,
+            "stale_references": stale,
             "index": index_name
-        })
-
-    except Exception as e:
-        logger.error(f"Error during hydration: {str(e)}")
-        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+        }
     finally:
+        if doc is not None:
+            doc.close()
         if os.path.exists(file_path):
             os.remove(file_path)
 
+def update_suggestions(index_name, search_names, filename, stats):
+    """Set the file's TF-IDF page keywords and replace its typeahead suggestions.
+
+    Both need statistics over the whole file, so they follow once its pages are
+    indexed. A failure here is logged rather than failing the upload.
+    """
+    try:
+        with timed("suggestions"):
+            updated, failed = bulk_index(es, file_actions(es, index_name, search_names, filename, stats))
+        logger.info(f"Updated keywords and suggestions for {filename}: {updated} docs, {failed} failed")
+    except Exception as e:
+        logger.warning(f"Could not update suggestions for {filename}: {str(e)}")
+    suggest_cache.invalidate()
+
+@app.route("/suggest")
+def suggest_terms():
+    """Typeahead completions for the search box: ``?q=<prefix>`` and optionally ``&index=``."""
+    prefix = normalize_text(request.args.get("q", ""))
+    index = normalize_text(request.args.get("index", "")) or None
+    cache_key = (prefix.lower(), index)
+    generation = suggest_cache.generation
+    stamp = ingest_generations.stamp(index)
+    suggestions = suggest_cache.get(cache_key, stamp)
+    if suggestions is None:
+        try:
+            with timed("es_suggest"):
+                suggestions = suggest(es, prefix, index)
+        except Exception as e:
+            logger.error(f"Error during suggest: {str(e)}")
+            return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+        suggest_cache.put(cache_key, suggestions, generation, stamp)
+    return jsonify({"query": prefix, "suggestions": suggestions})
+
+@app.route("/hydrate", methods=["POST"])
+def hydrate():
+    """Save the upload and queue its ingestion; progress is at ``/jobs/<job_id>`` from any worker."""
+    if "file" not in request.files:
+        return jsonify({"error": "No file part"}), 400
+
+    file = request.files["file"]
+    if not file or not allowed_file(file.filename):
+        return jsonify({"error": "Invalid file type"}), 400
+
+    filename = secure_filename(file.filename)
+    # Prefix the stored copy so concurrent uploads of the same name don't collide
+    file_path = os.path.join(app.config["UPLOAD_FOLDER"], f"{uuid.uuid4().hex}-{filename}")
+    with timed("file_save"):
+        file.save(file_path)
+
+    if is_shared():
+        index_name = partition_index(tenant=request.form.get("tenant"))
+    else:
+        index_name = sanitize_index_name(filename)
+
+    try:
+        job = jobs.submit(run_hydration, file_path, filename, index_name,
+                          file_name=filename, index=index_name)
+    except JobQueueFull as e:
+        os.remove(file_path)
+        return jsonify({"error": f"Ingestion queue is full, try again later ({str(e)})"}), 503
+
+    logger.info(f"Queued job {job.id} for file: {filename}")
+    return jsonify({
+        "message": f"Queued '{filename}' for indexing into '{index_name}'",
+        "job_id": job.id,
+        "index": index_name,
+        "status_url": f"/jobs/{job.id}"
+    }), 202
+
+@app.route("/jobs")
+def list_jobs():
+    return jsonify({"jobs": [job.to_dict() for job in jobs.list()]})
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    job = jobs.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.to_dict())
+
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,213 @@
+# asgi.py
+#
+# Async serving path for JSON semantic search. The Flask app holds a worker for
+# the whole of model encoding and every Elasticsearch round trip; here the
+# query vector is encoded on a bounded thread pool while the event loop keeps
+# serving, and the independent Elasticsearch calls run concurrently (the
+# lexical leg of a hybrid search starts before its query vector is ready).
+#
+#   uvicorn asgi:app --workers 4 --port 8000     (from the frontend directory)
+#
+# Endpoints: POST /api/semantic-search (same request and response as the Flask
+# route, first pages only) and GET /metrics. Query building, hit formatting and
+# the query-vector cache are shared with app.py. It needs an Elasticsearch
+# cluster: with SEARCH_BACKEND=local it refuses to start.
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from elasticsearch import AsyncElasticsearch
+import app as webapp
+from searchiq.backends import is_local
+from searchiq.cache import TTLCache
+from searchiq.fusion import HYBRID_WINDOW
+from searchiq.metrics import (
+    REQUEST_SECONDS, finish_request_timing, render, server_timing_header, start_request_timing, timed
+)
+from searchiq.quantization import semantic_search_body_async
+from searchiq.storage import search_params
+
+# === Config ===
+# Pooled keep-alive connections per worker process
+ES_MAX_CONNECTIONS = int(os.environ.get("ASYNC_ES_MAX_CONNECTIONS", 32))
+# Concurrent model calls per worker process; further queries queue for a thread
+ENCODE_WORKERS = int(os.environ.get("ASYNC_ENCODE_WORKERS", 2))
+
+logger = logging.getLogger(__name__)
+
+# === Clients ===
+# There is no async local client; fail at startup rather than query a cluster that isn't there
+if is_local():
+    raise RuntimeError("asgi.py needs Elasticsearch; serve with app.py when SEARCH_BACKEND=local")
+
+# Connections are opened on the first request, inside the server's event loop
+es = AsyncElasticsearch(webapp.ES_HOST, maxsize=ES_MAX_CONNECTIONS)
+encode_pool = ThreadPoolExecutor(max_workers=ENCODE_WORKERS, thread_name_prefix="encode")
+# Entries carry the shared ingest stamp, so ingests by the Flask app or the scripts stale them
+result_cache = TTLCache(max_entries=webapp.RESULT_CACHE_ENTRIES, ttl=webapp.RESULT_CACHE_TTL)
+
+
+# === Search ===
+async def query_vector(text):
+    """Embedding for a semantic query, encoded off the event loop on a cache miss."""
+    vector = webapp.query_vector_cache.get(text)
+    if vector is None:
+        with timed("model_encode"):
+            vectors = await asyncio.get_running_loop().run_in_executor(encode_pool, webapp.encoder.encode, [text])
+        vector = vectors[0]
+        webapp.query_vector_cache.put(text, vector)
+    return vector
+
+
+async def lexical_leg(index, search_query, size, file_name):
+    body = {"query": search_query, "size": size, **webapp.display_options()}
+    with timed("es_search"):
+        return await es.search(index=index, body=body, **search_params(file_name))
+
+
+async def vector_leg(index, semantic_query, filters, size, file_name):
+    vector = await query_vector(semantic_query)
+    body = {**await semantic_search_body_async(es, index, vector, size, filter=filters),
+            **webapp.display_options(semantic_query)}
+    with timed("es_search"):
+        return await es.search(index=index, body=body, **search_params(file_name))
+
+
+async def document_metadata(hits):
+    docs = webapp.metadata_docs(hits)
+    if not docs:
+        return {}
+    with timed("es_metadata"):
+        return webapp.metadata_by_file(await es.mget(body={"docs": docs}))
+
+
+async def run_search(index, query_params, search_query, size):
+    """Async ``run_search``: returns ``(results, total_hits)`` for the first page."""
+    file_name = query_params.get('file_name')
+    semantic_query = query_params.get('semantic_query')
+    hybrid = bool(query_params.get('query') and semantic_query)
+    window = max(size, HYBRID_WINDOW) if hybrid else size
+
+    legs = []
+    if hybrid or not semantic_query:
+        legs.append(lexical_leg(index, search_query, window, file_name))
+    if semantic_query:
+        legs.append(vector_leg(index, semantic_query, search_query["bool"]["filter"], window, file_name))
+    responses = await asyncio.gather(*legs)
+
+    if hybrid:
+        lexical, vector = (response["hits"]["hits"] for response in responses)
+        hits = webapp.fused_hits(lexical, vector, size)
+    else:
+        hits = responses[0]["hits"]["hits"]
+    total_hits = responses[0]["hits"]["total"]["value"]
+
+    meta = await document_metadata(hits)
+    # url_for needs a request context; links are relative, so a synthetic one will do
+    with webapp.app.test_request_context():
+        return [webapp.format_hit(hit, meta) for hit in hits], total_hits
+
+
+async def cached_search(raw_params):
+    query_params, index = webapp.search_params_from(raw_params)
+    if query_params.get('cursor'):
+        raise ValueError("Later pages are served by the main app's /api/semantic-search")
+    size = webapp.page_size(query_params)
+
+    with timed("query_build"):
+        search_query = webapp.build_search_query(query_params)
+    cache_key = webapp.result_key(index, query_params, search_query, size)
+    generation = result_cache.generation
+    stamp = webapp.ingest_generations.stamp(index)
+    cached = result_cache.get(cache_key, stamp)
+    if cached is None:
+        cached = await run_search(index, query_params, search_query, size)
+        result_cache.put(cache_key, cached, generation, stamp)
+    return (query_params, *cached)
+
+
+# === Endpoints ===
+async def semantic_search_json(body, content_type):
+    try:
+        if content_type.startswith("application/json"):
+            raw_params = json.loads(body or b"{}")
+        else:
+            raw_params = dict(parse_qsl(body.decode()))
+        query_params, hits, total_hits = await cached_search(raw_params)
+        return 200, {"query": query_params, "total_hits": total_hits, "results": hits, "next_cursor": None}
+    except ValueError as e:
+        return 400, {"error": str(e)}
+    except Exception as e:
+        logger.error(f"Error during search: {str(e)}")
+        return 500, {"error": f"An error occurred: {str(e)}"}
+
+
+ROUTES = {
+    ("POST", "/api/semantic-search"): "semantic_search_json",
+    ("GET", "/metrics"): "metrics",
+}
+
+
+# === ASGI ===
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await es.close()
+            encode_pool.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    start = time.perf_counter()
+    start_request_timing()
+    headers = {name.decode().lower(): value.decode() for name, value in scope["headers"]}
+    endpoint = ROUTES.get((scope["method"], scope["path"]))
+    body = await read_body(receive)
+
+    if endpoint == "semantic_search_json":
+        status, payload = await semantic_search_json(body, headers.get("content-type", ""))
+        content_type, data = "application/json", json.dumps(payload).encode()
+    elif endpoint == "metrics":
+        status, content_type, data = 200, "text/plain; version=0.0.4; charset=utf-8", render().encode()
+    else:
+        status, content_type, data = 404, "application/json", json.dumps({"error": "Not found"}).encode()
+
+    response_headers = [(b"content-type", content_type.encode()), (b"vary", b"Accept-Encoding")]
+    if len(data) >= webapp.COMPRESS_MIN_BYTES and "gzip" in headers.get("accept-encoding", "").lower():
+        data = gzip.compress(data, compresslevel=webapp.COMPRESS_LEVEL)
+        response_headers.append((b"content-encoding", b"gzip"))
+    response_headers.append((b"content-length", str(len(data)).encode()))
+
+    elapsed = time.perf_counter() - start
+    REQUEST_SECONDS.observe(elapsed, endpoint=f"async_{endpoint or 'unknown'}")
+    timings = finish_request_timing()
+    if webapp.TIMING_HEADER:
+        timings["total"] = elapsed
+        response_headers.append((b"server-timing", server_timing_header(timings).encode()))
+
+    await send({"type": "http.response.start", "status": status, "headers": response_headers})
+    await send({"type": "http.response.body", "body": data})
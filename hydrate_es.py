@@ -1,16 +1,21 @@
 # hydrate_pdf_to_elasticsearch.py
 
 import fitz  # PyMuPDF
-from sentence_transformers import SentenceTransformer
-from elasticsearch import Elasticsearch, helpers
+from searchiq.backends import connect
+from searchiq.cache import IngestGenerations
+from searchiq.chunking import Chunker
+from searchiq.embedding_service import get_encoder
+from searchiq.indexing import batched, bulk_index
+from searchiq.vectors import supported_mode, vector_mapping
 
 INDEX_NAME = "aws-overview"
 PDF_PATH = "aws-overview.pdf"
 ES_HOST = "http://localhost:9200"
 VECTOR_DIM = 384
+EMBED_WINDOW_PAGES = 16
 
-# Connect to Elasticsearch
-es = Elasticsearch(ES_HOST)
+# Connect to Elasticsearch (or the local backend, see SEARCH_BACKEND)
+es = connect(ES_HOST)
 
 # Create index if not exists
 if not es.indices.exists(index=INDEX_NAME):
@@ -18,38 +23,46 @@ if not es.indices.exists(index=INDEX_NAME):
         "mappings": {
             "properties": {
                 "content": {"type": "text"},
-                "vector": {
-                    "type": "dense_vector",
-                    "dims": VECTOR_DIM,
-                    "index": False
-                }
+                "page_number": {"type": "integer"},
+                "chunk_index": {"type": "integer"},
+                "vector": vector_mapping(VECTOR_DIM, mode=supported_mode(es))
             }
         }
     }
     es.indices.create(index=INDEX_NAME, body=mapping)
 
-# Extract text from PDF
-doc = fitz.open(PDF_PATH)
-pages = [page.get_text() for page in doc]
-doc.close()
-
-# Load embedding model
-model = SentenceTransformer("all-MiniLM-L6-v2")
-
-# Prepare documents
-docs = []
-for i, text in enumerate(pages):
-    if text.strip():
-        embedding = model.encode(text).tolist()
-        docs.append({
-            "_index": INDEX_NAME,
-            "_id": f"page-{i}",
-            "_source": {
-                "content": text,
-                "vector": embedding
-            }
-        })
+# Load embedding model (vectors are served from the shared cache when possible)
+encoder = get_encoder()
+
+# Split pages into chunks that fit the model's input window
+chunker = Chunker.for_model(encoder.model)
+
+
+def generate_docs(pdf_path, window_pages=EMBED_WINDOW_PAGES):
+    """Yield one bulk action per chunk, embedding a window of pages per model call."""
+    doc = fitz.open(pdf_path)
+    try:
+        pages = ((i, page.get_text()) for i, page in enumerate(doc))
+        for window in batched(pages, window_pages):
+            chunks = [(i, chunk) for i, text in window for chunk in chunker.chunk_page(text, [])]
+            embeddings = encoder.encode([chunk["text"] for _, chunk in chunks])
+            for (i, chunk), embedding in zip(chunks, embeddings):
+                yield {
+                    "_index": INDEX_NAME,
+                    "_id": f"page-{i}-chunk-{chunk['chunk_index']}",
+                    "_source": {
+                        "content": chunk["text"],
+                        "page_number": i + 1,
+                        "chunk_index": chunk["chunk_index"],
+                        "vector": embedding
+                    }
+                }
+    finally:
+        doc.close()
+
 
-# Bulk index
-helpers.bulk(es, docs)
-print(f"✅ Indexed {len(docs)} pages from {PDF_PATH} into '{INDEX_NAME}'.")
+# Stream documents into Elasticsearch as they are produced
+success, failed = bulk_index(es, generate_docs(PDF_PATH))
+# Cached searches of the index, in the web app or elsewhere, are now stale
+IngestGenerations().record(es, INDEX_NAME)
+print(f"✅ Indexed {success} chunks from {PDF_PATH} into '{INDEX_NAME}' ({failed} failed).")
@@ -0,0 +1,303 @@
+# ingest_dir.py
+#
+# Bulk-ingest a directory (or glob) of PDFs into the same compact layout /hydrate
+# writes. Text extraction, section detection and chunking run across a process
+# pool; a single embedding stage in the main process batches chunks across files
+# and streams the results into parallel bulk indexing.
+#
+#   python ingest_dir.py archive/filings
+#   python ingest_dir.py "archive/**/*.pdf" --workers 8 --tenant acme
+#
+# Files are committed in groups; a group whose docs all indexed is appended to the
+# manifest, so an interrupted run picks up where it stopped. Re-running a file that
+# changed only re-embeds its changed pages, and with DEDUP_MODE set pages that
+# near-duplicate indexed ones aren't embedded at all. Each file's TF-IDF page keywords and
+# typeahead suggestions are computed from all its pages before any are written.
+
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+import fitz  # PyMuPDF
+from searchiq.backends import connect
+from searchiq.cache import IngestGenerations
+from searchiq.chunking import Chunker
+from searchiq.dedup import Deduplicator, referencing_files
+from searchiq.embedding_service import get_encoder
+from searchiq.extraction import extract_page
+from searchiq.incremental import Reconciler
+from searchiq.indexing import batched, bulk_index
+from searchiq.layout import document_action, page_actions, supported_index_mapping
+from searchiq.storage import (
+    SHARED_INDEX_ALIAS, concrete_index, ensure_index, id_prefix, is_shared, partition_index, sanitize_name
+)
+from searchiq.suggest import replace_actions
+from searchiq.terms import TermStats
+
+# === Config ===
+ES_HOST = "http://localhost:9200"
+VECTOR_DIM = 384
+MANIFEST_PATH = os.path.join(".cache", "ingest-manifest.jsonl")
+EXTRACT_WORKERS = int(os.environ.get("EXTRACT_WORKERS", os.cpu_count() or 2))
+EMBED_BATCH_TEXTS = int(os.environ.get("EMBED_BATCH_TEXTS", 512))
+GROUP_FILES = int(os.environ.get("INGEST_GROUP_FILES", 16))
+
+START, PAGE, END = "start", "page", "end"
+
+_chunker = None
+
+
+# === Extraction (worker processes) ===
+def init_worker(chunker):
+    global _chunker
+    _chunker = chunker
+
+
+def extract_file(path):
+    """Extract every page of one PDF with its sections and chunks."""
+    doc = fitz.open(path)
+    try:
+        pages = [p for p in (extract_page(i, page, _chunker) for i, page in enumerate(doc)) if p]
+        return {"path": path, "total_pages": doc.page_count, "metadata": doc.metadata or {}, "pages": pages}
+    finally:
+        doc.close()
+
+
+def extracted_files(paths, chunker, workers):
+    """Yield extraction results as workers finish, keeping at most ``2 * workers`` files in flight."""
+    paths = iter(paths)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(chunker,)) as pool:
+        in_flight = {pool.submit(extract_file, path): path for path in _take(paths, workers * 2)}
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = in_flight.pop(future)
+                try:
+                    yield future.result()
+                except Exception as e:
+                    print(f"❌ Extraction failed for {path}: {str(e)}")
+                for next_path in _take(paths, 1):
+                    in_flight[pool.submit(extract_file, next_path)] = next_path
+
+
+def _take(iterator, n):
+    return [item for _, item in zip(range(n), iterator)]
+
+
+# === Manifest ===
+def file_key(path):
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, int(stat.st_mtime)
+
+
+def load_manifest(path):
+    """Keys of files a previous run fully indexed; a file that changed since gets a new key."""
+    done = set()
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    done.add((entry["path"], entry["size"], entry["mtime"]))
+    return done
+
+
+def record_files(path, files):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        for item in files:
+            abspath, size, mtime = item["key"]
+            f.write(json.dumps({
+                "path": abspath, "size": size, "mtime": mtime,
+                "pages": item["total_pages"], "completed_at": datetime.utcnow().isoformat()
+            }) + "\n")
+
+
+# === Pipeline ===
+def find_pdfs(inputs):
+    paths = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "**", "*.pdf")
+        paths.extend(p for p in glob.glob(pattern, recursive=True) if p.lower().endswith(".pdf"))
+    return sorted(set(paths))
+
+
+def target_index(path, index_name=None):
+    """The index a file is written to: ``index_name``, or one named after the file."""
+    return index_name or sanitize_name(os.path.splitext(os.path.basename(path))[0])
+
+
+def colliding_inputs(paths, index_name=None):
+    """Groups of paths that would write the same doc ids, so each would overwrite the others.
+
+    Files are keyed by their base name, so ``2023/10-K.pdf`` and ``2024/10-K.pdf``
+    collide; in per-file storage so do names that sanitize to the same index, and
+    every file written to one ``--index``, since ids there aren't namespaced by file.
+    """
+    groups = {}
+    for path in paths:
+        key = (target_index(path, index_name), id_prefix(os.path.basename(path)))
+        groups.setdefault(key, []).append(path)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def prepare(es, item, index_name):
+    """Attach file metadata, target index, term statistics and a reconciler against what's already indexed."""
+    file_name = os.path.basename(item["path"])
+    metadata = item["metadata"]
+    index_name = target_index(item["path"], index_name)
+    ensure_index(es, index_name, supported_index_mapping(es, VECTOR_DIM))
+    item["index"] = concrete_index(es, index_name)
+    item["search_names"] = {index_name, SHARED_INDEX_ALIAS} if is_shared() else {index_name}
+
+    item["stats"] = TermStats()
+    for page_info in item["pages"]:
+        item["stats"].add_page_info(page_info)
+    keywords = item["stats"].page_keywords()
+    for page_info in item["pages"]:
+        page_info["keywords"] = keywords[page_info["index"]]
+
+    item["file_meta"] = {
+        "file_name": file_name,
+        "file_size": os.path.getsize(item["path"]),
+        "upload_timestamp": datetime.utcnow().isoformat(),
+        "total_pages": item["total_pages"],
+        "title": metadata.get("title", ""),
+        "author": metadata.get("author", ""),
+        "producer": metadata.get("producer", ""),
+        "creation_date": metadata.get("creationDate", ""),
+        "modification_date": metadata.get("modDate", ""),
+        "file_type": "PDF"
+    }
+    scope = SHARED_INDEX_ALIAS if is_shared() else item["index"]
+    item["scope"] = scope
+    item["reconciler"] = Reconciler.load(es, scope, file_name)
+    item["dedup"] = Deduplicator(scope, file_name)
+    return item
+
+
+def units(group):
+    """Flatten a group of files into document, page and cleanup steps, skipping unchanged pages.
+
+    Near-duplicate checks run here, in file order, so a page can match one earlier in the group.
+    """
+    for item in group:
+        yield START, item, None
+        for page_info in item["pages"]:
+            if item["reconciler"].unchanged(page_info):
+                # A duplicate's stand-in has no chunks, so it can't be the canonical copy
+                if not item["reconciler"].is_duplicate(page_info):
+                    item["dedup"].register_page(page_info)
+            elif item["dedup"].keep(page_info):
+                yield PAGE, item, page_info
+        yield END, item, None
+
+
+def embedded_actions(es, group, encoder, batch_texts=EMBED_BATCH_TEXTS):
+    """Bulk actions for a group of files, embedding chunks in batches that span file boundaries."""
+    buffer, pending_texts = [], 0
+    for unit in units(group):
+        buffer.append(unit)
+        if unit[0] == PAGE:
+            pending_texts += 0 if unit[2].get("duplicate_of") else len(unit[2]["chunks"])
+        if pending_texts >= batch_texts:
+            yield from _flush(es, buffer, encoder)
+            buffer, pending_texts = [], 0
+    yield from _flush(es, buffer, encoder)
+
+
+def _flush(es, buffer, encoder):
+    texts = [chunk["text"] for kind, _, page_info in buffer if kind == PAGE and not page_info.get("duplicate_of")
+             for chunk in page_info["chunks"]]
+    vectors = iter(encoder.encode(texts))
+    for kind, item, page_info in buffer:
+        reconciler = item["reconciler"]
+        if kind == START:
+            yield from reconciler.track([document_action(item["index"], item["file_meta"])])
+        elif kind == PAGE:
+            yield from reconciler.track(page_actions(page_info, vectors, item["index"], item["file_meta"]))
+        else:
+            yield from reconciler.delete_actions()
+            yield from replace_actions(es, item["index"], item["search_names"], item["file_meta"]["file_name"],
+                                       item["stats"])
+
+
+def ingest(es, paths, encoder, chunker, index_name=None, workers=EXTRACT_WORKERS,
+           manifest_path=MANIFEST_PATH, group_files=GROUP_FILES):
+    start = time.perf_counter()
+    generations = IngestGenerations()
+    files_done = pages_done = pages_skipped = pages_duplicate = docs = failures = 0
+
+    for group in batched(extracted_files(paths, chunker, workers), group_files):
+        group = [prepare(es, item, index_name) for item in group]
+        for item in group:
+            item["key"] = file_key(item["path"])
+        success, failed = bulk_index(es, embedded_actions(es, group, encoder))
+        # Cached searches over the group's indices, in the web app or elsewhere, are now stale
+        for written in sorted({item["index"] for item in group}):
+            generations.record(es, written)
+        docs += success
+        failures += failed
+        if failed:
+            # Failures aren't attributed per file, so the whole group is retried next run
+            print(f"⚠️ {failed} docs failed; {len(group)} files left out of the manifest")
+        else:
+            record_files(manifest_path, group)
+        for item in group:
+            stale = referencing_files(es, item["scope"], item["file_meta"]["file_name"],
+                                      item["reconciler"].replaced_pages())
+            if stale:
+                print(f"⚠️ {item['file_meta']['file_name']} changed pages that {len(stale)} files reference as "
+                      f"near-duplicates; re-ingest them to re-check: {', '.join(stale)}")
+
+        files_done += len(group)
+        pages_done += sum(item["total_pages"] for item in group)
+        pages_skipped += sum(item["reconciler"].pages_skipped for item in group)
+        pages_duplicate += sum(item["dedup"].duplicates for item in group)
+        elapsed = time.perf_counter() - start
+        print(f"[{files_done}/{len(paths)} files] {pages_done} pages ({pages_skipped} unchanged, "
+              f"{pages_duplicate} near-duplicates), "
+              f"{docs} docs, {pages_done / elapsed:.1f} pages/sec")
+
+    elapsed = time.perf_counter() - start
+    rate = pages_done / elapsed if elapsed else 0.0
+    print(f"✅ Ingested {files_done} files, {pages_done} pages in {elapsed:.1f}s ({rate:.1f} pages/sec), "
+          f"{docs} docs indexed, {failures} failed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-ingest a directory or glob of PDFs into Elasticsearch.")
+    parser.add_argument("inputs", nargs="+", help="directories (searched recursively) or glob patterns")
+    parser.add_argument("--index", help="write every file to this index instead of one index per file")
+    parser.add_argument("--tenant", help="tenant partition in shared storage mode")
+    parser.add_argument("--workers", type=int, default=EXTRACT_WORKERS, help="extraction processes")
+    parser.add_argument("--group-files", type=int, default=GROUP_FILES, help="files committed to the manifest together")
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--force", action="store_true", help="ignore the manifest and re-check every file")
+    parser.add_argument("--es-host", default=ES_HOST)
+    args = parser.parse_args()
+
+    paths = find_pdfs(args.inputs)
+    index_name = args.index
+    if is_shared():
+        index_name = partition_index(tenant=args.tenant)
+
+    clashes = colliding_inputs(paths, index_name)
+    if clashes:
+        listed = "\n".join("  " + ", ".join(group) for group in clashes)
+        raise SystemExit(f"These inputs would overwrite each other's docs; rename them or ingest them "
+                         f"in separate runs with different --index or --tenant values:\n{listed}")
+
+    completed = set() if args.force else load_manifest(args.manifest)
+    todo = [p for p in paths if file_key(p) not in completed]
+    print(f"Found {len(paths)} PDFs, {len(paths) - len(todo)} already ingested")
+
+    encoder = get_encoder()
+    ingest(connect(args.es_host), todo, encoder, Chunker.for_model(encoder.model),
+           index_name=index_name, workers=args.workers, manifest_path=args.manifest,
+           group_files=args.group_files)
@@ -0,0 +1,130 @@
+# loadtest.py
+#
+# Closed-loop HTTP load test for the JSON search endpoints, to compare the
+# sync Flask route with the async one (frontend/asgi.py) on a real cluster.
+# Each target is driven at increasing concurrency; the report gives the
+# requests/sec each reaches while its p99 stays under --p99-ms.
+#
+#   (cd frontend && gunicorn -w 4 --threads 4 -b 127.0.0.1:5000 app:app)
+#   (cd frontend && uvicorn asgi:app --workers 4 --port 8000)
+#   python loadtest.py --index report-2024 --p99-ms 250 \
+#       --target sync=http://127.0.0.1:5000/api/semantic-search \
+#       --target async=http://127.0.0.1:8000/api/semantic-search
+#
+# Queries are benchmark.py's reproducible lexical/semantic/hybrid/filtered mix.
+# Run it from a separate machine (or at least separate cores) so the load
+# generator doesn't compete with the servers, and with caches disabled
+# (RESULT_CACHE_ENTRIES=0 QUERY_CACHE_ENTRIES=0) unless caching is under test.
+
+import argparse
+import http.client
+import itertools
+import json
+import threading
+import time
+from urllib.parse import urlparse
+
+from benchmark import latency_summary, query_mix
+
+DEFAULT_CONCURRENCY = "1,2,4,8,16,32,64"
+
+
+def worker(url, queries, deadline, latencies, errors, lock):
+    """Send queries back to back over one keep-alive connection until ``deadline``."""
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+    own_latencies, own_errors = [], 0
+    for _, params in itertools.cycle(queries):
+        if time.perf_counter() >= deadline:
+            break
+        start = time.perf_counter()
+        try:
+            conn.request("POST", url.path, body=json.dumps(params), headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            ok = False
+        if ok:
+            own_latencies.append(time.perf_counter() - start)
+        else:
+            own_errors += 1
+    conn.close()
+    with lock:
+        latencies.extend(own_latencies)
+        errors.append(own_errors)
+
+
+def run_level(url, queries, concurrency, duration):
+    """Throughput and latency of one target at a fixed number of concurrent clients."""
+    latencies, errors, lock = [], [], threading.Lock()
+    deadline = time.perf_counter() + duration
+    threads = [
+        # Each client starts at a different point in the mix
+        threading.Thread(target=worker, args=(url, queries[i::concurrency] or queries, deadline,
+                                              latencies, errors, lock))
+        for i in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    level = {"concurrency": concurrency, "rps": round(len(latencies) / elapsed, 1), "errors": sum(errors)}
+    if latencies:
+        level.update(latency_summary(latencies))
+    return level
+
+
+def load_test(url, queries, levels, duration, p99_ms, warmup):
+    url = urlparse(url)
+    run_level(url, queries, levels[0], warmup)
+    results = []
+    for concurrency in levels:
+        level = run_level(url, queries, concurrency, duration)
+        results.append(level)
+        print(f"  c={concurrency:<4} {level['rps']:>8.1f} req/s  p50 {level.get('p50_ms', '-')} ms  "
+              f"p99 {level.get('p99_ms', '-')} ms  errors {level['errors']}")
+        if level.get("p99_ms") is None or level["p99_ms"] > p99_ms * 2:
+            # Well past the latency budget; more clients only queue
+            break
+    within = [level for level in results if level.get("p99_ms") is not None
+              and level["p99_ms"] <= p99_ms and not level["errors"]]
+    best = max(within, key=lambda level: level["rps"], default=None)
+    return {"levels": results, "best": best}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare search endpoints' throughput at a fixed p99.")
+    parser.add_argument("--target", action="append", required=True, metavar="NAME=URL",
+                        help="endpoint to load, e.g. async=http://127.0.0.1:8000/api/semantic-search")
+    parser.add_argument("--index", required=True, help="index (or alias) the queries search")
+    parser.add_argument("--p99-ms", type=float, default=250.0, help="latency budget for the reported throughput")
+    parser.add_argument("--concurrency", default=DEFAULT_CONCURRENCY, help="comma-separated client counts")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per concurrency level")
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    queries = [(kind, {**params, "index": args.index}) for kind, params in query_mix(args.queries, args.seed)]
+    levels = [int(c) for c in args.concurrency.split(",")]
+    results = {"config": {k: v for k, v in vars(args).items() if k != "output"}, "targets": {}}
+    for target in args.target:
+        name, _, url = target.partition("=")
+        print(f"{name}: {url}")
+        results["targets"][name] = load_test(url, queries, levels, args.duration, args.p99_ms, args.warmup)
+
+    print(f"\nThroughput with p99 <= {args.p99_ms:.0f} ms:")
+    for name, result in results["targets"].items():
+        best = result["best"]
+        if best:
+            print(f"  {name:<10} {best['rps']:>8.1f} req/s at c={best['concurrency']} (p99 {best['p99_ms']} ms)")
+        else:
+            print(f"  {name:<10} never within budget")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,154 @@
+# migrate_vectors.py
+#
+# Reindex an existing index so its dense_vector fields use the knn (HNSW) or
+# exact mapping, then point the original name at the new index through an alias.
+# Compact-layout indices can also switch int8 quantization on or off.
+#
+#   python migrate_vectors.py my-index --mode knn
+#   python migrate_vectors.py my-alias --mode exact --keep-old
+#   python migrate_vectors.py my-index --mode knn --quantize int8
+
+import argparse
+from datetime import datetime
+
+from elasticsearch import Elasticsearch, helpers
+from searchiq.cache import IngestGenerations
+from searchiq.embedding_service import get_encoder
+from searchiq.indexing import batched, bulk_index
+from searchiq.layout import CHUNK, DOCUMENT, DUPLICATE, PAGE, index_mapping
+from searchiq.quantization import INT8, NONE, quantization_meta
+from searchiq.vectors import EXACT, KNN, KNN_MIN_VERSION, server_version, supports_byte_vectors, vector_mapping
+
+ES_HOST = "http://localhost:9200"
+
+
+def convert_properties(properties, mode):
+    """Return a copy of mapping properties with every dense_vector field remapped for ``mode``."""
+    converted = {}
+    for name, field in properties.items():
+        if field.get("type") == "dense_vector":
+            converted[name] = vector_mapping(field["dims"], mode=mode)
+        elif "properties" in field:
+            converted[name] = {**field, "properties": convert_properties(field["properties"], mode)}
+        else:
+            converted[name] = field
+    return converted
+
+
+def resolve_target(es, name):
+    """Return ``(concrete_index, is_alias)`` for an index name or an alias pointing at one index."""
+    if es.indices.exists_alias(name=name):
+        targets = list(es.indices.get_alias(name=name).keys())
+        if len(targets) != 1:
+            raise SystemExit(f"Alias '{name}' points at {len(targets)} indices; migrate them one at a time")
+        return targets[0], True
+    if not es.indices.exists(index=name):
+        raise SystemExit(f"Index '{name}' does not exist")
+    return name, False
+
+
+def reembedded_actions(es, source_index, new_index, encoder, batch_size=256):
+    """Copy every doc to ``new_index``, rebuilding the fields kept out of ``_source``.
+
+    Chunk vectors are recomputed from the chunk text and ``doc_title`` is restored
+    from each file's document doc.
+    """
+    documents = helpers.scan(es, index=source_index, query={"query": {"term": {"doc_type": DOCUMENT}}})
+    titles = {hit["_source"]["file_name"]: hit["_source"].get("title", "") for hit in documents}
+
+    hits = helpers.scan(es, index=source_index, query={"query": {"match_all": {}}})
+    for batch in batched(hits, batch_size):
+        chunks = [hit for hit in batch if hit["_source"].get("doc_type") == CHUNK]
+        vectors = dict(zip(
+            (hit["_id"] for hit in chunks),
+            encoder.encode([hit["_source"]["content"] for hit in chunks])
+        ))
+        for hit in batch:
+            source = dict(hit["_source"])
+            if source.get("doc_type") in (PAGE, DUPLICATE, CHUNK):
+                source["doc_title"] = titles.get(source.get("file_name"), "")
+            if hit["_id"] in vectors:
+                source["vector"] = vectors[hit["_id"]]
+            action = {"_index": new_index, "_id": hit["_id"], "_source": source}
+            if hit.get("_routing"):
+                action["_routing"] = hit["_routing"]
+            yield action
+
+
+def migrated_mapping(mapping, mode, quantization):
+    """The source mapping with vectors remapped for ``mode``; compact layouts are rebuilt, quantized or not."""
+    properties = mapping.get("properties", {})
+    if "doc_type" in properties:
+        dims = properties["vector"]["dims"]
+        return index_mapping(dims, mode=mode, quantization=quantization)
+    if quantization != NONE:
+        raise SystemExit("Only compact-layout indices can be quantized")
+    return {**mapping, "properties": convert_properties(properties, mode)}
+
+
+def migrate(es, name, mode, keep_old=False, quantization=None):
+    source_index, is_alias = resolve_target(es, name)
+    if keep_old and not is_alias:
+        # A concrete index can't share its name with an alias, so it would have to be deleted
+        raise SystemExit(f"'{name}' is a concrete index, which must be deleted to alias its name; "
+                         f"run without --keep-old")
+    mapping = es.indices.get_mapping(index=source_index)[source_index]["mappings"]
+    if quantization is None:
+        # Keep whatever the source uses; the new index is calibrated afresh on its first writes
+        meta = quantization_meta({source_index: {"mappings": mapping}})[source_index]
+        quantization = meta["type"] if meta else NONE
+    version = server_version(es)
+    if mode != EXACT and version is not None and version < KNN_MIN_VERSION:
+        raise SystemExit(f"knn mappings need Elasticsearch 8.4+; this server runs {'.'.join(map(str, version))}")
+    if quantization == INT8 and not supports_byte_vectors(es):
+        raise SystemExit("int8 quantization needs Elasticsearch 8.6+ for byte vectors")
+    new_index = f"{name}-{mode}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+
+    print(f"Creating '{new_index}' with {mode} vector mapping (quantization: {quantization})")
+    es.indices.create(index=new_index, body={"mappings": migrated_mapping(mapping, mode, quantization)})
+
+    if mapping.get("_source", {}).get("excludes"):
+        # Compact-layout indices keep vectors and doc_title out of _source, so
+        # _reindex can't carry them; rebuild them (vectors are mostly cache hits).
+        print(f"Re-embedding '{source_index}' -> '{new_index}'")
+        copied, failed = bulk_index(es, reembedded_actions(es, source_index, new_index, get_encoder()))
+        if failed:
+            raise SystemExit(f"{failed} documents failed to copy; '{name}' left unchanged")
+    else:
+        print(f"Reindexing '{source_index}' -> '{new_index}'")
+        result = es.reindex(
+            body={"source": {"index": source_index}, "dest": {"index": new_index}},
+            wait_for_completion=True,
+            request_timeout=3600,
+        )
+        if result.get("failures"):
+            raise SystemExit(f"Reindex reported {len(result['failures'])} failures; '{name}' left unchanged")
+        copied = result.get("created", 0) + result.get("updated", 0)
+    es.indices.refresh(index=new_index)
+    print(f"Copied {copied} documents")
+
+    if is_alias:
+        es.indices.update_aliases(body={"actions": [
+            {"remove": {"index": source_index, "alias": name}},
+            {"add": {"index": new_index, "alias": name}},
+        ]})
+        if not keep_old:
+            es.indices.delete(index=source_index)
+    else:
+        # A concrete index can't share its name with an alias, so it must go first
+        es.indices.delete(index=source_index)
+        es.indices.put_alias(index=new_index, name=name)
+    IngestGenerations().record(es, new_index)
+    print(f"✅ '{name}' now points at '{new_index}'")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Switch an index's vector fields between exact and knn mappings.")
+    parser.add_argument("index", help="index or alias name to migrate")
+    parser.add_argument("--mode", choices=[KNN, EXACT], default=KNN)
+    parser.add_argument("--quantize", choices=[INT8, NONE], help="vector quantization (default: keep the source's)")
+    parser.add_argument("--keep-old", action="store_true", help="keep the source index when migrating an alias")
+    parser.add_argument("--es-host", default=ES_HOST)
+    args = parser.parse_args()
+
+    migrate(Elasticsearch(args.es_host), args.index, args.mode, keep_old=args.keep_old, quantization=args.quantize)
@@ -1,37 +1,27 @@
 # semantic_search.py
 
-from sentence_transformers import SentenceTransformer
-from elasticsearch import Elasticsearch
+from searchiq.backends import connect
+from searchiq.embedding_service import get_encoder
+from searchiq.quantization import semantic_search_body
 
 INDEX_NAME = "aws-overview"
 ES_HOST = "http://localhost:9200"
+TOP_K = 3
 
-# Connect to Elasticsearch
-es = Elasticsearch(ES_HOST)
+# Connect to Elasticsearch (or the local backend, see SEARCH_BACKEND)
+es = connect(ES_HOST)
 
 # Load embedding model
-model = SentenceTransformer("all-MiniLM-L6-v2")
+encoder = get_encoder()
 
 # Get query input from user
 query = input("Enter your semantic query: ")
-query_vector = model.encode(query).tolist()
+query_vector = encoder.encode_query(query)
 
-# Perform semantic search
-response = es.search(
-    index=INDEX_NAME,
-    size=3,
-    body={
-        "query": {
-            "script_score": {
-                "query": {"match_all": {}},
-                "script": {
-                    "source": "cosineSimilarity(params.query_vector, 'vector') + 1.0",
-                    "params": {"query_vector": query_vector}
-                }
-            }
-        }
-    }
-)
+# Perform semantic search (exact cosine scoring or approximate kNN, see VECTOR_SEARCH_MODE;
+# int8-quantized indices rescore their top candidates at full precision)
+body = semantic_search_body(es, INDEX_NAME, query_vector, TOP_K)
+response = es.search(index=INDEX_NAME, body=body)
 
 # Display results
 print("\n🔍 Top Matches:")
@@ -0,0 +1 @@
+"""Shared ingestion and search helpers used by the SearchIQ app and scripts."""
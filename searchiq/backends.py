@@ -0,0 +1,25 @@
+"""Where indices live: an Elasticsearch cluster, or local files for running without one."""
+import os
+
+from elasticsearch import Elasticsearch
+
+# === Config ===
+# "elasticsearch" or "local" (memory-mapped vectors and columnar metadata under LOCAL_DATA_DIR)
+SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", "elasticsearch")
+LOCAL_DATA_DIR = os.environ.get("LOCAL_DATA_DIR", os.path.join(".data", "local-index"))
+
+ELASTICSEARCH = "elasticsearch"
+LOCAL = "local"
+
+
+def is_local():
+    return SEARCH_BACKEND == LOCAL
+
+
+def connect(es_host):
+    """A client for the configured backend; the local one answers the same calls as ``Elasticsearch``."""
+    if is_local():
+        # numpy is only needed by the local backend
+        from searchiq.local_index import LocalElasticsearch
+        return LocalElasticsearch(LOCAL_DATA_DIR)
+    return Elasticsearch(es_host)
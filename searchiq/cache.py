@@ -0,0 +1,148 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# === Config ===
+INGEST_GENERATIONS_PATH = os.environ.get("INGEST_GENERATIONS_PATH", os.path.join(".cache", "generations.sqlite3"))
+
+# Bumped by every ingest; stamps searches over wildcards
+ANY_INDEX = "*"
+# Bumped when an ingest couldn't tell which aliases it wrote under; part of every stamp
+UNKNOWN = ""
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire ``ttl`` seconds after being stored.
+
+    ``invalidate`` bumps a generation counter; a value computed before an
+    invalidation is dropped by ``put`` when its caller passes the generation it
+    read beforehand, so a search racing an ingest can't re-cache stale results.
+    Entries may also carry a ``stamp`` (see ``IngestGenerations``); ``get`` treats
+    an entry whose stamp differs from the caller's as invalidated.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, stamp=None):
+        """Return the cached value or None, refreshing its LRU position."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > self.clock() and entry[2] == stamp:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+                if entry[2] != stamp:
+                    self.invalidations += 1
+            self.misses += 1
+            return None
+
+    def put(self, key, value, generation=None, stamp=None):
+        with self.lock:
+            if self.max_entries <= 0 or (generation is not None and generation != self.generation):
+                return
+            self.entries[key] = (self.clock() + self.ttl, value, stamp)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, predicate=None):
+        """Drop entries whose key matches ``predicate`` (all entries if None); returns how many."""
+        with self.lock:
+            self.generation += 1
+            stale = [key for key in self.entries if predicate is None or predicate(key)]
+            for key in stale:
+                del self.entries[key]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+
+class IngestGenerations:
+    """Per-index ingest counters in a SQLite file shared by every process that writes or caches searches.
+
+    Ingests bump the counters of the index they wrote and its aliases once the new
+    docs are searchable. A cached search stores the ``stamp`` of the names it
+    covers, read before it ran; an ingest since then changes the stamp, in any
+    worker process and whichever script did the writing.
+    """
+
+    def __init__(self, path=INGEST_GENERATIONS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS generations (name TEXT PRIMARY KEY, generation INTEGER NOT NULL)")
+        self._conn.commit()
+
+    def bump(self, names):
+        """Record an ingest into ``names``; ``None`` means the names are unknown, which stales every stamp."""
+        names = {UNKNOWN} if names is None else set(names)
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO generations (name, generation) VALUES (?, 1) "
+                "ON CONFLICT (name) DO UPDATE SET generation = generation + 1",
+                [(name,) for name in sorted(names | {ANY_INDEX})]
+            )
+            self._conn.commit()
+
+    def stamp(self, index):
+        """Counters of the names a search over ``index`` (a name, comma list, wildcard or None) covers."""
+        names = [name.strip() for name in (index or ANY_INDEX).split(",")]
+        if any("*" in name for name in names):
+            names = [ANY_INDEX]
+        names = sorted(set(names) | {UNKNOWN})
+        with self._lock:
+            rows = dict(self._conn.execute(
+                f"SELECT name, generation FROM generations WHERE name IN ({','.join('?' * len(names))})", names
+            ).fetchall())
+        return tuple(rows.get(name, 0) for name in names)
+
+    def record(self, es, index_name):
+        """Refresh ``index_name`` so its new docs are searchable, then bump it and its aliases.
+
+        Returns the names bumped, or ``None`` if the aliases couldn't be read (every stamp is then staled).
+        """
+        names = {index_name}
+        try:
+            es.indices.refresh(index=index_name)
+            names.update(es.indices.get_alias(index=index_name).get(index_name, {}).get("aliases", {}))
+        except Exception:
+            names = None
+        self.bump(names)
+        return names
+
+
+def normalize_text(text):
+    """Collapse whitespace so trivially different spellings of a query share a cache entry."""
+    return " ".join((text or "").split())
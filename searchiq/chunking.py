@@ -0,0 +1,138 @@
+import os
+import re
+
+# === Config ===
+CHUNK_STRATEGY = os.environ.get("CHUNK_STRATEGY", "section")  # "fixed", "sentence" or "section"
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", 32))
+DEFAULT_MAX_TOKENS = 256
+
+FIXED = "fixed"
+SENTENCE = "sentence"
+SECTION = "section"
+STRATEGIES = (FIXED, SENTENCE, SECTION)
+
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"“(])|\n{2,}')
+
+
+class WhitespaceTokenizer:
+    """Stand-in tokenizer used when the model doesn't expose one; counts words, not word pieces."""
+
+    def offsets(self, text):
+        return [(m.start(), m.end()) for m in re.finditer(r'\S+', text)]
+
+
+class ModelTokenizer:
+    """Adapts a Hugging Face fast tokenizer to return character offsets of its tokens."""
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+
+    def offsets(self, text):
+        encoded = self.tokenizer(
+            text,
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            truncation=False,
+            verbose=False,
+        )
+        return encoded["offset_mapping"]
+
+
+class Chunker:
+    """Splits text into chunks that fit the embedding model's input window.
+
+    ``fixed`` slides a window of ``max_tokens`` with ``overlap`` tokens of overlap,
+    ``sentence`` packs whole sentences into each chunk, and ``section`` packs
+    sentences without ever crossing a section boundary. Sentences longer than the
+    window fall back to fixed windows, so no chunk exceeds ``max_tokens``.
+    """
+
+    def __init__(self, tokenizer=None, max_tokens=DEFAULT_MAX_TOKENS,
+                 overlap=CHUNK_OVERLAP_TOKENS, strategy=CHUNK_STRATEGY):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown chunk strategy: {strategy}")
+        self.tokenizer = tokenizer or WhitespaceTokenizer()
+        self.max_tokens = max_tokens
+        self.overlap = min(overlap, max_tokens // 2)
+        self.strategy = strategy
+
+    @property
+    def signature(self):
+        """Identifies the chunking settings, so content hashes change when they do."""
+        return f"{self.strategy}:{self.max_tokens}:{self.overlap}"
+
+    @classmethod
+    def for_model(cls, model, **kwargs):
+        """Build a chunker sized to a SentenceTransformer's tokenizer and max sequence length."""
+        tokenizer = getattr(model, "tokenizer", None)
+        max_seq_length = getattr(model, "max_seq_length", None) or DEFAULT_MAX_TOKENS
+        return cls(
+            tokenizer=ModelTokenizer(tokenizer) if tokenizer is not None else None,
+            max_tokens=max_seq_length - 2,  # room for [CLS] and [SEP]
+            **kwargs,
+        )
+
+    def fixed_windows(self, text):
+        offsets = self.tokenizer.offsets(text)
+        if not offsets:
+            return []
+        if len(offsets) <= self.max_tokens:
+            return [text.strip()]
+        chunks = []
+        step = self.max_tokens - self.overlap
+        for start in range(0, len(offsets), step):
+            window = offsets[start:start + self.max_tokens]
+            chunks.append(text[window[0][0]:window[-1][1]].strip())
+            if start + self.max_tokens >= len(offsets):
+                break
+        return [chunk for chunk in chunks if chunk]
+
+    def sentence_chunks(self, text):
+        chunks, current, current_tokens = [], [], 0
+        for sentence in SENTENCE_END.split(text):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            tokens = len(self.tokenizer.offsets(sentence))
+            if tokens > self.max_tokens:
+                if current:
+                    chunks.append(" ".join(current))
+                    current, current_tokens = [], 0
+                chunks.extend(self.fixed_windows(sentence))
+                continue
+            if current and current_tokens + tokens > self.max_tokens:
+                chunks.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(sentence)
+            current_tokens += tokens
+        if current:
+            chunks.append(" ".join(current))
+        return chunks
+
+    def chunk_page(self, text, sections):
+        """Chunk one page; returns ``[{"text", "section", "chunk_index"}]`` in reading order.
+
+        ``sections`` is the ``extract_sections`` output for the page (may be empty).
+        The ``section`` strategy chunks each section separately; the others tag each
+        chunk with the section its first characters fall in.
+        """
+        if self.strategy == SECTION:
+            sections = sections or [{"name": "main", "content": text}]
+            pieces = [(section["name"], chunk)
+                      for section in sections
+                      for chunk in self.sentence_chunks(section["content"])]
+        else:
+            split = self.fixed_windows if self.strategy == FIXED else self.sentence_chunks
+            pieces = [(self._section_of(chunk, sections), chunk) for chunk in split(text)]
+        return [
+            {"text": chunk, "section": section, "chunk_index": n}
+            for n, (section, chunk) in enumerate(pieces)
+        ]
+
+    @staticmethod
+    def _section_of(chunk, sections):
+        head = chunk[:40]
+        for section in sections:
+            if head and head in section["content"]:
+                return section["name"]
+        return sections[0]["name"] if sections else "main"
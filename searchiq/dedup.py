@@ -0,0 +1,251 @@
+"""Near-duplicate detection for pages and sections, run before they are embedded.
+
+Each text gets a MinHash signature over its word 3-shingles. Signatures are kept
+in a SQLite file with LSH buckets (the signature cut into bands, one bucket per
+band), so a new page is compared only against pages sharing a bucket. A page
+whose estimated Jaccard similarity to an indexed page reaches ``DEDUP_THRESHOLD``
+is either skipped or written as a reference: its page doc, marked with the
+canonical page, without chunks or vectors.
+
+References aren't followed when the canonical file changes: pages of other
+files that pointed at a page since re-ingested with different content keep
+their reference until those files are re-ingested. ``referencing_files``
+finds them so ingestion can say which files need it.
+"""
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+from array import array
+
+from elasticsearch import NotFoundError
+
+from searchiq.layout import DUPLICATE, page_id
+from searchiq.metrics import DUPLICATE_TEXTS, timed
+from searchiq.terms import tokens
+
+# === Config ===
+# "none", "skip" (don't index duplicates) or "reference" (index a page doc pointing at the canonical page)
+DEDUP_MODE = os.environ.get("DEDUP_MODE", "none")
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", 0.9))
+# Shorter texts are always indexed; their shingles are too few to tell boilerplate from coincidence
+DEDUP_MIN_WORDS = int(os.environ.get("DEDUP_MIN_WORDS", 25))
+DEDUP_INDEX_PATH = os.environ.get("DEDUP_INDEX_PATH", os.path.join(".cache", "signatures.sqlite3"))
+SHINGLE_WORDS = 3
+NUM_PERM = 64
+# 16 bands of 4 rows: pages at 0.9 similarity share a bucket with near certainty
+BANDS = 16
+
+NONE = "none"
+SKIP = "skip"
+REFERENCE = "reference"
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1)
+# Fixed seed: signatures must stay comparable across processes and runs
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+# === Signatures ===
+def _hash64(data):
+    return int.from_bytes(hashlib.blake2b(data.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def shingles(text, size=SHINGLE_WORDS):
+    """Distinct runs of ``size`` words; None if the text is too short to compare."""
+    words = tokens(text)
+    if len(words) < max(size, DEDUP_MIN_WORDS):
+        return None
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(text):
+    """MinHash signature of the text's shingles, or None if it is too short."""
+    found = shingles(text)
+    if not found:
+        return None
+    hashes = [_hash64(shingle) % _PRIME for shingle in found]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def similarity(left, right):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(1 for a, b in zip(left, right) if a == b) / len(left)
+
+
+def buckets(signature, bands=BANDS):
+    """One LSH bucket per band, as signed 64-bit ints for SQLite."""
+    rows = len(signature) // bands
+    return [
+        int.from_bytes(hashlib.blake2b(
+            array("Q", [band, *signature[band * rows:(band + 1) * rows]]).tobytes(), digest_size=8
+        ).digest(), "big", signed=True)
+        for band in range(bands)
+    ]
+
+
+# === Signature index ===
+class SignatureIndex:
+    """Signatures and LSH buckets of indexed texts, grouped by search scope (an index or alias)."""
+
+    def __init__(self, path=DEDUP_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS signatures ("
+            "scope TEXT NOT NULL, doc_id TEXT NOT NULL, file_name TEXT NOT NULL, signature BLOB NOT NULL, "
+            "PRIMARY KEY (scope, doc_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS signatures_file ON signatures (scope, file_name)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (scope TEXT NOT NULL, bucket INTEGER NOT NULL, doc_id TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS buckets_lookup ON buckets (scope, bucket)")
+        self._conn.commit()
+
+    def find(self, scope, signature, threshold=DEDUP_THRESHOLD):
+        """The most similar indexed text at or above ``threshold``, as ``{doc_id, file_name, similarity}``."""
+        keys = buckets(signature)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT doc_id, file_name, signature FROM signatures WHERE scope = ? AND doc_id IN ("
+                f"SELECT doc_id FROM buckets WHERE scope = ? AND bucket IN ({','.join('?' * len(keys))}))",
+                [scope, scope, *keys]
+            ).fetchall()
+        best = None
+        for doc_id, file_name, blob in rows:
+            score = similarity(signature, array("Q", blob))
+            if score >= threshold and (best is None or score > best["similarity"]):
+                best = {"doc_id": doc_id, "file_name": file_name, "similarity": round(score, 3)}
+        return best
+
+    def add(self, scope, doc_id, file_name, signature):
+        with self._lock:
+            self._conn.execute("DELETE FROM buckets WHERE scope = ? AND doc_id = ?", (scope, doc_id))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO signatures (scope, doc_id, file_name, signature) VALUES (?, ?, ?, ?)",
+                (scope, doc_id, file_name, array("Q", signature).tobytes())
+            )
+            self._conn.executemany(
+                "INSERT INTO buckets (scope, bucket, doc_id) VALUES (?, ?, ?)",
+                [(scope, bucket, doc_id) for bucket in buckets(signature)]
+            )
+            self._conn.commit()
+
+    def forget_file(self, scope, file_name):
+        """Drop a file's signatures, before it is re-ingested."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM buckets WHERE scope = ? AND doc_id IN "
+                "(SELECT doc_id FROM signatures WHERE scope = ? AND file_name = ?)",
+                (scope, scope, file_name)
+            )
+            self._conn.execute("DELETE FROM signatures WHERE scope = ? AND file_name = ?", (scope, file_name))
+            self._conn.commit()
+
+
+    def forget_scope(self, scope):
+        """Drop every signature of a scope, once its index is gone."""
+        with self._lock:
+            self._conn.execute("DELETE FROM buckets WHERE scope = ?", (scope,))
+            self._conn.execute("DELETE FROM signatures WHERE scope = ?", (scope,))
+            self._conn.commit()
+
+
+_signature_index = None
+_signature_lock = threading.Lock()
+
+
+def signature_index():
+    """The process's signature index, opened on first use."""
+    global _signature_index
+    with _signature_lock:
+        if _signature_index is None:
+            _signature_index = SignatureIndex()
+        return _signature_index
+
+
+def referencing_files(es, scope, file_name, doc_ids, limit=1000):
+    """Other files with pages indexed as references to ``doc_ids`` of ``file_name``."""
+    if not doc_ids:
+        return []
+    try:
+        response = es.search(index=scope, body={
+            "size": limit,
+            "_source": ["file_name"],
+            "query": {"bool": {"filter": [
+                {"term": {"doc_type": DUPLICATE}},
+                {"term": {"duplicate_file": file_name}},
+                {"terms": {"duplicate_of": list(doc_ids)}}
+            ]}}
+        })
+    except NotFoundError:
+        return []
+    return sorted({hit["_source"]["file_name"] for hit in response["hits"]["hits"]} - {file_name})
+
+
+# === Ingestion ===
+class Deduplicator:
+    """One file's near-duplicate checks during an ingest.
+
+    The file's signatures from a previous ingest are dropped first, so its pages
+    never match their own earlier versions. Texts that aren't duplicates become
+    canonical for the rest of the file and for later files in the same scope.
+    """
+
+    def __init__(self, scope, file_name, mode=None, signatures=None, threshold=DEDUP_THRESHOLD):
+        self.scope = scope
+        self.file_name = file_name
+        self.mode = mode or DEDUP_MODE
+        self.signatures = None if self.mode == NONE else signatures or signature_index()
+        self.threshold = threshold
+        self.duplicates = 0
+        if self.signatures is not None:
+            self.signatures.forget_file(scope, file_name)
+
+    @property
+    def skips(self):
+        return self.mode == SKIP
+
+    def register(self, doc_id, text):
+        """Record an already indexed text as canonical."""
+        if self.signatures is None:
+            return
+        signature = minhash(text)
+        if signature:
+            self.signatures.add(self.scope, doc_id, self.file_name, signature)
+
+    def canonical(self, doc_id, text):
+        """The indexed text that ``text`` near-duplicates, or None (and ``text`` is registered)."""
+        if self.signatures is None:
+            return None
+        with timed("dedup"):
+            signature = minhash(text)
+            if not signature:
+                return None
+            match = self.signatures.find(self.scope, signature, self.threshold)
+            if match is None:
+                self.signatures.add(self.scope, doc_id, self.file_name, signature)
+                return None
+        self.duplicates += 1
+        DUPLICATE_TEXTS.inc(mode=self.mode)
+        return match
+
+    def register_page(self, page_info):
+        self.register(page_id(self.file_name, page_info["index"]), page_info["text"])
+
+    def keep(self, page_info):
+        """Whether to index a changed page; duplicates to keep get ``duplicate_of`` set."""
+        match = self.canonical(page_id(self.file_name, page_info["index"]), page_info["text"])
+        if match is None:
+            return True
+        if self.skips:
+            return False
+        page_info["duplicate_of"] = match
+        return True
@@ -0,0 +1,334 @@
+"""Shared embedding model service.
+
+One process owns the model and serves ``POST /encode`` over a Unix socket or
+local HTTP, merging concurrent requests into micro-batches. ``get_encoder()``
+returns an encoder that uses the service when ``EMBEDDING_SERVICE_URL`` is set
+and falls back to an in-process model, loaded only when first needed.
+
+    python -m searchiq.embedding_service --socket /tmp/searchiq-embed.sock
+    EMBEDDING_SERVICE_URL=unix:///tmp/searchiq-embed.sock gunicorn -w 8 app:app
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+from array import array
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from types import SimpleNamespace
+from urllib.parse import urlparse
+
+from searchiq import embeddings
+
+logger = logging.getLogger(__name__)
+
+# === Config ===
+# "unix:///path/to.sock" or "http://127.0.0.1:8765"; unset means always in-process
+EMBEDDING_SERVICE_URL = os.environ.get("EMBEDDING_SERVICE_URL")
+SERVICE_MAX_BATCH = int(os.environ.get("EMBEDDING_SERVICE_MAX_BATCH", 256))
+SERVICE_MAX_WAIT_MS = float(os.environ.get("EMBEDDING_SERVICE_MAX_WAIT_MS", 5))
+SERVICE_TIMEOUT = float(os.environ.get("EMBEDDING_SERVICE_TIMEOUT", 60))
+# After a failed call, use the in-process model for this long before trying the service again
+SERVICE_RETRY_SECONDS = float(os.environ.get("EMBEDDING_SERVICE_RETRY_SECONDS", 30))
+
+
+# === Server ===
+class MicroBatcher:
+    """Merges concurrent encode requests into model batches of up to ``max_batch`` texts.
+
+    The first queued request waits at most ``max_wait`` seconds for others to join
+    its batch, so a lone caller pays a few milliseconds and a burst pays one call.
+    """
+
+    def __init__(self, encoder, max_batch=SERVICE_MAX_BATCH, max_wait=SERVICE_MAX_WAIT_MS / 1000):
+        self.encoder = encoder
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, name="embedding-batcher", daemon=True).start()
+
+    def encode(self, texts, normalize=False):
+        future = Future()
+        self._queue.put((texts, normalize, future))
+        return future.result()
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "texts": self.texts,
+            "mean_batch_texts": round(self.texts / self.batches, 1) if self.batches else None
+        }
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            self.requests += len(batch)
+            for normalize in {item[1] for item in batch}:
+                group = [item for item in batch if item[1] == normalize]
+                texts = [text for item in group for text in item[0]]
+                try:
+                    vectors = self.encoder.encode(texts, normalize=normalize)
+                except Exception as e:
+                    for _, _, future in group:
+                        future.set_exception(e)
+                    continue
+                self.batches += 1
+                self.texts += len(texts)
+                offset = 0
+                for item_texts, _, future in group:
+                    future.set_result(vectors[offset:offset + len(item_texts)])
+                    offset += len(item_texts)
+
+
+class EncodeHandler(BaseHTTPRequestHandler):
+    """``POST /encode`` returns float32 vectors as raw bytes; ``GET /info`` describes the model."""
+
+    batcher = None
+    info = None
+
+    def do_GET(self):
+        if self.path != "/info":
+            return self.send_error(404)
+        self._reply(200, json.dumps({**self.info, "stats": self.batcher.stats()}).encode(), "application/json")
+
+    def do_POST(self):
+        if self.path != "/encode":
+            return self.send_error(404)
+        try:
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            vectors = self.batcher.encode(request["texts"], normalize=bool(request.get("normalize")))
+        except (ValueError, KeyError, TypeError) as e:
+            return self._reply(400, json.dumps({"error": str(e)}).encode(), "application/json")
+        except Exception as e:
+            logger.error(f"Encoding failed: {str(e)}")
+            return self._reply(500, json.dumps({"error": str(e)}).encode(), "application/json")
+        packed = array("f", [value for vector in vectors for value in vector])
+        self._reply(200, packed.tobytes(), "application/octet-stream",
+                    {"X-Vector-Count": len(vectors)})
+
+    def _reply(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return str(self.client_address[0]) if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+    # Every web worker may connect at once; the default backlog of 5 refuses the rest
+    request_queue_size = 128
+
+
+class LocalHTTPServer(ThreadingHTTPServer):
+    request_queue_size = 128
+
+
+def serve(socket_path=None, host="127.0.0.1", port=8765, max_batch=SERVICE_MAX_BATCH,
+          max_wait_ms=SERVICE_MAX_WAIT_MS):
+    encoder = embeddings.load_encoder()
+    model = encoder.model
+    tokenizer = getattr(model, "tokenizer", None)
+    EncodeHandler.batcher = MicroBatcher(encoder, max_batch=max_batch, max_wait=max_wait_ms / 1000)
+    EncodeHandler.info = {
+        "model_name": encoder.model_name,
+        "max_seq_length": getattr(model, "max_seq_length", None),
+        # Same host, so clients can load the tokenizer from disk for chunking
+        "tokenizer_path": getattr(tokenizer, "name_or_path", None),
+    }
+
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, EncodeHandler)
+        where = f"unix://{socket_path}"
+    else:
+        server = LocalHTTPServer((host, port), EncodeHandler)
+        where = f"http://{host}:{port}"
+    logger.info(f"Embedding service for {encoder.model_name} listening on {where}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+# === Client ===
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=SERVICE_TIMEOUT):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class ServiceClient:
+    def __init__(self, url, timeout=SERVICE_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self._parsed = urlparse(url)
+
+    def _connection(self):
+        if self._parsed.scheme == "unix":
+            return UnixHTTPConnection(self._parsed.path, timeout=self.timeout)
+        return http.client.HTTPConnection(self._parsed.hostname, self._parsed.port or 80, timeout=self.timeout)
+
+    def _request(self, method, path, body=None):
+        conn = self._connection()
+        try:
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+            if response.status != 200:
+                raise http.client.HTTPException(f"{response.status}: {data[:200]!r}")
+            return response, data
+        finally:
+            conn.close()
+
+    def encode(self, texts, normalize=False):
+        body = json.dumps({"texts": texts, "normalize": normalize})
+        response, data = self._request("POST", "/encode", body)
+        count = int(response.getheader("X-Vector-Count"))
+        values = array("f")
+        values.frombytes(data)
+        dims = len(values) // count if count else 0
+        return [values[i * dims:(i + 1) * dims].tolist() for i in range(count)]
+
+    def info(self):
+        return json.loads(self._request("GET", "/info")[1])
+
+
+class ServiceEncoder:
+    """Encoder that prefers the embedding service and falls back to an in-process model.
+
+    Nothing is loaded or connected until the first call, so importing the web app
+    or a script is cheap. A failed service call switches to the local model (loaded
+    once) for ``retry_interval`` seconds before the service is tried again.
+    """
+
+    def __init__(self, service_url=EMBEDDING_SERVICE_URL, batch_size=embeddings.DEFAULT_BATCH_SIZE,
+                 retry_interval=SERVICE_RETRY_SECONDS):
+        self.client = ServiceClient(service_url) if service_url else None
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self._local = None
+        self._model = None
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def local(self):
+        """The in-process CachedEncoder, loaded on first use."""
+        with self._lock:
+            if self._local is None:
+                logger.info("Loading in-process embedding model")
+                self._local = embeddings.load_encoder(batch_size=self.batch_size)
+            return self._local
+
+    def _service_available(self):
+        return self.client is not None and time.monotonic() >= self._down_until
+
+    def _service_failed(self, error):
+        logger.warning(f"Embedding service unavailable ({str(error)}); "
+                       f"using the in-process model for {self.retry_interval:.0f}s")
+        self._down_until = time.monotonic() + self.retry_interval
+
+    def encode(self, texts, normalize=False, memory=False):
+        if not texts:
+            return []
+        if self._service_available():
+            try:
+                return self.client.encode(list(texts), normalize=normalize)
+            except (OSError, http.client.HTTPException) as e:
+                self._service_failed(e)
+        return self.local.encode(texts, normalize=normalize, memory=memory)
+
+    def encode_query(self, text, normalize=False):
+        return self.encode([text], normalize=normalize, memory=True)[0]
+
+    @property
+    def model(self):
+        """What ``Chunker.for_model`` needs: the tokenizer and max sequence length.
+
+        With the service up, only the tokenizer is loaded here (from the path the
+        service reports), not the model weights.
+        """
+        if self._model is None:
+            self._model = self._service_model() or self.local.model
+        return self._model
+
+    def _service_model(self):
+        if not self._service_available():
+            return None
+        try:
+            info = self.client.info()
+        except (OSError, http.client.HTTPException) as e:
+            self._service_failed(e)
+            return None
+        if not info.get("tokenizer_path"):
+            return None
+        from transformers import AutoTokenizer
+
+        return SimpleNamespace(
+            tokenizer=AutoTokenizer.from_pretrained(info["tokenizer_path"]),
+            max_seq_length=info["max_seq_length"]
+        )
+
+
+def get_encoder(batch_size=embeddings.DEFAULT_BATCH_SIZE):
+    """The encoder every entry point should use: service-backed when configured, lazy either way."""
+    return ServiceEncoder(batch_size=batch_size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the embedding model to local processes.")
+    parser.add_argument("--socket", help="Unix socket path (otherwise HTTP on --host/--port)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch", type=int, default=SERVICE_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=SERVICE_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    serve(socket_path=args.socket, host=args.host, port=args.port,
+          max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
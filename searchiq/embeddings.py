@@ -0,0 +1,194 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from searchiq.metrics import EMBED_BATCH_SIZE, EMBEDDED_TEXTS, timed
+
+# === Config ===
+MODEL_NAME = "all-MiniLM-L6-v2"
+DEFAULT_BATCH_SIZE = 64
+CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", os.path.join(".cache", "embeddings.sqlite3"))
+CACHE_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", 500000))
+MEMORY_CACHE_ENTRIES = int(os.environ.get("EMBEDDING_MEMORY_CACHE_ENTRIES", 4096))
+
+
+# === Embedding helpers ===
+def encode_batched(model, texts, batch_size=DEFAULT_BATCH_SIZE, normalize=False):
+    """Encode texts in large batches, running each distinct text through the model once.
+
+    Returns a list of vectors (plain lists of floats) aligned with ``texts``.
+    """
+    if not texts:
+        return []
+
+    unique_texts = list(dict.fromkeys(texts))
+    with timed("embed"):
+        vectors = model.encode(
+            unique_texts,
+            batch_size=batch_size,
+            normalize_embeddings=normalize,
+            show_progress_bar=False,
+        )
+    EMBEDDED_TEXTS.inc(len(unique_texts))
+    EMBED_BATCH_SIZE.observe(len(unique_texts))
+    by_text = {text: vector.tolist() for text, vector in zip(unique_texts, vectors)}
+    return [by_text[text] for text in texts]
+
+
+def cache_key(model_name, normalize, text):
+    """Content address of an embedding: model, normalization flag and text hash."""
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{model_name}:{int(bool(normalize))}:{digest}"
+
+
+# === Embedding cache ===
+class EmbeddingCache:
+    """Two-tier LRU cache of vectors: a small in-memory dict in front of a SQLite file.
+
+    The disk tier is bounded by ``max_entries``; once it grows past that the
+    least recently used rows are evicted. The file may be shared by several
+    processes, so the bound is checked against a fresh count on every write.
+    Pass ``path=None`` for memory only.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES,
+                 memory_entries=MEMORY_CACHE_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.misses = 0
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+            )
+            self._conn.commit()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys, memory=True):
+        """Return a ``{key: vector}`` dict for the keys present in either tier."""
+        found = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                if memory and key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                else:
+                    missing.append(key)
+
+            if missing and self._conn is not None:
+                now = time.time()
+                for start in range(0, len(missing), 500):
+                    batch = missing[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = array("f", blob).tolist()
+                        found[key] = vector
+                        if memory:
+                            self._remember(key, vector)
+                    if rows:
+                        self._conn.executemany(
+                            "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                            [(now, key) for key, _ in rows],
+                        )
+                self._conn.commit()
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items, memory=True):
+        """Store ``(key, vector)`` pairs, evicting least recently used rows past the bound."""
+        items = list(items)
+        with self._lock:
+            if memory:
+                for key, vector in items:
+                    self._remember(key, vector)
+            if self._conn is None or not items:
+                return
+            now = time.time()
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, array("f", vector).tobytes(), now) for key, vector in items],
+            )
+            if self._conn.total_changes > before:
+                # Counted inside the write transaction, so rows other processes added are included
+                overflow = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_entries
+                if overflow > 0:
+                    self._conn.execute(
+                        "DELETE FROM embeddings WHERE key IN "
+                        "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                        (overflow,),
+                    )
+            self._conn.commit()
+
+
+class CachedEncoder:
+    """Wraps a SentenceTransformer so every caller goes through the shared embedding cache."""
+
+    def __init__(self, model, model_name=MODEL_NAME, cache=None, batch_size=DEFAULT_BATCH_SIZE):
+        self.model = model
+        self.model_name = model_name
+        self.cache = cache if cache is not None else EmbeddingCache(path=None)
+        self.batch_size = batch_size
+
+    def encode(self, texts, normalize=False, memory=False):
+        """Encode texts, computing only those not already cached. Returns lists aligned with ``texts``.
+
+        Ingestion leaves ``memory`` off so large uploads don't flush hot query vectors.
+        """
+        keys = [cache_key(self.model_name, normalize, text) for text in texts]
+        cached = self.cache.get_many(list(dict.fromkeys(keys)), memory=memory)
+
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                pending.setdefault(key, text)
+        if pending:
+            vectors = encode_batched(self.model, list(pending.values()),
+                                     batch_size=self.batch_size, normalize=normalize)
+            fresh = list(zip(pending.keys(), vectors))
+            self.cache.put_many(fresh, memory=memory)
+            cached.update(fresh)
+
+        return [cached[key] for key in keys]
+
+    def encode_query(self, text, normalize=False):
+        """Encode a single search query through the in-memory tier."""
+        return self.encode([text], normalize=normalize, memory=True)[0]
+
+
+def load_encoder(model_name=MODEL_NAME, cache_path=CACHE_PATH, batch_size=DEFAULT_BATCH_SIZE):
+    """Load the sentence-transformer model behind the shared on-disk cache."""
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name)
+    return CachedEncoder(model, model_name=model_name,
+                         cache=EmbeddingCache(path=cache_path), batch_size=batch_size)
@@ -0,0 +1,78 @@
+import hashlib
+import re
+
+from searchiq.metrics import timed
+
+
+def extract_sections(text):
+    """Extract potential sections from text based on common patterns."""
+    sections = []
+    # Look for common section patterns
+    section_patterns = [
+        r'^(?:Chapter|Section)\s+\d+[.:]\s*(.+)$',
+        r'^(\d+\.\d+\s+.+)$',
+        r'^([A-Z][A-Za-z\s]+):$'
+    ]
+    
+    lines = text.split('\n')
+    current_section = "main"
+    section_text = []
+    
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+            
+        # Check if line matches any section pattern
+        is_section = False
+        for pattern in section_patterns:
+            match = re.match(pattern, line)
+            if match:
+                if section_text:
+                    sections.append({
+                        "name": current_section,
+                        "content": "\n".join(section_text)
+                    })
+                current_section = match.group(1)
+                section_text = []
+                is_section = True
+                break
+        
+        if not is_section:
+            section_text.append(line)
+    
+    # Add the last section
+    if section_text:
+        sections.append({
+            "name": current_section,
+            "content": "\n".join(section_text)
+        })
+    
+    return sections
+
+
+def content_hash(text, chunker):
+    """Fingerprint of a page's text and the chunking applied to it; changes when either does."""
+    return hashlib.sha256(f"{chunker.signature}\0{text}".encode("utf-8")).hexdigest()
+
+def extract_page(i, page, chunker):
+    """Pull text, sections, chunks and layout stats from one PDF page, or None if it has no text."""
+    with timed("pdf_extract"):
+        text = page.get_text()
+    if not text.strip():
+        return None
+    rect = page.rect
+    with timed("extract_sections"):
+        sections = extract_sections(text)
+    with timed("chunking"):
+        chunks = chunker.chunk_page(text, sections)
+    return {
+        "index": i,
+        "text": text,
+        "content_hash": content_hash(text, chunker),
+        "sections": sections,
+        "chunks": chunks,
+        "has_images": bool(page.get_images()),
+        "page_width": float(rect.width),
+        "page_height": float(rect.height)
+    }
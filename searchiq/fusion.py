@@ -0,0 +1,58 @@
+import os
+
+# === Config ===
+HYBRID_FUSION = os.environ.get("HYBRID_FUSION", "rrf")  # "rrf" or "weighted"
+HYBRID_WINDOW = int(os.environ.get("HYBRID_WINDOW", 50))
+RRF_K = int(os.environ.get("RRF_K", 60))
+HYBRID_LEXICAL_WEIGHT = float(os.environ.get("HYBRID_LEXICAL_WEIGHT", 1.0))
+HYBRID_VECTOR_WEIGHT = float(os.environ.get("HYBRID_VECTOR_WEIGHT", 1.0))
+
+RRF = "rrf"
+WEIGHTED = "weighted"
+
+
+def _hit_key(hit):
+    return hit.get("_index"), hit["_id"]
+
+
+def reciprocal_rank_fusion(result_lists, weights=None, k=RRF_K):
+    """Merge ranked hit lists by summing ``weight / (k + rank)`` per document.
+
+    Only ranks are used, so legs with incomparable score scales (BM25 vs cosine)
+    fuse cleanly. Returns ``[(hit, score)]`` best first.
+    """
+    weights = weights or [1.0] * len(result_lists)
+    scores, hits = {}, {}
+    for hits_list, weight in zip(result_lists, weights):
+        for rank, hit in enumerate(hits_list, start=1):
+            key = _hit_key(hit)
+            hits.setdefault(key, hit)
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank)
+    return sorted(((hits[key], score) for key, score in scores.items()), key=lambda item: -item[1])
+
+
+def weighted_score_fusion(result_lists, weights=None):
+    """Merge hit lists by min-max normalizing each leg's scores to [0, 1] and taking a weighted sum."""
+    weights = weights or [1.0] * len(result_lists)
+    scores, hits = {}, {}
+    for hits_list, weight in zip(result_lists, weights):
+        if not hits_list:
+            continue
+        leg_scores = [hit["_score"] or 0.0 for hit in hits_list]
+        low, high = min(leg_scores), max(leg_scores)
+        spread = high - low
+        for hit, raw in zip(hits_list, leg_scores):
+            key = _hit_key(hit)
+            hits.setdefault(key, hit)
+            normalized = (raw - low) / spread if spread else 1.0
+            scores[key] = scores.get(key, 0.0) + weight * normalized
+    return sorted(((hits[key], score) for key, score in scores.items()), key=lambda item: -item[1])
+
+
+def fuse(result_lists, method=HYBRID_FUSION, weights=None, rrf_k=RRF_K):
+    """Fuse ranked hit lists with the configured method."""
+    if method == WEIGHTED:
+        return weighted_score_fusion(result_lists, weights=weights)
+    if method == RRF:
+        return reciprocal_rank_fusion(result_lists, weights=weights, k=rrf_k)
+    raise ValueError(f"Unknown fusion method: {method}")
@@ -0,0 +1,89 @@
+from elasticsearch import helpers
+
+from searchiq.layout import CHUNK, DUPLICATE, PAGE, page_id
+from searchiq.storage import routing
+
+
+class Reconciler:
+    """Decides which pages of a re-uploaded file need re-embedding and which docs are orphaned.
+
+    Built from the docs already indexed for the file. Pages whose content hash is
+    unchanged keep their page and chunk docs as they are; every other existing doc
+    for the file that the new ingestion doesn't write again is deleted. Docs are
+    tracked as ``(index, id)`` pairs, since a file's docs may span partitions of a
+    shared index.
+    """
+
+    def __init__(self, file_name, page_hashes=None, chunks_by_page=None, existing=None, duplicates=None):
+        self.file_name = file_name
+        self.page_hashes = page_hashes or {}
+        self.chunks_by_page = chunks_by_page or {}
+        self.existing = existing or set()
+        self.duplicates = duplicates or set()
+        self.kept = set()
+        self.unchanged_pages = set()
+        self.pages_skipped = 0
+
+    @classmethod
+    def load(cls, es, index_name, file_name):
+        """Scan the docs currently indexed for ``file_name`` (only ids and hashes are fetched)."""
+        page_hashes, chunks_by_page, existing, duplicates = {}, {}, set(), set()
+        if not es.indices.exists(index=index_name):
+            return cls(file_name)
+        scan_params = {"routing": routing(file_name)} if routing(file_name) else {}
+        hits = helpers.scan(
+            es,
+            index=index_name,
+            query={
+                "query": {"term": {"file_name": file_name}},
+                "_source": ["doc_type", "page_id", "content_hash"]
+            },
+            **scan_params
+        )
+        for hit in hits:
+            key = (hit["_index"], hit["_id"])
+            existing.add(key)
+            source = hit.get("_source", {})
+            if source.get("doc_type") in (PAGE, DUPLICATE) and source.get("content_hash"):
+                page_hashes[hit["_id"]] = (hit["_index"], source["content_hash"])
+                if source["doc_type"] == DUPLICATE:
+                    duplicates.add(hit["_id"])
+            elif source.get("doc_type") == CHUNK:
+                chunks_by_page.setdefault(source.get("page_id"), []).append(key)
+        return cls(file_name, page_hashes, chunks_by_page, existing, duplicates)
+
+    def unchanged(self, page_info):
+        """True if the page is already indexed with identical content; its docs are then kept."""
+        doc_id = page_id(self.file_name, page_info["index"])
+        indexed = self.page_hashes.get(doc_id)
+        if indexed is None or indexed[1] != page_info["content_hash"]:
+            return False
+        self.kept.add((indexed[0], doc_id))
+        self.kept.update(self.chunks_by_page.get(doc_id, []))
+        self.unchanged_pages.add(doc_id)
+        self.pages_skipped += 1
+        return True
+
+    def is_duplicate(self, page_info):
+        """Whether the page is indexed as a near-duplicate's stand-in rather than with its own chunks."""
+        return page_id(self.file_name, page_info["index"]) in self.duplicates
+
+    def replaced_pages(self):
+        """Ids of the file's previously indexed (canonical) pages that this ingestion didn't keep unchanged."""
+        return sorted(doc_id for doc_id in self.page_hashes
+                      if doc_id not in self.duplicates and doc_id not in self.unchanged_pages)
+
+    def track(self, actions):
+        """Pass actions through, remembering the docs they write."""
+        for action in actions:
+            self.kept.add((action["_index"], action["_id"]))
+            yield action
+
+    def delete_actions(self):
+        """Bulk delete actions for previously indexed docs that were not written or kept."""
+        file_routing = routing(self.file_name)
+        for index_name, doc_id in sorted(self.existing - self.kept):
+            action = {"_op_type": "delete", "_index": index_name, "_id": doc_id}
+            if file_routing:
+                action["_routing"] = file_routing
+            yield action
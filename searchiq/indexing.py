@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from elasticsearch import helpers
+
+from searchiq.metrics import INDEX_FAILURES, INDEXED_DOCS, timed
+from searchiq.quantization import quantized_actions
+
+logger = logging.getLogger(__name__)
+
+# === Config ===
+BULK_CHUNK_SIZE = int(os.environ.get("BULK_CHUNK_SIZE", 500))
+BULK_MAX_CHUNK_BYTES = int(os.environ.get("BULK_MAX_CHUNK_BYTES", 10 * 1024 * 1024))
+BULK_THREADS = int(os.environ.get("BULK_THREADS", 2))
+BULK_MAX_RETRIES = int(os.environ.get("BULK_MAX_RETRIES", 3))
+BULK_INITIAL_BACKOFF = float(os.environ.get("BULK_INITIAL_BACKOFF", 2))
+
+
+def batched(items, size):
+    """Yield lists of up to ``size`` items from any iterable without materializing it."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def chunk_actions(actions, chunk_size=BULK_CHUNK_SIZE, max_chunk_bytes=BULK_MAX_CHUNK_BYTES):
+    """Group a stream of bulk actions into chunks bounded by count and serialized size."""
+    chunk, chunk_bytes = [], 0
+    for action in actions:
+        size = len(json.dumps(action, default=str).encode("utf-8")) + 1
+        if chunk and (len(chunk) >= chunk_size or chunk_bytes + size > max_chunk_bytes):
+            yield chunk
+            chunk, chunk_bytes = [], 0
+        chunk.append(action)
+        chunk_bytes += size
+    if chunk:
+        yield chunk
+
+
+def _is_retryable(item):
+    status = next(iter(item.values())).get("status")
+    return not isinstance(status, int) or status == 429 or status >= 500
+
+
+def index_chunk(es, chunk, max_retries=BULK_MAX_RETRIES, initial_backoff=BULK_INITIAL_BACKOFF):
+    """Send one chunk through ``streaming_bulk``, retrying failed docs with exponential backoff.
+
+    Returns ``(success, failed)`` counts for the chunk. Mapping and validation errors
+    are not retried; rejections (429), server errors and connection errors are.
+    """
+    with timed("bulk_index"):
+        success, failed = _send_with_retries(es, chunk, max_retries, initial_backoff)
+    INDEXED_DOCS.inc(success)
+    INDEX_FAILURES.inc(failed)
+    return success, failed
+
+
+def _send_with_retries(es, chunk, max_retries, initial_backoff):
+    pending = chunk
+    success = failed = 0
+    for attempt in range(max_retries + 1):
+        retry = []
+        results = helpers.streaming_bulk(
+            es, pending,
+            chunk_size=len(pending),
+            raise_on_error=False,
+            raise_on_exception=False,
+            max_retries=0,
+        )
+        for action, (ok, item) in zip(pending, results):
+            if ok:
+                success += 1
+            elif _is_retryable(item) and attempt < max_retries:
+                retry.append(action)
+            else:
+                failed += 1
+                logger.warning(f"Bulk item failed: {item}")
+        if not retry:
+            return success, failed
+        delay = initial_backoff * (2 ** attempt)
+        logger.info(f"Retrying {len(retry)} failed docs in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+        time.sleep(delay)
+        pending = retry
+    return success, failed
+
+
+def bulk_index(es, actions, chunk_size=BULK_CHUNK_SIZE, max_chunk_bytes=BULK_MAX_CHUNK_BYTES,
+               threads=BULK_THREADS, max_retries=BULK_MAX_RETRIES,
+               initial_backoff=BULK_INITIAL_BACKOFF, on_chunk=None):
+    """Stream ``actions`` (any iterable, typically a generator) into Elasticsearch.
+
+    Chunks are sent by up to ``threads`` workers with at most two chunks in flight
+    per worker, so memory stays bounded no matter how many actions are produced.
+    ``on_chunk(success, failed)`` is called as each chunk completes. Vectors bound
+    for int8-quantized indices get their quantized copy on the way through.
+    Returns total ``(success, failed)``.
+    """
+    total_success = total_failed = 0
+
+    def record(success, failed):
+        nonlocal total_success, total_failed
+        total_success += success
+        total_failed += failed
+        logger.info(f"Bulk chunk: {success} indexed, {failed} failed")
+        if on_chunk is not None:
+            on_chunk(success, failed)
+
+    chunks = chunk_actions(quantized_actions(es, actions), chunk_size=chunk_size, max_chunk_bytes=max_chunk_bytes)
+    if threads <= 1:
+        for chunk in chunks:
+            record(*index_chunk(es, chunk, max_retries=max_retries, initial_backoff=initial_backoff))
+        return total_success, total_failed
+
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="bulk") as executor:
+        in_flight = set()
+        try:
+            for chunk in chunks:
+                if len(in_flight) >= threads * 2:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        record(*future.result())
+                in_flight.add(executor.submit(index_chunk, es, chunk, max_retries, initial_backoff))
+        finally:
+            # Account for chunks already sent, even if the producer raised
+            for future in in_flight:
+                record(*future.result())
+    return total_success, total_failed
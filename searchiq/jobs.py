@@ -0,0 +1,327 @@
+"""Background ingestion jobs: a bounded worker pool plus progress records.
+
+Jobs run in threads of the process that accepted the upload. Their state is
+also written to a SQLite file (``JOB_STORE_PATH``) so every worker process
+sharing it can report on and cancel any job, and so a job whose process died
+shows up as failed instead of vanishing.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# === Config ===
+JOB_STORE_PATH = os.environ.get("JOB_STORE_PATH", os.path.join(".cache", "jobs.sqlite3"))
+# Progress counters are written at most this often; status changes are written at once
+PERSIST_INTERVAL = 0.5
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = {COMPLETED, FAILED, CANCELLED}
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's work function once cancellation has been requested."""
+
+
+class JobQueueFull(Exception):
+    """Raised when the pool already holds as many jobs as it is allowed to queue."""
+
+
+class Job:
+    """Progress record for one background ingestion run."""
+
+    def __init__(self, store=None, **meta):
+        self.id = uuid.uuid4().hex
+        self.store = store
+        self.meta = meta
+        self.status = QUEUED
+        self.stage = None
+        self.pages_total = 0
+        self.pages_done = 0
+        self.pages_skipped = 0
+        self.pages_duplicate = 0
+        self.docs_indexed = 0
+        self.docs_failed = 0
+        self.error = None
+        self.result = None
+        self.created_at = datetime.utcnow().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._persisted_at = 0.0
+        # Held from snapshot to write, so a stale snapshot can't land after a newer one
+        self._persist_lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    def update(self, **fields):
+        """Set progress fields from the worker thread."""
+        with self._lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+        self.persist(force="status" in fields or "finished_at" in fields)
+
+    def increment(self, **deltas):
+        """Add to counters such as ``pages_done`` or ``docs_indexed``."""
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+        self.persist()
+
+    def persist(self, force=False):
+        """Write the job's state to the store, throttled to one write per ``PERSIST_INTERVAL``."""
+        if self.store is None:
+            return
+        with self._persist_lock:
+            now = time.monotonic()
+            if not force and now - self._persisted_at < PERSIST_INTERVAL:
+                return
+            self._persisted_at = now
+            try:
+                self.store.save(self.to_dict())
+            except sqlite3.Error as e:
+                logger.warning(f"Could not persist job {self.id}: {str(e)}")
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        """Call between units of work; raises ``JobCancelled`` if the job was cancelled.
+
+        Cancellation requested through another worker process arrives via the store.
+        """
+        if not self._cancel.is_set() and self.store is not None and self.store.cancel_requested(self.id):
+            self._cancel.set()
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "job_id": self.id,
+                **self.meta,
+                "status": self.status,
+                "stage": self.stage,
+                "pages_total": self.pages_total,
+                "pages_done": self.pages_done,
+                "pages_skipped": self.pages_skipped,
+                "pages_duplicate": self.pages_duplicate,
+                "docs_indexed": self.docs_indexed,
+                "docs_failed": self.docs_failed,
+                "cancel_requested": self._cancel.is_set(),
+                "error": self.error,
+                "result": self.result,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class StoredJob:
+    """Read-only view of a job run by another worker process, or by one that has exited."""
+
+    def __init__(self, state):
+        self.id = state["job_id"]
+        self.state = state
+
+    @property
+    def finished(self):
+        return self.state["status"] in FINISHED_STATES
+
+    def to_dict(self):
+        return dict(self.state)
+
+
+def process_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobStore:
+    """Job states in a SQLite file shared by the worker processes of one host."""
+
+    def __init__(self, path=JOB_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, created_at TEXT NOT NULL, finished INTEGER NOT NULL, "
+            "owner_pid INTEGER NOT NULL, cancel_requested INTEGER NOT NULL DEFAULT 0, state TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created_at)")
+        self._conn.commit()
+
+    def save(self, state, owner_pid=None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, created_at, finished, owner_pid, state) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (job_id) DO UPDATE SET finished = excluded.finished, state = excluded.state",
+                (state["job_id"], state["created_at"], state["status"] in FINISHED_STATES,
+                 owner_pid or os.getpid(), json.dumps(state))
+            )
+            self._conn.commit()
+
+    def _view(self, row):
+        """Rebuild a state from a row; an unfinished job whose process is gone is marked failed."""
+        state_json, owner_pid, cancel_requested = row
+        state = json.loads(state_json)
+        state["cancel_requested"] = state["cancel_requested"] or bool(cancel_requested)
+        if state["status"] not in FINISHED_STATES and not process_alive(owner_pid):
+            state.update(status=FAILED, error="Worker process exited before the job finished",
+                         finished_at=datetime.utcnow().isoformat())
+            self.save(state, owner_pid)
+        return state
+
+    def load(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state, owner_pid, cancel_requested FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return None if row is None else self._view(row)
+
+    def recent(self, limit):
+        """The ``limit`` most recently created jobs, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, owner_pid, cancel_requested FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._view(row) for row in reversed(rows)]
+
+    def request_cancel(self, job_id):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE job_id = ? AND NOT finished", (job_id,))
+            self._conn.commit()
+
+    def cancel_requested(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def prune(self, keep_finished):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE finished AND job_id NOT IN ("
+                "SELECT job_id FROM jobs WHERE finished ORDER BY created_at DESC LIMIT ?)", (keep_finished,)
+            )
+            self._conn.commit()
+
+
+class JobManager:
+    """Bounded worker pool running ingestion jobs in the background.
+
+    At most ``max_workers`` jobs run at once and at most ``max_pending`` more
+    wait in the queue; anything beyond that is rejected with ``JobQueueFull``.
+    The last ``keep_finished`` finished jobs stay queryable. The limits apply
+    per process; with a ``JobStore``, jobs of other processes can be read and
+    cancelled too.
+    """
+
+    def __init__(self, max_workers=2, max_pending=8, keep_finished=100, store=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _active_count(self):
+        return sum(1 for job in self._jobs.values() if not job.finished)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
+
+    def submit(self, fn, *args, **meta):
+        """Queue ``fn(job, *args)`` and return its ``Job`` right away."""
+        job = Job(store=self.store, **meta)
+        with self._lock:
+            if self._active_count() >= self.max_workers + self.max_pending:
+                raise JobQueueFull(f"{self.max_workers + self.max_pending} ingestion jobs already queued")
+            self._prune()
+            self._jobs[job.id] = job
+        if self.store is not None:
+            job.persist(force=True)
+            self.store.prune(self.keep_finished)
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def _run(self, job, fn, args):
+        # fn still runs for jobs cancelled while queued so it can clean up;
+        # its first check_cancelled() call ends it.
+        job.update(status=RUNNING, started_at=datetime.utcnow().isoformat())
+        try:
+            result = fn(job, *args)
+            job.update(status=COMPLETED, result=result)
+        except JobCancelled:
+            logger.info(f"Job {job.id} cancelled")
+            job.update(status=CANCELLED)
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}")
+            job.update(status=FAILED, error=str(e))
+        finally:
+            job.update(finished_at=datetime.utcnow().isoformat())
+
+    def get(self, job_id):
+        """The job, live if it runs in this process; ``None`` if it is unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            state = self.store.load(job_id)
+            job = None if state is None else StoredJob(state)
+        return job
+
+    def list(self):
+        with self._lock:
+            local = list(self._jobs.values())
+        if self.store is None:
+            return local
+        live = {job.id: job for job in local}
+        stored = self.store.recent(self.keep_finished + len(local))
+        return [live.get(state["job_id"]) or StoredJob(state) for state in stored]
+
+    def cancel(self, job_id):
+        """Request cancellation; returns the job, or ``None`` if it is unknown."""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+        if isinstance(job, StoredJob):
+            # The owning process picks this up at its next check_cancelled()
+            self.store.request_cancel(job_id)
+            return self.get(job_id)
+        job.cancel()
+        job.persist(force=True)
+        return job
@@ -0,0 +1,164 @@
+"""Compact index layout: one metadata doc per file, one page doc per page, one chunk doc per chunk.
+
+Pages and chunks repeat only the small fields search filters on, plus ``doc_title``
+so title matches still work; vectors and ``doc_title`` are kept out of ``_source``.
+"""
+from searchiq.quantization import INT8, QUANTIZED_FIELD, VECTOR_QUANTIZATION, supported_quantization
+from searchiq.storage import id_prefix, routing
+from searchiq.terms import frequent_terms
+from searchiq.vectors import EXACT, VECTOR_SEARCH_MODE, supported_mode, vector_mapping
+
+DOCUMENT = "document"
+PAGE = "page"
+CHUNK = "chunk"
+# A page near-duplicating one already indexed: kept for page views, but without chunks and not searched
+DUPLICATE = "duplicate"
+
+# Fields copied from the file metadata onto every page and chunk for filtering
+FILTER_FIELDS = ("file_name", "file_type", "upload_timestamp")
+SOURCE_EXCLUDES = ["vector", QUANTIZED_FIELD, "doc_title"]
+
+
+def index_mapping(dims, mode=VECTOR_SEARCH_MODE, quantization=VECTOR_QUANTIZATION):
+    """Mapping for an index using the compact layout.
+
+    With int8 quantization, similarity search runs on ``vector_int8`` and ``vector``
+    is kept unindexed for rescoring; the scale is added to ``_meta`` on first write.
+    """
+    mapping = {
+        "_source": {"excludes": SOURCE_EXCLUDES},
+        "properties": {
+            "doc_type": {"type": "keyword"},
+            # Shared filter fields
+            "file_name": {"type": "keyword"},
+            "file_type": {"type": "keyword"},
+            "upload_timestamp": {"type": "date"},
+            "doc_title": {"type": "text"},
+            # Document-level metadata
+            "title": {"type": "text"},
+            "author": {"type": "text"},
+            "producer": {"type": "text"},
+            "file_size": {"type": "long"},
+            "total_pages": {"type": "integer"},
+            "creation_date": {"type": "date"},
+            "modification_date": {"type": "date"},
+            "language": {"type": "keyword"},
+            "last_modified": {"type": "date"},
+            # Pages and chunks
+            "content": {"type": "text"},
+            "page_number": {"type": "integer"},
+            "content_length": {"type": "integer"},
+            "has_images": {"type": "boolean"},
+            "page_width": {"type": "float"},
+            "page_height": {"type": "float"},
+            "word_count": {"type": "integer"},
+            "reading_time": {"type": "integer"},
+            "keywords": {"type": "keyword"},
+            "content_hash": {"type": "keyword", "index": False},
+            "page_id": {"type": "keyword"},
+            "section": {"type": "keyword"},
+            "chunk_index": {"type": "integer"},
+            "duplicate_of": {"type": "keyword"},
+            "duplicate_file": {"type": "keyword"},
+            "vector": vector_mapping(dims, mode=mode)
+        }
+    }
+    if quantization == INT8:
+        mapping["properties"]["vector"] = vector_mapping(dims, mode=EXACT)
+        mapping["properties"][QUANTIZED_FIELD] = vector_mapping(dims, mode=mode, element_type="byte")
+        mapping["_meta"] = {"quantization": {"type": INT8}}
+    return mapping
+
+
+def supported_index_mapping(es, dims, mode=VECTOR_SEARCH_MODE, quantization=VECTOR_QUANTIZATION):
+    """``index_mapping`` with the vector mode and quantization downgraded to what the server supports."""
+    return index_mapping(dims, mode=supported_mode(es, mode), quantization=supported_quantization(es, quantization))
+
+
+def document_id(file_name):
+    return f"{id_prefix(file_name)}{DOCUMENT}"
+
+
+def page_id(file_name, page_index):
+    return f"{id_prefix(file_name)}page-{page_index}"
+
+
+def chunk_id(file_name, page_index, chunk_index):
+    return f"{id_prefix(file_name)}page-{page_index}-chunk-{chunk_index}"
+
+
+def action(index_name, doc_id, source):
+    """Bulk index action, routed by file in shared storage mode."""
+    result = {"_index": index_name, "_id": doc_id, "_source": source}
+    file_routing = routing(source["file_name"])
+    if file_routing:
+        result["_routing"] = file_routing
+    return result
+
+
+def filter_fields(file_meta):
+    return {
+        **{field: file_meta[field] for field in FILTER_FIELDS},
+        "doc_title": file_meta.get("title", "")
+    }
+
+
+def document_action(index_name, file_meta):
+    """The single metadata doc for an uploaded file."""
+    return action(index_name, document_id(file_meta["file_name"]), {
+        **file_meta,
+        "doc_type": DOCUMENT,
+        "language": "en",  # Can be enhanced with language detection
+        "last_modified": file_meta["upload_timestamp"]
+    })
+
+
+def page_actions(page_info, vectors, index_name, file_meta):
+    """Yield the page doc and its chunk docs, consuming one vector per chunk.
+
+    A page with ``duplicate_of`` set yields only its page doc, as a reference to the canonical page.
+    """
+    i = page_info["index"]
+    text = page_info["text"]
+    file_name = file_meta["file_name"]
+    shared = filter_fields(file_meta)
+
+    # Calculate reading time (assuming average reading speed of 200 words per minute)
+    word_count = len(text.split())
+    reading_time = max(1, word_count // 200)
+
+    # TF-IDF keywords when the whole file was seen first, otherwise the page's most frequent terms
+    keywords = page_info.get("keywords") or frequent_terms(text)
+
+    page = {
+        **shared,
+        "doc_type": PAGE,
+        "content": text,
+        "content_hash": page_info["content_hash"],
+        "page_number": i + 1,
+        "content_length": len(text),
+        "has_images": page_info["has_images"],
+        "page_width": page_info["page_width"],
+        "page_height": page_info["page_height"],
+        "word_count": word_count,
+        "reading_time": reading_time,
+        "keywords": keywords
+    }
+    duplicate_of = page_info.get("duplicate_of")
+    if duplicate_of:
+        page.update(doc_type=DUPLICATE, duplicate_of=duplicate_of["doc_id"], duplicate_file=duplicate_of["file_name"])
+        yield action(index_name, page_id(file_name, i), page)
+        return
+    yield action(index_name, page_id(file_name, i), page)
+
+    for chunk in page_info["chunks"]:
+        yield action(index_name, chunk_id(file_name, i, chunk["chunk_index"]), {
+            **shared,
+            "doc_type": CHUNK,
+            "content": chunk["text"],
+            "page_id": page_id(file_name, i),
+            "page_number": i + 1,
+            "section": chunk["section"],
+            "chunk_index": chunk["chunk_index"],
+            "vector": next(vectors)
+        })
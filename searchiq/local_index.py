@@ -0,0 +1,969 @@
+"""Embedded, on-disk stand-in for the Elasticsearch client, for running without a cluster.
+
+``LocalElasticsearch`` implements the client calls SearchIQ makes (bulk,
+search, msearch, mget, get, count, scroll, points in time, delete_by_query and
+the index and alias APIs), so ``bulk_index``, ``helpers.scan`` and the search
+routes work unchanged. Each index is a directory holding:
+
+* ``meta.json``: mappings, aliases and counters
+* ``segments/*.json``: document fields, column by column, one file per write
+* ``vectors/<field>.bin``: a float32 (or ``LOCAL_VECTOR_DTYPE``) matrix per
+  dense_vector field, appended to and read through ``numpy.memmap``
+* ``deleted.log``: rows replaced or deleted since the last ``forcemerge``
+
+Nothing is read until an index is first used and writes only append. A write
+commits when ``meta.json`` is replaced; vectors or segments a crashed write left
+behind are dropped on load. Vector search is an exact, batched cosine top-k.
+
+A data directory has a single writer: the first write takes an exclusive lock
+on ``writer.lock`` for the rest of the process, and writes from any other
+process raise ``WriterLocked``. Readers need no lock but load each index once,
+so they don't see writes made by the writer afterwards.
+"""
+import fnmatch
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import numpy as np
+from elasticsearch import NotFoundError, RequestError
+from elasticsearch.serializer import JSONSerializer
+
+try:
+    import fcntl
+except ImportError:  # Windows: the single-writer rule isn't enforced
+    fcntl = None
+
+from searchiq.local_query import (
+    VECTOR_BATCH_ROWS, Postings, Searcher, highlight, query_terms, top_k, unsupported
+)
+
+# === Config ===
+LOCAL_VECTOR_DTYPE = os.environ.get("LOCAL_VECTOR_DTYPE", "float32")
+LOCAL_MAX_SEGMENTS = int(os.environ.get("LOCAL_MAX_SEGMENTS", 32))
+FILTER_CACHE_ENTRIES = 256
+MAX_OPEN_CONTEXTS = 1000
+TEXT_TYPES = ("text", "match_only_text")
+WRITER_LOCK = "writer.lock"
+
+_writer_locks = {}
+_writer_locks_lock = threading.Lock()
+
+
+def _write_json(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+class WriterLocked(RuntimeError):
+    """Another process is writing to the data directory."""
+
+
+def claim_writer(data_dir):
+    """Make this process the data directory's only writer, for as long as it runs.
+
+    Concurrent writers would each replace ``meta.json`` from their own view of
+    the index, losing the other's writes.
+    """
+    key = os.path.realpath(data_dir)
+    if fcntl is None or key in _writer_locks:
+        return
+    with _writer_locks_lock:
+        if key in _writer_locks:
+            return
+        f = open(os.path.join(key, WRITER_LOCK), "a+")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.seek(0)
+            owner = f.read().strip() or "unknown"
+            f.close()
+            raise WriterLocked(f"{data_dir} is being written by another process (pid {owner})") from None
+        f.truncate(0)
+        f.write(str(os.getpid()))
+        f.flush()
+        # Held open, and so locked, until the process exits
+        _writer_locks[key] = f
+
+
+def not_found(kind, name):
+    return NotFoundError(404, kind, {"error": f"{kind} [{name}]"})
+
+
+# === One index ===
+class LocalIndex:
+    """Rows of one index: column lists in memory, vectors memory-mapped, loaded on first use."""
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        self.name = os.path.basename(path)
+        self._loaded = False
+        self._postings = {}
+        self._matrices = {}
+        self._slots = {}
+        self._live = None
+        self._filter_cache = OrderedDict()
+
+    # --- layout ---
+    @property
+    def properties(self):
+        return self.meta["mappings"].get("properties", {})
+
+    def vector_fields(self):
+        return {name: spec["dims"] for name, spec in self.properties.items() if spec.get("type") == "dense_vector"}
+
+    def vector_dtype(self, field):
+        # byte vectors (element_type "byte") are already quantized; keep them at one byte per dimension
+        return "int8" if self.properties[field].get("element_type") == "byte" else self.meta["dtype"]
+
+    def is_text(self, field):
+        return self.properties.get(field, {}).get("type") in TEXT_TYPES
+
+    def text_fields(self, pattern):
+        if "*" not in pattern:
+            return [pattern]
+        return [name for name, spec in self.properties.items()
+                if spec.get("type") in TEXT_TYPES and fnmatch.fnmatch(name, pattern)]
+
+    def source_excludes(self):
+        return self.meta["mappings"].get("_source", {}).get("excludes", [])
+
+    # --- loading ---
+    def load(self):
+        if self._loaded:
+            return
+        self.ids, self.routings, self.columns, self.row_of = [], [], {}, {}
+        for segment in self.meta["segments"]:
+            with open(os.path.join(self.path, "segments", segment)) as f:
+                self._extend(json.load(f))
+        self.deleted = set()
+        deleted_path = os.path.join(self.path, "deleted.log")
+        if os.path.exists(deleted_path):
+            with open(deleted_path) as f:
+                self.deleted.update(int(line) for line in f if line.strip())
+        # Rows replaced by a later row with the same id, in case the write crashed before logging them
+        self.deleted.update(row for row, doc_id in enumerate(self.ids) if self.row_of[doc_id] != row)
+        for doc_id, row in list(self.row_of.items()):
+            if row in self.deleted:
+                del self.row_of[doc_id]
+        self._truncate_vectors()
+        self._loaded = True
+
+    def _truncate_vectors(self):
+        """Cut vector files back to the slots in meta.json, dropping vectors of a write that never committed."""
+        for field, dims in self.vector_fields().items():
+            slots = self.meta["vector_slots"].get(field, 0)
+            base = os.path.join(self.path, "vectors", field)
+            row_bytes = {f"{base}.bin": dims * np.dtype(self.vector_dtype(field)).itemsize, f"{base}.norms": 4}
+            for path, size in row_bytes.items():
+                if os.path.exists(path) and os.path.getsize(path) > slots * size:
+                    with open(path, "r+b") as f:
+                        f.truncate(slots * size)
+
+    def _extend(self, segment):
+        start = len(self.ids)
+        count = len(segment["ids"])
+        for field in segment["columns"]:
+            if field not in self.columns:
+                self.columns[field] = [None] * start
+        for field, column in self.columns.items():
+            column.extend(segment["columns"].get(field) or [None] * count)
+        for offset, doc_id in enumerate(segment["ids"]):
+            self.row_of[doc_id] = start + offset
+        self.ids.extend(segment["ids"])
+        self.routings.extend(segment["routing"])
+        for field, postings in self._postings.items():
+            for row in range(start, start + count):
+                postings.add(row, self.columns[field][row])
+        self._changed()
+
+    def _changed(self):
+        # Row sets, slot arrays and cached filters all describe the rows as they were
+        self._live = None
+        self._slots.clear()
+        self._filter_cache.clear()
+
+    @property
+    def rows(self):
+        self.load()
+        return len(self.ids)
+
+    def live_rows(self):
+        """Rows holding the current version of a doc; shared, so callers must not modify it."""
+        self.load()
+        if self._live is None:
+            self._live = frozenset(self.row_of.values())
+        return self._live
+
+    def postings(self, field):
+        """BM25 postings for a text field, built the first time it is searched."""
+        if field not in self._postings:
+            postings = Postings()
+            for row, value in enumerate(self.columns.get(field, [])):
+                if value is not None:
+                    postings.add(row, value)
+            self._postings[field] = postings
+        return self._postings[field]
+
+    def matrix(self, field):
+        slots = self.meta["vector_slots"].get(field, 0)
+        cached = self._matrices.get(field)
+        if cached is None or cached[0].shape[0] != slots:
+            dims = self.vector_fields()[field]
+            base = os.path.join(self.path, "vectors", field)
+            if not slots:
+                cached = (np.zeros((0, dims), dtype=self.vector_dtype(field)), np.zeros(0, dtype=np.float32))
+            else:
+                cached = (
+                    np.memmap(f"{base}.bin", dtype=self.vector_dtype(field), mode="r", shape=(slots, dims)),
+                    np.memmap(f"{base}.norms", dtype=np.float32, mode="r", shape=(slots,))
+                )
+            self._matrices[field] = cached
+        return cached
+
+    def slots(self, field):
+        """Each row's slot in ``field``'s vector matrix, -1 where it has none."""
+        if field not in self._slots:
+            column = self.columns.get(field, [])
+            self._slots[field] = np.fromiter((-1 if slot is None else slot for slot in column),
+                                             dtype=np.int64, count=len(column))
+        return self._slots[field]
+
+    def cosine(self, field, query_vector, rows):
+        """``(rows, similarities)`` for the given rows that have ``field``, in batches of matrix rows."""
+        all_slots = self.slots(field)
+        rows = np.fromiter(rows, dtype=np.int64)
+        rows = rows[rows < len(all_slots)]
+        rows = rows[all_slots[rows] >= 0]
+        if not len(rows):
+            return rows, np.zeros(0, dtype=np.float32)
+        slots = all_slots[rows]
+        matrix, norms = self.matrix(field)
+        query = np.asarray(query_vector, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query)) or 1.0
+        similarities = np.empty(len(slots), dtype=np.float32)
+        # Slots are gathered in ascending order, so each batch reads the memmap front to back
+        order = np.argsort(slots, kind="stable")
+        for start in range(0, len(order), VECTOR_BATCH_ROWS):
+            batch = order[start:start + VECTOR_BATCH_ROWS]
+            picked = slots[batch]
+            if picked[-1] - picked[0] + 1 == len(picked):
+                # A contiguous run (the usual unfiltered case) is a plain slice of the memmap, no copy
+                picked = slice(int(picked[0]), int(picked[-1]) + 1)
+            dots = np.asarray(matrix[picked], dtype=np.float32) @ query
+            similarities[batch] = dots / (np.maximum(norms[picked], 1e-12) * query_norm)
+        return rows, similarities
+
+    def vector(self, field, slot):
+        return np.asarray(self.matrix(field)[0][slot], dtype=np.float32).tolist()
+
+    # --- filter cache ---
+    def filter_cache_get(self, key):
+        rows = self._filter_cache.get(key)
+        if rows is not None:
+            self._filter_cache.move_to_end(key)
+        return rows
+
+    def filter_cache_put(self, key, rows):
+        self._filter_cache[key] = rows
+        while len(self._filter_cache) > FILTER_CACHE_ENTRIES:
+            self._filter_cache.popitem(last=False)
+
+    # --- reading docs ---
+    def source(self, row, includes=None, excludes=None):
+        """A row's ``_source``, with vector slots turned back into vectors."""
+        vectors = self.vector_fields()
+        excluded = set(self.source_excludes()) | set(excludes or [])
+        source = {}
+        for field, column in self.columns.items():
+            value = column[row]
+            if value is None or field in excluded:
+                continue
+            if includes is not None and not any(fnmatch.fnmatch(field, pattern) for pattern in includes):
+                continue
+            source[field] = self.vector(field, value) if field in vectors else value
+        return source
+
+    def raw(self, row):
+        """A row's stored fields (vector fields as slots), for partial updates."""
+        return {field: column[row] for field, column in self.columns.items() if column[row] is not None}
+
+    # --- writing ---
+    def write(self, docs):
+        """Append ``(doc_id, routing, fields)`` rows, replacing earlier rows with the same ids.
+
+        Vector fields hold a list (a new vector to append) or an int (a slot already
+        stored, carried over by a partial update).
+        """
+        self.claim_writer()
+        self.load()
+        vectors = self.vector_fields()
+        new_vectors = {field: [] for field in vectors}
+        segment = {"ids": [], "routing": [], "columns": {}}
+        replaced = []
+        columns = segment["columns"]
+        for offset, (doc_id, routing, fields) in enumerate(docs):
+            for field, value in fields.items():
+                if field in vectors and isinstance(value, list):
+                    if len(value) != vectors[field]:
+                        raise ValueError(f"vector field [{field}] has {len(value)} dimensions, expected {vectors[field]}")
+                    new_vectors[field].append(value)
+                    value = self.meta["vector_slots"].get(field, 0) + len(new_vectors[field]) - 1
+                if field not in columns:
+                    columns[field] = [None] * offset
+                columns[field].append(value)
+            if len(fields) != len(columns):
+                for column in columns.values():
+                    if len(column) == offset:
+                        column.append(None)
+            segment["ids"].append(doc_id)
+            segment["routing"].append(routing)
+            if doc_id in self.row_of:
+                replaced.append(self.row_of[doc_id])
+
+        os.makedirs(os.path.join(self.path, "vectors"), exist_ok=True)
+        for field, values in new_vectors.items():
+            if not values:
+                continue
+            matrix = np.asarray(values, dtype=np.float32)
+            base = os.path.join(self.path, "vectors", field)
+            with open(f"{base}.bin", "ab") as f:
+                f.write(matrix.astype(self.vector_dtype(field)).tobytes())
+            with open(f"{base}.norms", "ab") as f:
+                f.write(np.linalg.norm(matrix, axis=1).astype(np.float32).tobytes())
+            self.meta["vector_slots"][field] = self.meta["vector_slots"].get(field, 0) + len(values)
+
+        name = f"{self.meta['next_segment']:08d}.json"
+        _write_json(os.path.join(self.path, "segments", name), segment)
+        self.meta["next_segment"] += 1
+        self.meta["segments"].append(name)
+        self._extend(segment)
+        merged = self._merge_segments() if len(self.meta["segments"]) > LOCAL_MAX_SEGMENTS else []
+        # Saving meta.json commits the write: vectors and segments it doesn't list are ignored on load
+        self.save_meta()
+        self._remove_segments(merged)
+        self.delete_rows(replaced, save=False)
+
+    def delete_rows(self, rows, save=True):
+        self.claim_writer()
+        if rows:
+            with open(os.path.join(self.path, "deleted.log"), "a") as f:
+                f.writelines(f"{row}\n" for row in rows)
+            self.deleted.update(rows)
+            for row in rows:
+                if self.row_of.get(self.ids[row]) == row:
+                    del self.row_of[self.ids[row]]
+        self._changed()
+        if save:
+            self.save_meta()
+
+    def _merge_segments(self):
+        """Fold every segment into one file; row numbers are unchanged.
+
+        Returns the replaced segment names, to remove once the new meta is saved.
+        """
+        name = f"{self.meta['next_segment']:08d}.json"
+        _write_json(os.path.join(self.path, "segments", name),
+                    {"ids": self.ids, "routing": self.routings, "columns": self.columns})
+        merged, self.meta["segments"] = self.meta["segments"], [name]
+        self.meta["next_segment"] += 1
+        return merged
+
+    def _remove_segments(self, names):
+        for name in names:
+            os.remove(os.path.join(self.path, "segments", name))
+
+    def compact(self):
+        """Rewrite the index without deleted rows, renumbering rows and vector slots."""
+        self.claim_writer()
+        self.load()
+        keep = [row for row in range(len(self.ids)) if row not in self.deleted]
+        vectors = self.vector_fields()
+        docs = [(self.ids[row], self.routings[row], {
+            field: (self.vector(field, value) if field in vectors else value)
+            for field, value in self.raw(row).items()
+        }) for row in keep]
+        for directory in ("segments", "vectors"):
+            shutil.rmtree(os.path.join(self.path, directory), ignore_errors=True)
+            os.makedirs(os.path.join(self.path, directory))
+        if os.path.exists(os.path.join(self.path, "deleted.log")):
+            os.remove(os.path.join(self.path, "deleted.log"))
+        self.meta.update(segments=[], vector_slots={})
+        self._loaded = False
+        self._postings.clear()
+        self._matrices.clear()
+        self.load()
+        self._changed()
+        if docs:
+            self.write(docs)
+        merged = self._merge_segments()
+        self.save_meta()
+        self._remove_segments(merged)
+
+    def claim_writer(self):
+        claim_writer(os.path.dirname(self.path))
+
+    def save_meta(self):
+        self.claim_writer()
+        _write_json(os.path.join(self.path, "meta.json"), self.meta)
+
+    def disk_bytes(self):
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(self.path) for name in names)
+
+
+# === Client ===
+class LocalIndices:
+    """The ``es.indices`` namespace."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def exists(self, index, **kwargs):
+        with self.client.lock:
+            return bool(self.client.resolve(index, missing_ok=True))
+
+    def create(self, index, body=None, **kwargs):
+        with self.client.lock:
+            return self.client.create_index(index, body or {})
+
+    def delete(self, index, **kwargs):
+        with self.client.lock:
+            for name, _ in self.client.resolve(index):
+                self.client.drop_index(name)
+            return {"acknowledged": True}
+
+    def get_mapping(self, index=None, **kwargs):
+        with self.client.lock:
+            return {name: {"mappings": self.client.index(name).meta["mappings"]}
+                    for name, _ in self.client.resolve(index or "*")}
+
+    def put_mapping(self, body, index=None, **kwargs):
+        with self.client.lock:
+            for name, _ in self.client.resolve(index or "*"):
+                local = self.client.index(name)
+                mappings = local.meta["mappings"]
+                mappings.setdefault("properties", {}).update(body.get("properties", {}))
+                if "_meta" in body:
+                    mappings["_meta"] = {**mappings.get("_meta", {}), **body["_meta"]}
+                local.save_meta()
+            return {"acknowledged": True}
+
+    def exists_alias(self, name, index=None, **kwargs):
+        with self.client.lock:
+            return any(fnmatch.fnmatch(alias, name) for index_name, local in self.client.indices_by_name().items()
+                       if index is None or index_name == index for alias in local.meta["aliases"])
+
+    def get_alias(self, name=None, index=None, **kwargs):
+        with self.client.lock:
+            result = {}
+            names = [n for n, _ in self.client.resolve(index)] if index else list(self.client.indices_by_name())
+            for index_name in names:
+                aliases = {alias: spec for alias, spec in self.client.index(index_name).meta["aliases"].items()
+                           if name is None or fnmatch.fnmatch(alias, name)}
+                if aliases or name is None:
+                    result[index_name] = {"aliases": aliases}
+            if name is not None and not result:
+                raise not_found("aliases_not_found_exception", name)
+            return result
+
+    def put_alias(self, index, name, body=None, **kwargs):
+        return self.update_aliases({"actions": [{"add": {"index": index, "alias": name, **(body or {})}}]})
+
+    def update_aliases(self, body, **kwargs):
+        with self.client.lock:
+            for action in body["actions"]:
+                kind, spec = next(iter(action.items()))
+                for index_name, _ in self.client.resolve(spec["index"]):
+                    local = self.client.index(index_name)
+                    if kind == "add":
+                        local.meta["aliases"][spec["alias"]] = {
+                            key: value for key, value in spec.items() if key not in ("index", "alias")
+                        }
+                    elif kind == "remove":
+                        local.meta["aliases"].pop(spec["alias"], None)
+                    elif kind == "remove_index":
+                        self.client.drop_index(index_name)
+                        continue
+                    local.save_meta()
+            return {"acknowledged": True}
+
+    def refresh(self, index=None, **kwargs):
+        # Writes are searchable as soon as they return
+        return {"_shards": {"total": 1, "successful": 1, "failed": 0}}
+
+    def flush(self, index=None, **kwargs):
+        return self.refresh(index)
+
+    def forcemerge(self, index=None, **kwargs):
+        with self.client.lock:
+            for name, _ in self.client.resolve(index or "*"):
+                self.client.index(name).compact()
+            return {"_shards": {"total": 1, "successful": 1, "failed": 0}}
+
+    def stats(self, index=None, **kwargs):
+        with self.client.lock:
+            indices = {}
+            for name, _ in self.client.resolve(index or "*"):
+                local = self.client.index(name)
+                stats = {"docs": {"count": len(local.live_rows()), "deleted": len(local.deleted)},
+                         "store": {"size_in_bytes": local.disk_bytes()}}
+                indices[name] = {"primaries": stats, "total": stats}
+            return {"indices": indices}
+
+
+class LocalElasticsearch:
+    """Drop-in for the ``Elasticsearch`` client, backed by ``LocalIndex`` directories under ``data_dir``."""
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        os.makedirs(data_dir, exist_ok=True)
+        self.transport = SimpleNamespace(serializer=JSONSerializer())
+        self.indices = LocalIndices(self)
+        self.lock = threading.RLock()
+        self._indices = None
+        self._contexts = OrderedDict()
+
+    # --- index registry ---
+    def indices_by_name(self):
+        """Every index, with only its ``meta.json`` read."""
+        if self._indices is None:
+            self._indices = {}
+            for name in sorted(os.listdir(self.data_dir)):
+                meta_path = os.path.join(self.data_dir, name, "meta.json")
+                if os.path.exists(meta_path):
+                    with open(meta_path) as f:
+                        self._indices[name] = LocalIndex(os.path.join(self.data_dir, name), json.load(f))
+        return self._indices
+
+    def index(self, name):
+        try:
+            return self.indices_by_name()[name]
+        except KeyError:
+            raise not_found("index_not_found_exception", name) from None
+
+    def resolve(self, names, missing_ok=False):
+        """``[(index name, alias filter or None)]`` for comma-separated names, patterns and aliases."""
+        if isinstance(names, (list, tuple)):
+            names = ",".join(names)
+        resolved = OrderedDict()
+        for name in str(names or "*").split(","):
+            found = False
+            for index_name, local in self.indices_by_name().items():
+                if fnmatch.fnmatch(index_name, name) or name in ("_all", "*"):
+                    resolved.setdefault(index_name, None)
+                    found = True
+                elif name in local.meta["aliases"]:
+                    resolved.setdefault(index_name, local.meta["aliases"][name].get("filter"))
+                    found = True
+            if not found and not missing_ok and "*" not in name:
+                raise not_found("index_not_found_exception", name)
+        return list(resolved.items())
+
+    def create_index(self, name, body):
+        if name in self.indices_by_name():
+            raise RequestError(400, "resource_already_exists_exception", {"error": f"index [{name}] already exists"})
+        if name != name.lower() or name.startswith(("_", "-")):
+            raise RequestError(400, "invalid_index_name_exception", {"error": f"Invalid index name [{name}]"})
+        claim_writer(self.data_dir)
+        path = os.path.join(self.data_dir, name)
+        os.makedirs(os.path.join(path, "segments"), exist_ok=True)
+        meta = {
+            "mappings": body.get("mappings", {}),
+            "settings": body.get("settings", {}),
+            "aliases": {alias: spec or {} for alias, spec in (body.get("aliases") or {}).items()},
+            "dtype": LOCAL_VECTOR_DTYPE,
+            "segments": [],
+            "next_segment": 0,
+            "vector_slots": {}
+        }
+        local = LocalIndex(path, meta)
+        local.save_meta()
+        self.indices_by_name()[name] = local
+        return {"acknowledged": True, "index": name}
+
+    def drop_index(self, name):
+        claim_writer(self.data_dir)
+        self.indices_by_name().pop(name, None)
+        shutil.rmtree(os.path.join(self.data_dir, name), ignore_errors=True)
+
+    # --- documents ---
+    def info(self, **kwargs):
+        return {"name": "local", "cluster_name": "searchiq-local", "version": {"number": "8.11.0"}}
+
+    def ping(self, **kwargs):
+        return True
+
+    def close(self):
+        pass
+
+    def bulk(self, body, index=None, **kwargs):
+        start = time.perf_counter()
+        lines = iter(body.splitlines() if isinstance(body, str) else body)
+        operations = []
+        for line in lines:
+            action = json.loads(line) if isinstance(line, str) else line
+            op, meta = next(iter(action.items()))
+            payload = None if op == "delete" else next(lines)
+            operations.append((op, meta, json.loads(payload) if isinstance(payload, str) else payload))
+
+        items = []
+        with self.lock:
+            pending = OrderedDict()
+            for op, meta, payload in operations:
+                items.append({op: self._bulk_item(op, meta, payload, meta.get("_index") or index, pending)})
+            for name, docs in pending.items():
+                self.index(name).write(list(docs.values()))
+        errors = any(next(iter(item.values())).get("error") for item in items)
+        return {"took": int((time.perf_counter() - start) * 1000), "errors": errors, "items": items}
+
+    def _bulk_item(self, op, meta, payload, index_name, pending):
+        doc_id = meta.get("_id") or uuid.uuid4().hex
+        result = {"_index": index_name, "_id": doc_id}
+        try:
+            local = self.index(index_name) if index_name in self.indices_by_name() else None
+            if local is None:
+                if op in ("delete", "update"):
+                    raise not_found("index_not_found_exception", index_name)
+                self.create_index(index_name, {})
+                local = self.index(index_name)
+            local.load()
+            staged = pending.setdefault(index_name, OrderedDict())
+            exists = doc_id in staged or doc_id in local.row_of
+            if op == "delete":
+                staged.pop(doc_id, None)
+                if doc_id in local.row_of:
+                    local.delete_rows([local.row_of[doc_id]])
+                return {**result, "status": 200 if exists else 404, "result": "deleted" if exists else "not_found"}
+            if op == "create" and exists:
+                raise RequestError(409, "version_conflict_engine_exception", {"error": f"[{doc_id}] already exists"})
+            if op == "update":
+                if not exists:
+                    raise not_found("document_missing_exception", doc_id)
+                current = staged[doc_id][2] if doc_id in staged else local.raw(local.row_of[doc_id])
+                fields = {**current, **payload.get("doc", {})}
+            else:
+                fields = dict(payload)
+            staged[doc_id] = (doc_id, meta.get("routing") or meta.get("_routing"), fields)
+            staged.move_to_end(doc_id)
+            return {**result, "status": 200 if exists else 201, "result": "updated" if exists else "created"}
+        except (NotFoundError, RequestError) as e:
+            return {**result, "status": e.status_code, "error": {"type": e.error, "reason": str(e.info)}}
+
+    def get(self, index, id, _source_includes=None, **kwargs):
+        with self.lock:
+            for name, _ in self.resolve(index):
+                local = self.index(name)
+                local.load()
+                row = local.row_of.get(id)
+                if row is not None:
+                    return {"_index": name, "_id": id, "found": True,
+                            "_source": local.source(row, _source_includes)}
+            raise not_found("document_missing_exception", id)
+
+    def mget(self, body, index=None, **kwargs):
+        docs = []
+        for doc in body["docs"]:
+            try:
+                docs.append(self.get(doc.get("_index") or index, doc["_id"], doc.get("_source")
+                                     if isinstance(doc.get("_source"), list) else None))
+            except NotFoundError:
+                docs.append({"_index": doc.get("_index") or index, "_id": doc["_id"], "found": False})
+        return {"docs": docs}
+
+    def count(self, index=None, body=None, **kwargs):
+        query = (body or {}).get("query") or kwargs.get("query")
+        with self.lock:
+            return {"count": sum(len(rows) for _, _, rows in self._matches(index, query))}
+
+    def delete_by_query(self, index, body, **kwargs):
+        with self.lock:
+            deleted = 0
+            for _, local, rows in self._matches(index, body.get("query"), missing_ok=False):
+                local.delete_rows(list(rows))
+                deleted += len(rows)
+            return {"deleted": deleted, "failures": []}
+
+    # --- search ---
+    def _matches(self, index, query, snapshot=None, missing_ok=True):
+        """``(name, index, {row: score})`` for each index ``index`` resolves to."""
+        for name, alias_filter in self.resolve(index or "*", missing_ok=missing_ok):
+            local = self.index(name)
+            local.load()
+            visible = snapshot[name] if snapshot else local.live_rows()
+            effective = query or {"match_all": {}}
+            if alias_filter:
+                effective = {"bool": {"must": [effective], "filter": [alias_filter]}}
+            yield name, local, Searcher(local, visible).search(effective)
+
+    def search(self, index=None, body=None, scroll=None, size=None, _source_includes=None, **kwargs):
+        start = time.perf_counter()
+        body = dict(body or {})
+        for key in ("query", "_source", "sort", "from_", "knn", "highlight", "suggest", "pit",
+                    "search_after", "rescore", "track_total_hits"):
+            if key in kwargs:
+                body["from" if key == "from_" else key] = kwargs.pop(key)
+        if size is not None:
+            body["size"] = size
+        if body.get("aggs") or body.get("aggregations"):
+            raise unsupported("aggregations")
+
+        with self.lock:
+            snapshot = None
+            if body.get("pit"):
+                context = self._contexts.get(body["pit"]["id"])
+                if context is None:
+                    raise not_found("search_context_missing_exception", body["pit"]["id"])
+                index, snapshot = context
+            response = {"took": 0, "timed_out": False,
+                        "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0}}
+            if "suggest" in body:
+                response["suggest"] = self._suggest(index, body["suggest"])
+                if "query" not in body and "knn" not in body:
+                    body["size"] = 0
+
+            offset = body.get("from", 0)
+            paged = scroll or body.get("search_after") is not None
+            total, max_score, hits = self._ranked(index, body, snapshot,
+                                                  limit=None if paged else offset + body.get("size", 10))
+            if body.get("search_after") is not None:
+                orders = [order for _, order in _sort_keys(body)]
+                hits = [hit for hit in hits if _after(hit["sort"], body["search_after"], orders)]
+            window = hits[offset:] if scroll else hits[offset:offset + body.get("size", 10)]
+
+            if scroll:
+                scroll_id = uuid.uuid4().hex
+                page_size = body.get("size", 10)
+                self._remember(scroll_id, (window[page_size:], page_size, body, _source_includes))
+                window = window[:page_size]
+                response["_scroll_id"] = scroll_id
+            response["hits"] = {
+                "total": {"value": total, "relation": "eq"},
+                "max_score": max_score,
+                "hits": [self._render(hit, body, _source_includes) for hit in window]
+            }
+            if body.get("pit"):
+                response["pit_id"] = body["pit"]["id"]
+        response["took"] = int((time.perf_counter() - start) * 1000)
+        return response
+
+    def _ranked(self, index, body, snapshot, limit=None):
+        """``(total, max_score, hits)``, hits as ``{_index, local, row, _score}`` in the requested order.
+
+        Searches ordered by score only build the first ``limit`` hits, picked with ``top_k``.
+        """
+        matches = []
+        for name, alias_filter in self.resolve(index or "*", missing_ok=True):
+            local = self.index(name)
+            local.load()
+            visible = snapshot[name] if snapshot else local.live_rows()
+            searcher = Searcher(local, visible)
+            query = body.get("query")
+            if alias_filter:
+                query = {"bool": {"must": [query or {"match_all": {}}], "filter": [alias_filter]}}
+            scores = searcher.search(query) if query or "knn" not in body else {}
+            if "knn" in body:
+                for row, score in searcher.knn(body["knn"]).items():
+                    if alias_filter is None or row in searcher.search(alias_filter):
+                        scores[row] = scores.get(row, 0.0) + score
+            if body.get("rescore"):
+                scores = self._rescore(searcher, scores, body["rescore"])
+            matches.append((name, local, scores))
+        total = sum(len(scores) for _, _, scores in matches)
+        max_score = max((max(scores.values()) for _, _, scores in matches if scores), default=None)
+        if limit is not None and "sort" not in body:
+            owners = [(name, local, row) for name, local, scores in matches for row in scores]
+            values = np.fromiter((score for _, _, scores in matches for score in scores.values()),
+                                 dtype=np.float64, count=total)
+            hits = [{"_index": owners[i][0], "local": owners[i][1], "row": owners[i][2], "_score": float(values[i])}
+                    for i in top_k(values, limit)]
+            return total, max_score, hits
+        hits = [{"_index": name, "local": local, "row": row, "_score": score}
+                for name, local, scores in matches for row, score in scores.items()]
+        return total, max_score, self._sorted(hits, body)
+
+    def _rescore(self, searcher, scores, rescore):
+        rescore = rescore[0] if isinstance(rescore, list) else rescore
+        spec = rescore["query"]
+        rows = np.fromiter(scores.keys(), dtype=np.int64, count=len(scores))
+        values = np.fromiter(scores.values(), dtype=np.float64, count=len(scores))
+        window = {int(rows[i]) for i in top_k(values, rescore.get("window_size", 10))}
+        searcher.visible = window
+        rescored = searcher.search(spec["rescore_query"])
+        weight, rescore_weight = spec.get("query_weight", 1.0), spec.get("rescore_query_weight", 1.0)
+        return {row: score * weight + rescored.get(row, 0.0) * rescore_weight if row in window else score
+                for row, score in scores.items()}
+
+    def _sorted(self, hits, body):
+        keys = _sort_keys(body)
+        for hit in hits:
+            hit["sort"] = [self._sort_value(hit, field) for field, _ in keys]
+        # Stable sorts, last key first
+        for position in reversed(range(len(keys))):
+            hits.sort(key=lambda hit: _orderable(hit["sort"][position]), reverse=keys[position][1] == "desc")
+        if "sort" not in body:
+            for hit in hits:
+                del hit["sort"]
+        return hits
+
+    @staticmethod
+    def _sort_value(hit, field):
+        if field == "_score":
+            return hit["_score"]
+        if field in ("_doc", "_shard_doc"):
+            return hit["row"]
+        return hit["local"].columns.get(field, [None] * (hit["row"] + 1))[hit["row"]]
+
+    def _render(self, hit, body, source_includes=None):
+        local, row = hit["local"], hit["row"]
+        rendered = {"_index": hit["_index"], "_id": local.ids[row], "_score": hit["_score"]}
+        if local.routings[row]:
+            rendered["_routing"] = local.routings[row]
+        source = body.get("_source", True)
+        if source is not False:
+            includes = excludes = None
+            if isinstance(source, list):
+                includes = source
+            elif isinstance(source, str):
+                includes = [source]
+            elif isinstance(source, dict):
+                includes, excludes = source.get("includes"), source.get("excludes")
+            rendered["_source"] = local.source(row, source_includes or includes, excludes)
+        if body.get("highlight"):
+            fragments = self._highlight(local, row, body)
+            if fragments:
+                rendered["highlight"] = fragments
+        if "sort" in hit:
+            rendered["sort"] = hit["sort"]
+        return rendered
+
+    def _highlight(self, local, row, body):
+        options = body["highlight"]
+        terms = query_terms(options.get("highlight_query") or body.get("query") or {})
+        result = {}
+        for field, field_options in options.get("fields", {}).items():
+            value = local.columns.get(field, [None] * (row + 1))[row]
+            if not isinstance(value, str):
+                continue
+            fragments = highlight(
+                value, terms, {**options, **(field_options or {})},
+                pre_tag=(options.get("pre_tags") or ["<em>"])[0],
+                post_tag=(options.get("post_tags") or ["</em>"])[0],
+                escape=options.get("encoder") == "html"
+            )
+            if fragments:
+                result[field] = fragments
+        return result
+
+    def _suggest(self, index, suggest):
+        result = {}
+        for name, spec in suggest.items():
+            completion = spec["completion"]
+            prefix = spec.get("prefix", "").lower()
+            contexts = {key: set(values) for key, values in completion.get("contexts", {}).items()}
+            options = []
+            for index_name, _ in self.resolve(index or "*", missing_ok=True):
+                local = self.index(index_name)
+                for row in local.live_rows():
+                    entry = local.columns.get(completion["field"], [None] * (row + 1))[row]
+                    if not entry:
+                        continue
+                    entry_contexts = entry.get("contexts", {})
+                    if any(not wanted & set(entry_contexts.get(key, [])) for key, wanted in contexts.items()):
+                        continue
+                    for text in entry["input"] if isinstance(entry["input"], list) else [entry["input"]]:
+                        if text.lower().startswith(prefix):
+                            options.append({"text": text, "_index": index_name, "_id": local.ids[row],
+                                            "_score": float(entry.get("weight", 1)), "_source": local.source(row)})
+                            break
+            options.sort(key=lambda option: (-option["_score"], option["text"]))
+            if completion.get("skip_duplicates"):
+                options = list(OrderedDict((option["text"], option) for option in reversed(options)).values())[::-1]
+                options.sort(key=lambda option: (-option["_score"], option["text"]))
+            result[name] = [{"text": spec.get("prefix", ""), "offset": 0, "length": len(spec.get("prefix", "")),
+                             "options": options[:completion.get("size", 5)]}]
+        return result
+
+    def msearch(self, body, index=None, **kwargs):
+        return {"responses": [self.search(index=header.get("index", index), body=query)
+                              for header, query in zip(body[::2], body[1::2])]}
+
+    # --- scroll and point in time ---
+    def _remember(self, context_id, context):
+        self._contexts[context_id] = context
+        while len(self._contexts) > MAX_OPEN_CONTEXTS:
+            self._contexts.popitem(last=False)
+
+    def scroll(self, scroll_id=None, body=None, **kwargs):
+        scroll_id = scroll_id or (body or {}).get("scroll_id")
+        with self.lock:
+            context = self._contexts.get(scroll_id)
+            if context is None:
+                raise not_found("search_context_missing_exception", scroll_id)
+            remaining, page_size, query_body, source_includes = context
+            # Kept until cleared, so reading past the end returns no hits rather than an error
+            self._contexts[scroll_id] = (remaining[page_size:], page_size, query_body, source_includes)
+            return {"_scroll_id": scroll_id, "took": 0, "timed_out": False,
+                    "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+                    "hits": {"hits": [self._render(hit, query_body, source_includes) for hit in remaining[:page_size]]}}
+
+    def clear_scroll(self, scroll_id=None, body=None, **kwargs):
+        ids = scroll_id or (body or {}).get("scroll_id") or []
+        with self.lock:
+            for context_id in ids if isinstance(ids, list) else [ids]:
+                self._contexts.pop(context_id, None)
+        return {"succeeded": True}
+
+    def open_point_in_time(self, index, keep_alive=None, **kwargs):
+        with self.lock:
+            snapshot = {}
+            for name, _ in self.resolve(index):
+                snapshot[name] = frozenset(self.index(name).live_rows())
+            pit_id = uuid.uuid4().hex
+            self._remember(pit_id, (index, snapshot))
+            return {"id": pit_id}
+
+    def close_point_in_time(self, body=None, **kwargs):
+        with self.lock:
+            if self._contexts.pop((body or {}).get("id"), None) is None:
+                raise not_found("search_context_missing_exception", (body or {}).get("id"))
+            return {"succeeded": True, "num_freed": 1}
+
+
+def _sort_keys(body):
+    """``[(field, "asc" | "desc")]`` for a search body, by score when it has no sort."""
+    sort = body.get("sort") or [{"_score": "desc"}]
+    keys = []
+    for spec in [sort] if isinstance(sort, (str, dict)) else sort:
+        if isinstance(spec, str):
+            keys.append((spec, "desc" if spec == "_score" else "asc"))
+            continue
+        field, order = next(iter(spec.items()))
+        keys.append((field, order.get("order", "asc") if isinstance(order, dict) else order))
+    return keys
+
+
+def _after(values, after, orders):
+    """Whether sort ``values`` come strictly after ``after`` (a ``search_after``)."""
+    for value, bound, order in zip(values, after, orders):
+        value, bound = _orderable(value), _orderable(bound)
+        if value != bound:
+            return value < bound if order == "desc" else value > bound
+    return False
+
+
+def _orderable(value):
+    """Sort key that orders None last and never compares numbers with strings."""
+    if value is None:
+        return (2, 0)
+    if isinstance(value, (int, float)):
+        return (0, value)
+    return (1, str(value))
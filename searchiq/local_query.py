@@ -0,0 +1,383 @@
+"""Query DSL evaluation for the local backend.
+
+Covers the queries SearchIQ builds: ``bool``, ``match``/``multi_match`` (best
+fields and phrase), ``match_phrase``, ``term``/``terms``/``range``/``exists``/
+``ids``, ``constant_score`` and the cosine ``script_score`` of exact vector
+search. Text fields are scored with BM25 from an inverted index built on first
+use; without it (``LOCAL_BM25=0``) matching rows are found by scanning and
+scored by term frequency. Filter-context clauses are cached per index until the
+next write, like Elasticsearch's filter bitsets.
+"""
+import html
+import json
+import math
+import os
+import re
+
+import numpy as np
+from elasticsearch import RequestError
+
+# === Config ===
+LOCAL_BM25 = os.environ.get("LOCAL_BM25", "1") != "0"
+BM25_K1 = 1.2
+BM25_B = 0.75
+VECTOR_BATCH_ROWS = 65536
+
+_WORD = re.compile(r"\w+")
+_COSINE_SCRIPT = re.compile(r"^\s*cosineSimilarity\(params\.query_vector,\s*'([^']+)'\)\s*(?:\+\s*([\d.]+))?\s*$")
+
+
+def analyze(value):
+    """Lowercased word tokens of a field value (lists are joined)."""
+    if isinstance(value, list):
+        value = " ".join(str(v) for v in value if v is not None)
+    return _WORD.findall(str(value).lower()) if value is not None else []
+
+
+def unsupported(what):
+    return RequestError(400, "parsing_exception", {"error": f"The local backend doesn't support {what}"})
+
+
+# === BM25 ===
+class Postings:
+    """Inverted index over one text field: term -> {row: term frequency}, plus field lengths."""
+
+    def __init__(self):
+        self.terms = {}
+        self.lengths = {}
+        self.total_length = 0
+
+    def add(self, row, value):
+        tokens = analyze(value)
+        if not tokens:
+            return
+        self.lengths[row] = len(tokens)
+        self.total_length += len(tokens)
+        for token in tokens:
+            postings = self.terms.setdefault(token, {})
+            postings[row] = postings.get(row, 0) + 1
+
+    def rows(self, term):
+        return self.terms.get(term, {})
+
+    def score(self, terms, rows):
+        """BM25 of ``terms`` for each of ``rows``."""
+        count = len(self.lengths)
+        average = self.total_length / count if count else 1.0
+        scores = dict.fromkeys(rows, 0.0)
+        for term in set(terms):
+            postings = self.terms.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for row in rows:
+                tf = postings.get(row)
+                if tf:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[row] / average)
+                    scores[row] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+
+# === Evaluation ===
+class Searcher:
+    """Evaluates a query against one ``LocalIndex``, returning ``{row: score}`` for matching rows.
+
+    Rows outside ``visible`` (deleted, or written after a point in time was
+    opened) are dropped from the final result; vector scoring only ever touches
+    visible rows.
+    """
+
+    def __init__(self, index, visible):
+        self.index = index
+        self.visible = visible
+
+    def search(self, query):
+        scores = self.evaluate(query or {"match_all": {}})
+        return {row: score for row, score in scores.items() if row in self.visible}
+
+    def evaluate(self, query, scoring=True):
+        if len(query) != 1:
+            raise unsupported(f"query {json.dumps(query)[:80]}")
+        kind, spec = next(iter(query.items()))
+        if not scoring and kind not in ("bool", "script_score", "constant_score"):
+            return self.cached_filter(query)
+        handler = getattr(self, f"_{kind}", None)
+        if handler is None:
+            raise unsupported(f"{kind} queries")
+        return handler(spec, scoring)
+
+    def cached_filter(self, query):
+        key = json.dumps(query, sort_keys=True, default=str)
+        rows = self.index.filter_cache_get(key)
+        if rows is None:
+            kind, spec = next(iter(query.items()))
+            rows = frozenset(getattr(self, f"_{kind}")(spec, False))
+            self.index.filter_cache_put(key, rows)
+        return dict.fromkeys(rows, 0.0)
+
+    # --- compound ---
+    def _bool(self, spec, scoring):
+        def as_list(clauses):
+            return clauses if isinstance(clauses, list) else [clauses] if clauses else []
+
+        must, filters = as_list(spec.get("must")), as_list(spec.get("filter"))
+        should, must_not = as_list(spec.get("should")), as_list(spec.get("must_not"))
+        required = spec.get("minimum_should_match", 0 if must or filters else 1 if should else 0)
+
+        result = None
+        for clause, clause_scoring in [(c, scoring) for c in must] + [(c, False) for c in filters]:
+            matched = self.evaluate(clause, clause_scoring)
+            if result is None:
+                result = matched
+            else:
+                result = {row: result[row] + matched[row] for row in result if row in matched}
+            if not result:
+                return {}
+        if should:
+            matches = [self.evaluate(clause, scoring) for clause in should]
+            counts = {}
+            for matched in matches:
+                for row, score in matched.items():
+                    total, hits = counts.get(row, (0.0, 0))
+                    counts[row] = (total + score, hits + 1)
+            if result is None:
+                result = {row: total for row, (total, hits) in counts.items() if hits >= max(1, int(required))}
+            else:
+                result = {row: score + counts.get(row, (0.0, 0))[0] for row, score in result.items()
+                          if counts.get(row, (0.0, 0))[1] >= int(required)}
+        if result is None:
+            # Only negations: everything else matches
+            result = dict.fromkeys(range(self.index.rows), 1.0 if scoring else 0.0)
+        for clause in must_not:
+            excluded = self.evaluate(clause, False)
+            result = {row: score for row, score in result.items() if row not in excluded}
+        boost = spec.get("boost", 1.0)
+        return {row: score * boost for row, score in result.items()} if boost != 1.0 else result
+
+    def _constant_score(self, spec, scoring):
+        return dict.fromkeys(self.evaluate(spec["filter"], False), spec.get("boost", 1.0) if scoring else 0.0)
+
+    def _match_all(self, spec, scoring):
+        return dict.fromkeys(range(self.index.rows), spec.get("boost", 1.0) if scoring else 0.0)
+
+    def _match_none(self, spec, scoring):
+        return {}
+
+    # --- full text ---
+    def _match(self, spec, scoring):
+        field, options = next(iter(spec.items()))
+        options = options if isinstance(options, dict) else {"query": options}
+        return self.match_field(field, options["query"], options.get("operator", "or").lower(), phrase=False)
+
+    def _match_phrase(self, spec, scoring):
+        field, options = next(iter(spec.items()))
+        options = options if isinstance(options, dict) else {"query": options}
+        return self.match_field(field, options["query"], "and", phrase=True)
+
+    def _multi_match(self, spec, scoring):
+        phrase = spec.get("type", "best_fields") == "phrase"
+        operator = "and" if phrase else spec.get("operator", "or").lower()
+        best = {}
+        for field in spec.get("fields") or ["*"]:
+            name, _, boost = field.partition("^")
+            for matched_field in self.index.text_fields(name):
+                for row, score in self.match_field(matched_field, spec["query"], operator, phrase).items():
+                    score *= float(boost or 1.0)
+                    if score > best.get(row, -1.0):
+                        best[row] = score
+        return best
+
+    def match_field(self, field, text, operator, phrase):
+        """Rows whose ``field`` matches ``text``: analyzed for text fields, exact for anything else."""
+        if not self.index.is_text(field):
+            return self._term({field: text}, True)
+        terms = analyze(text)
+        if not terms:
+            return {}
+        postings = self.index.postings(field) if LOCAL_BM25 else None
+        if postings is None:
+            return self._scan_text(field, terms, operator, phrase)
+
+        term_rows = [postings.rows(term) for term in terms]
+        if operator == "and":
+            smallest = min(term_rows, key=len)
+            rows = [row for row in smallest if all(row in other for other in term_rows)]
+        else:
+            rows = set().union(*term_rows)
+        if phrase and len(terms) > 1:
+            column = self.index.columns.get(field, [])
+            rows = [row for row in rows if _contains_phrase(analyze(column[row]), terms)]
+        return postings.score(terms, rows)
+
+    def _scan_text(self, field, terms, operator, phrase):
+        matched = {}
+        wanted = set(terms)
+        for row, value in enumerate(self.index.columns.get(field, [])):
+            if value is None:
+                continue
+            tokens = analyze(value)
+            present = wanted.intersection(tokens)
+            if not present or (operator == "and" and present != wanted):
+                continue
+            if phrase and len(terms) > 1 and not _contains_phrase(tokens, terms):
+                continue
+            matched[row] = float(sum(tokens.count(term) for term in present)) / math.sqrt(len(tokens))
+        return matched
+
+    # --- term level ---
+    def _term(self, spec, scoring):
+        field, value = next(iter(spec.items()))
+        if isinstance(value, dict):
+            value = value.get("value")
+        return self._terms({field: [value]}, scoring)
+
+    def _terms(self, spec, scoring):
+        field, values = next((k, v) for k, v in spec.items() if k != "boost")
+        wanted = {_normalize(value) for value in values}
+        matched = {}
+        for row, value in enumerate(self.index.columns.get(field, [])):
+            candidates = value if isinstance(value, list) else [value]
+            if any(_normalize(candidate) in wanted for candidate in candidates if candidate is not None):
+                matched[row] = 1.0
+        return matched
+
+    def _ids(self, spec, scoring):
+        rows = (self.index.row_of.get(doc_id) for doc_id in spec.get("values", []))
+        return {row: 1.0 for row in rows if row is not None}
+
+    def _exists(self, spec, scoring):
+        return {row: 1.0 for row, value in enumerate(self.index.columns.get(spec["field"], []))
+                if value not in (None, [], "")}
+
+    def _range(self, spec, scoring):
+        field, bounds = next(iter(spec.items()))
+        checks = [(op, bounds[op]) for op in ("gt", "gte", "lt", "lte") if bounds.get(op) is not None]
+        matched = {}
+        for row, value in enumerate(self.index.columns.get(field, [])):
+            if value is not None and all(_compare(value, op, bound) for op, bound in checks):
+                matched[row] = 1.0
+        return matched
+
+    # --- vectors ---
+    def _script_score(self, spec, scoring):
+        script = spec["script"]
+        match = _COSINE_SCRIPT.match(script.get("source", ""))
+        if not match:
+            raise unsupported(f"script {script.get('source')!r}")
+        field, offset = match.group(1), float(match.group(2) or 0.0)
+        candidates = [row for row in self.evaluate(spec["query"], False) if row in self.visible]
+        rows, similarities = self.index.cosine(field, script["params"]["query_vector"], candidates)
+        return {int(row): float(score) + offset for row, score in zip(rows, similarities)}
+
+    def knn(self, spec):
+        """Top-``k`` rows for a top-level ``knn`` section, scored like Elasticsearch's cosine: (1 + cos) / 2."""
+        candidates = None
+        if spec.get("filter"):
+            filters = spec["filter"] if isinstance(spec["filter"], list) else [spec["filter"]]
+            candidates = self.evaluate({"bool": {"filter": filters}}, False)
+        candidates = self.visible if candidates is None else [row for row in candidates if row in self.visible]
+        rows, similarities = self.index.cosine(spec["field"], spec["query_vector"], candidates)
+        keep = top_k(similarities, spec["k"])
+        return {int(rows[i]): (1.0 + float(similarities[i])) / 2.0 for i in keep}
+
+
+def _contains_phrase(tokens, terms):
+    width = len(terms)
+    first = terms[0]
+    return any(tokens[i:i + width] == terms for i, token in enumerate(tokens) if token == first)
+
+
+def _normalize(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    return str(value)
+
+
+def _compare(value, op, bound):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            value, bound = float(value), float(bound)
+        except (TypeError, ValueError):
+            return False
+    else:
+        value, bound = str(value), str(bound)
+    if op == "gt":
+        return value > bound
+    if op == "gte":
+        return value >= bound
+    if op == "lt":
+        return value < bound
+    return value <= bound
+
+
+def top_k(scores, k):
+    """Indices of the ``k`` highest ``scores``, best first, found with ``argpartition``.
+
+    Ties keep their order in ``scores``, so a larger ``k`` extends a smaller one's result.
+    """
+    if k <= 0 or not len(scores):
+        return np.array([], dtype=np.int64)
+    if k < len(scores):
+        threshold = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        candidates = np.flatnonzero(scores >= threshold)
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.lexsort((candidates, -scores[candidates]))][:k]
+
+
+# === Highlighting ===
+def query_terms(query, terms=None):
+    """Analyzed terms of the positive full-text clauses in a query, for highlighting."""
+    terms = set() if terms is None else terms
+    if not isinstance(query, dict):
+        return terms
+    for kind, spec in query.items():
+        if kind == "multi_match":
+            terms.update(analyze(spec.get("query")))
+        elif kind in ("match", "match_phrase"):
+            for options in spec.values():
+                terms.update(analyze(options.get("query") if isinstance(options, dict) else options))
+        elif kind == "bool":
+            for occur in ("must", "should", "filter"):
+                clauses = spec.get(occur) or []
+                for clause in clauses if isinstance(clauses, list) else [clauses]:
+                    query_terms(clause, terms)
+        elif kind in ("script_score", "constant_score"):
+            query_terms(spec.get("query") or spec.get("filter"), terms)
+    return terms
+
+
+def highlight(text, terms, options, pre_tag="<em>", post_tag="</em>", escape=False):
+    """Fragments of ``text`` around matches of ``terms``, or its start if ``no_match_size`` is set."""
+    fragment_size = options.get("fragment_size", 100)
+    limit = options.get("number_of_fragments", 5)
+    matches = [m for m in _WORD.finditer(text) if m.group(0).lower() in terms] if terms else []
+    clean = html.escape if escape else (lambda s: s)
+
+    fragments = []
+    end = 0
+    for match in matches:
+        if len(fragments) >= limit:
+            break
+        if match.start() < end:
+            continue
+        start = max(end, match.start() - fragment_size // 4)
+        start = text.rfind(" ", 0, start) + 1 if start > 0 else 0
+        end = min(len(text), start + fragment_size)
+        if end < len(text):
+            end = max(text.rfind(" ", match.end(), end), match.end())
+        fragment, position = [], start
+        for inner in matches:
+            if start <= inner.start() and inner.end() <= end:
+                fragment.append(clean(text[position:inner.start()]))
+                fragment.append(f"{pre_tag}{clean(inner.group(0))}{post_tag}")
+                position = inner.end()
+        fragment.append(clean(text[position:end]))
+        fragments.append("".join(fragment).strip())
+    if not fragments and options.get("no_match_size"):
+        size = options["no_match_size"]
+        cut = text[:size] if len(text) <= size else text[:max(text.rfind(" ", 0, size), 1)]
+        fragments.append(clean(cut).strip())
+    return [fragment for fragment in fragments if fragment]
@@ -0,0 +1,125 @@
+"""In-process counters and histograms, exposed in the Prometheus text format.
+
+Stages are timed with ``timed(stage)``, which feeds the shared stage histogram
+and, while a request is being traced, that request's timing breakdown.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+_registry = []
+_request_timings = ContextVar("request_timings", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+class Counter:
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.values = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_labels(key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self.values = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.values[key] = (counts, total + value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total) in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_labels(key + (('le', _number(bound)),))} {count}")
+                lines.append(f"{self.name}_sum{_labels(key)} {_number(total)}")
+                lines.append(f"{self.name}_count{_labels(key)} {counts[-1]}")
+        return lines
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format."""
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+
+# === Metrics ===
+STAGE_SECONDS = Histogram("searchiq_stage_seconds", "Time spent in each ingestion and search stage.")
+REQUEST_SECONDS = Histogram("searchiq_http_request_seconds", "HTTP request latency by endpoint.")
+EMBEDDED_TEXTS = Counter("searchiq_embedded_texts_total", "Texts run through the embedding model.")
+EMBED_BATCH_SIZE = Histogram("searchiq_embed_batch_size", "Texts per embedding model call.", buckets=BATCH_BUCKETS)
+INDEXED_DOCS = Counter("searchiq_indexed_docs_total", "Documents Elasticsearch accepted in bulk requests.")
+INDEX_FAILURES = Counter("searchiq_index_failures_total", "Documents that failed bulk indexing after retries.")
+DUPLICATE_TEXTS = Counter("searchiq_duplicate_texts_total", "Pages and sections found to near-duplicate indexed ones.")
+
+
+@contextmanager
+def timed(stage):
+    """Time a block as ``stage``, adding it to the current request's breakdown if one is traced."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def start_request_timing():
+    """Begin collecting a per-stage breakdown for the current request (or thread)."""
+    _request_timings.set({})
+
+
+def finish_request_timing():
+    """Stop collecting and return ``{stage: seconds}`` for the current request."""
+    timings = _request_timings.get() or {}
+    _request_timings.set(None)
+    return timings
+
+
+def server_timing_header(timings):
+    """``Server-Timing`` value for a timing breakdown, in milliseconds as the header expects."""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
@@ -0,0 +1,108 @@
+import base64
+import json
+import os
+
+from elasticsearch import NotFoundError
+
+# === Config ===
+PIT_KEEP_ALIVE = os.environ.get("PIT_KEEP_ALIVE", "2m")
+# Most first pages are never followed; their snapshots lapse sooner to stay under the open-PIT limit
+FIRST_PAGE_KEEP_ALIVE = os.environ.get("FIRST_PAGE_KEEP_ALIVE", "30s")
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", 100))
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))
+
+# Ties on score are broken by shard and doc order, which a point in time keeps stable
+PAGE_SORT = [{"_score": "desc"}, {"_shard_doc": "asc"}]
+
+
+class CursorExpired(Exception):
+    """The point in time behind a cursor has expired or was closed; the search must be restarted."""
+
+
+def encode_cursor(pit_id, search_after, offset=None):
+    payload = {"pit": pit_id, "after": search_after}
+    if offset:
+        payload["from"] = offset
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """``(pit_id, search_after, offset)``; a cursor without a point in time continues at ``offset``."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return payload["pit"], payload["after"], int(payload.get("from", 0))
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def open_pit(es, index, routing=None, keep_alive=PIT_KEEP_ALIVE):
+    params = {"routing": routing} if routing else {}
+    return es.open_point_in_time(index=index, keep_alive=keep_alive, **params)["id"]
+
+
+def snapshot_cursor(es, index, size, routing=None):
+    """Cursor for the page after a cached first page of ``size`` hits, on a point in time opened now.
+
+    Each request gets its own snapshot, so clients served the same cached page
+    never share one. The page continues at ``from`` because sort values of the
+    original snapshot don't carry over to a new one.
+    """
+    return encode_cursor(open_pit(es, index, routing, FIRST_PAGE_KEEP_ALIVE), None, offset=size)
+
+
+def close_pit(es, pit_id):
+    try:
+        es.close_point_in_time(body={"id": pit_id})
+    except NotFoundError:
+        pass  # Already expired
+
+
+def search_page(es, index, body, size, cursor=None, routing=None):
+    """Fetch one page of ``body`` from a point-in-time snapshot of ``index``.
+
+    Without a cursor the point in time is opened as the first page is served, so
+    later pages are unaffected by documents indexed in the meantime. Returns
+    ``(response, next_cursor)``; ``next_cursor`` is None on the last page, whose
+    point in time is closed.
+    """
+    pit_id, search_after, offset = decode_cursor(cursor) if cursor else (None, None, 0)
+    opened = pit_id is None
+    if opened:
+        pit_id = open_pit(es, index, routing, FIRST_PAGE_KEEP_ALIVE)
+    # Following a cursor extends the snapshot to the full keep-alive
+    keep_alive = FIRST_PAGE_KEEP_ALIVE if cursor is None else PIT_KEEP_ALIVE
+
+    body = {**body, "size": size, "sort": PAGE_SORT, "pit": {"id": pit_id, "keep_alive": keep_alive}}
+    if search_after:
+        body["search_after"] = search_after
+    elif offset:
+        body["from"] = offset
+    try:
+        response = es.search(body=body)
+    except NotFoundError as e:
+        if not opened:
+            raise CursorExpired("Cursor has expired, run the search again") from e
+        raise
+
+    # The id can change between requests; always continue from the latest one
+    pit_id = response.get("pit_id", pit_id)
+    hits = response["hits"]["hits"]
+    if len(hits) < size:
+        close_pit(es, pit_id)
+        return response, None
+    return response, encode_cursor(pit_id, hits[-1]["sort"])
+
+
+def scan_hits(es, index, body, batch_size=EXPORT_BATCH_SIZE, routing=None):
+    """Yield every hit of ``body`` from one point-in-time snapshot, holding only one batch in memory."""
+    cursor = None
+    try:
+        while True:
+            response, cursor = search_page(es, index, body, batch_size, cursor, routing)
+            yield from response["hits"]["hits"]
+            if cursor is None:
+                return
+    finally:
+        # Consumer stopped early (e.g. the client disconnected mid-export)
+        if cursor is not None:
+            close_pit(es, decode_cursor(cursor)[0])
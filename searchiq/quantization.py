@@ -0,0 +1,200 @@
+"""Scalar int8 quantization of chunk vectors, with exact rescoring of the top candidates.
+
+A quantized index maps ``vector_int8`` (one signed byte per dimension) for the
+first-pass similarity and keeps the float ``vector`` unindexed, read only to
+rescore the best ``RESCORE_WINDOW`` candidates. Vectors are scaled by a single
+per-index factor, calibrated from the first vectors written and stored in the
+mapping's ``_meta``; one factor for every dimension keeps cosine similarity
+meaningful, and queries are scaled on their own since cosine ignores scale.
+"""
+import logging
+import os
+import time
+from datetime import datetime
+
+from searchiq.vectors import (
+    exact_vector_query, resolve_mode, resolve_mode_async, supports_byte_vectors, vector_search_body
+)
+
+logger = logging.getLogger(__name__)
+
+# === Config ===
+# "none" or "int8"; only affects indices created while it is set
+VECTOR_QUANTIZATION = os.environ.get("VECTOR_QUANTIZATION", "none")
+RESCORE_WINDOW = int(os.environ.get("RESCORE_WINDOW", 100))
+CALIBRATION_SAMPLE = int(os.environ.get("QUANTIZATION_CALIBRATION_SAMPLE", 2000))
+# Components beyond this quantile of absolute values are clipped to +/-127
+CALIBRATION_QUANTILE = float(os.environ.get("QUANTIZATION_CALIBRATION_QUANTILE", 0.999))
+STATE_TTL = 60
+
+NONE = "none"
+INT8 = "int8"
+QUANTIZED_FIELD = "vector_int8"
+INT8_MAX = 127
+
+_UNCALIBRATED = object()
+_write_state = {}
+_search_state = {}
+
+
+# === Quantizing ===
+def calibrate(vectors, quantile=CALIBRATION_QUANTILE):
+    """Scale that maps the ``quantile`` of absolute component values in ``vectors`` to 127."""
+    values = sorted(abs(value) for vector in vectors for value in vector)
+    if not values:
+        return 1.0
+    bound = values[min(len(values) - 1, int(quantile * len(values)))]
+    return INT8_MAX / bound if bound else 1.0
+
+
+def quantize(vector, scale):
+    return [max(-INT8_MAX, min(INT8_MAX, round(value * scale))) for value in vector]
+
+
+def quantize_query(vector):
+    """A query vector quantized with its own scale, using the full int8 range."""
+    peak = max((abs(value) for value in vector), default=0.0)
+    return quantize(vector, INT8_MAX / peak if peak else 1.0)
+
+
+# === Writing ===
+def supported_quantization(es, quantization=VECTOR_QUANTIZATION):
+    """``quantization``, or none if the server can't store byte vectors (before 8.6)."""
+    if quantization == INT8 and not supports_byte_vectors(es):
+        logger.warning("Elasticsearch is too old for byte vectors (needs 8.6+); creating an unquantized index")
+        return NONE
+    return quantization
+
+
+def quantization_meta(mappings):
+    """The ``_meta`` quantization entry of each index in a ``get_mapping`` response."""
+    return {name: m["mappings"].get("_meta", {}).get("quantization") for name, m in mappings.items()}
+
+
+def _index_scale(es, index):
+    """Scale for writes to ``index``: a float, ``_UNCALIBRATED``, or None if it isn't quantized."""
+    cached = _write_state.get(index)
+    # A calibrated scale never changes; anything else is rechecked in case the index was recreated
+    if cached and (isinstance(cached[0], float) or time.time() - cached[1] < STATE_TTL):
+        return cached[0]
+    meta = next(iter(quantization_meta(es.indices.get_mapping(index=index)).values()), None)
+    if not meta or meta.get("type") != INT8:
+        state = None
+    else:
+        state = meta.get("scale") or _UNCALIBRATED
+    _write_state[index] = (state, time.time())
+    return state
+
+
+def store_calibration(es, index, scale, sample_size):
+    meta = {
+        "type": INT8,
+        "scale": scale,
+        "quantile": CALIBRATION_QUANTILE,
+        "sample_size": sample_size,
+        "calibrated_at": datetime.utcnow().isoformat()
+    }
+    es.indices.put_mapping(index=index, body={"_meta": {"quantization": meta}})
+    _write_state[index] = (scale, time.time())
+    logger.info(f"Calibrated int8 quantization for {index}: scale {scale:.2f} from {sample_size} vectors")
+
+
+def quantized_actions(es, actions, sample_size=CALIBRATION_SAMPLE):
+    """Add the int8 copy of ``vector`` to actions bound for quantized indices.
+
+    An index not yet calibrated holds back its first ``sample_size`` vectors
+    (or all of them, if the stream is shorter), calibrates on them and stores
+    the scale before they are sent. Other actions pass straight through.
+    """
+    held = {}
+
+    def release(index):
+        batch = held.pop(index)
+        scale = calibrate(action["_source"]["vector"] for action in batch)
+        store_calibration(es, index, scale, len(batch))
+        for action in batch:
+            action["_source"][QUANTIZED_FIELD] = quantize(action["_source"]["vector"], scale)
+        return batch
+
+    for action in actions:
+        source = action.get("_source")
+        if not source or not source.get("vector"):
+            yield action
+            continue
+        index = action["_index"]
+        scale = _index_scale(es, index)
+        if scale is None:
+            yield action
+        elif scale is _UNCALIBRATED:
+            held.setdefault(index, []).append(action)
+            if len(held[index]) >= sample_size:
+                yield from release(index)
+        else:
+            source[QUANTIZED_FIELD] = quantize(source["vector"], scale)
+            yield action
+    for index in list(held):
+        yield from release(index)
+
+
+# === Searching ===
+def _all_quantized(mappings):
+    metas = quantization_meta(mappings).values()
+    return bool(metas) and all(meta and meta.get("type") == INT8 for meta in metas)
+
+
+def is_quantized(es, index):
+    """Whether every index behind ``index`` (a name, alias or pattern) has the int8 field."""
+    cached = _search_state.get(index)
+    if cached and time.time() - cached[1] < STATE_TTL:
+        return cached[0]
+    quantized = _all_quantized(es.indices.get_mapping(index=index))
+    _search_state[index] = (quantized, time.time())
+    return quantized
+
+
+async def is_quantized_async(es, index):
+    cached = _search_state.get(index)
+    if cached and time.time() - cached[1] < STATE_TTL:
+        return cached[0]
+    quantized = _all_quantized(await es.indices.get_mapping(index=index))
+    _search_state[index] = (quantized, time.time())
+    return quantized
+
+
+def quantized_search_body(query_vector, k, mode, filter=None, window=RESCORE_WINDOW):
+    """Top-``k`` search over ``vector_int8``, with the best ``window`` candidates rescored on ``vector``.
+
+    Rescored hits get the exact path's scores (cosine + 1). Elasticsearch can't
+    sort a rescored search, so these results can't be paged with ``search_after``.
+    """
+    window = max(k, window)
+    body = vector_search_body(quantize_query(query_vector), window, mode, field=QUANTIZED_FIELD, filter=filter)
+    body["size"] = k
+    body["rescore"] = {
+        "window_size": window,
+        "query": {
+            "rescore_query": exact_vector_query(query_vector),
+            "query_weight": 0.0,
+            "rescore_query_weight": 1.0
+        }
+    }
+    return body
+
+
+def semantic_search_body(es, index, query_vector, k, filter=None):
+    """Vector search body for ``index``: quantized with rescoring where every index behind it is quantized."""
+    if is_quantized(es, index):
+        return quantized_search_body(query_vector, k, resolve_mode(es, index, field=QUANTIZED_FIELD), filter)
+    return vector_search_body(query_vector, k, resolve_mode(es, index), filter=filter)
+
+
+async def semantic_search_body_async(es, index, query_vector, k, filter=None):
+    if await is_quantized_async(es, index):
+        mode = await resolve_mode_async(es, index, field=QUANTIZED_FIELD)
+        return quantized_search_body(query_vector, k, mode, filter)
+    return vector_search_body(query_vector, k, await resolve_mode_async(es, index), filter=filter)
+
+
+def pageable(body):
+    """Whether a search body can be paged with ``search_after``: not approximate and not rescored."""
+    return "knn" not in body and "rescore" not in body
@@ -0,0 +1,276 @@
+"""Boolean search syntax, parsed and compiled to an Elasticsearch bool query.
+
+Supported: AND, OR and NOT (upper case; NOT binds tightest, then AND, then OR),
+parentheses, "quoted phrases" and field prefixes such as ``section:`` or
+``file:"annual report.pdf"``. Adjacent bare words are matched together like a
+plain search; other adjacent clauses are ANDed. Clauses that can't affect the
+score (file, type and section constraints, negations) compile to filter context,
+where Elasticsearch caches their matches.
+
+Parsing never fails: unbalanced parentheses and quotes are closed at the end,
+and operators with nothing to apply to are ignored. A query with nothing left to
+match positively (only operators, or only negations such as ``NOT foo``)
+matches no documents rather than every document.
+"""
+import json
+import os
+import re
+from functools import lru_cache
+
+from searchiq.cache import normalize_text
+
+# === Config ===
+QUERY_CACHE_ENTRIES = int(os.environ.get("QUERY_CACHE_ENTRIES", 2048))
+
+TEXT_FIELDS = ["content", "title", "doc_title"]
+
+# Field prefixes: (kind, ES field). "term" and "match" constraints are filters; "text" fields score
+FIELDS = {
+    "section": ("match", "section"),
+    "file": ("term", "file_name"),
+    "type": ("term", "file_type"),
+    "title": ("text", ["title", "doc_title"]),
+    "content": ("text", ["content"]),
+}
+
+OPERATORS = ("AND", "OR", "NOT")
+
+MATCH_NONE = {"match_none": {}}
+
+_TOKEN = re.compile(r'''
+    \s*(?:
+        (?P<open>\() | (?P<close>\)) |
+        (?P<field>(?:%s)):(?=[^\s)]) |
+        "(?P<phrase>[^"]*)"? |
+        (?P<word>[^\s()"]+)
+    )
+''' % "|".join(FIELDS), re.VERBOSE | re.IGNORECASE)
+
+
+# === Parsing ===
+def tokenize(text):
+    """``(kind, value)`` pairs: open, close, field, phrase, word or an operator."""
+    tokens = []
+    for match in _TOKEN.finditer(text):
+        kind = match.lastgroup
+        if kind is None:
+            continue
+        value = match.group(kind)
+        if kind == "word" and value in OPERATORS:
+            kind = value
+        elif kind == "field":
+            value = value.lower()
+        tokens.append((kind, value))
+    return tokens
+
+
+class _Parser:
+    """Recursive descent over the tokens; each rule returns an AST node or None for nothing."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def take(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parse(self):
+        nodes = []
+        while self.peek() is not None:
+            node = self.or_expr()
+            if node is not None:
+                nodes.append(node)
+            if self.peek() == "close":
+                # Unmatched ")": skip it and keep going
+                self.take()
+        return _and(nodes)
+
+    def or_expr(self):
+        nodes = [self.and_expr()]
+        while self.peek() == "OR":
+            self.take()
+            nodes.append(self.and_expr())
+        return _or([node for node in nodes if node is not None])
+
+    def and_expr(self):
+        nodes = []
+        explicit = False
+        while self.peek() not in (None, "OR", "close"):
+            if self.peek() == "AND":
+                self.take()
+                explicit = True
+                continue
+            node = self.unary()
+            if node is None:
+                continue
+            # Juxtaposed bare words share one match, like a plain search
+            if node[0] == "text" and nodes and nodes[-1][0] == "text" and not explicit:
+                nodes[-1] = ("text", f"{nodes[-1][1]} {node[1]}")
+            else:
+                nodes.append(node)
+            explicit = False
+        return _and(nodes)
+
+    def unary(self):
+        if self.peek() == "NOT":
+            self.take()
+            if self.peek() in (None, "OR", "AND", "close"):
+                return None
+            node = self.unary()
+            return _not(node) if node is not None else None
+        return self.primary()
+
+    def primary(self):
+        kind, value = self.take()
+        if kind == "open":
+            node = self.or_expr()
+            if self.peek() == "close":
+                self.take()
+            return node
+        if kind == "field":
+            if self.peek() in ("word", "phrase", *OPERATORS):
+                operand_kind, operand = self.take()
+                operand = operand.strip()
+                return ("field", value, operand, operand_kind == "phrase") if operand else None
+            return None
+        if kind == "phrase":
+            value = " ".join(value.split())
+            return ("phrase", value) if value else None
+        return ("text", value)
+
+
+def _and(nodes):
+    flat = []
+    for node in nodes:
+        flat.extend(node[1] if node[0] == "and" else [node])
+    return _collapse("and", flat)
+
+
+def _or(nodes):
+    flat = []
+    for node in nodes:
+        flat.extend(node[1] if node[0] == "or" else [node])
+    return _collapse("or", flat)
+
+
+def _collapse(kind, nodes):
+    nodes = list(dict.fromkeys(nodes))
+    if not nodes:
+        return None
+    return nodes[0] if len(nodes) == 1 else (kind, tuple(nodes))
+
+
+def _not(node):
+    # NOT NOT x is x
+    return node[1] if node[0] == "not" else ("not", node)
+
+
+def parse(text):
+    """The query's syntax tree, or None if it has nothing to match.
+
+    Nodes are tuples: ``("text", words)``, ``("phrase", words)``,
+    ``("field", name, value, quoted)``, ``("not", node)`` and
+    ``("and" | "or", (node, ...))``.
+    """
+    return _Parser(tokenize(text)).parse()
+
+
+# === Compiling ===
+def _leaf(node):
+    """``(clause, scoring)`` for a text, phrase or field node."""
+    if node[0] == "text":
+        return {"multi_match": {"query": node[1], "fields": TEXT_FIELDS}}, True
+    if node[0] == "phrase":
+        return {"multi_match": {"query": node[1], "fields": TEXT_FIELDS, "type": "phrase"}}, True
+    _, name, value, quoted = node
+    kind, field = FIELDS[name]
+    if kind == "text":
+        return {"multi_match": {"query": value, "fields": field, **({"type": "phrase"} if quoted else {})}}, True
+    if kind == "term":
+        # Types are stored upper case ("PDF"); file names as uploaded
+        return {"term": {field: value.upper() if field == "file_type" else value}}, False
+    return {"match_phrase" if quoted else "match": {field: value}}, False
+
+
+def _clauses(nodes):
+    """Split an AND's operands into must, filter and must_not clauses."""
+    parts = {"must": [], "filter": [], "must_not": []}
+    for node in nodes:
+        if node[0] == "not":
+            clause, _ = _compile(node[1])
+            parts["must_not"].append(clause)
+        else:
+            clause, scoring = _compile(node)
+            parts["must" if scoring else "filter"].append(clause)
+    return parts
+
+
+def _unscored(clause):
+    """A non-scoring clause usable in query context: bools of only filters and negations already are."""
+    if set(clause.get("bool", {"must": None})) <= {"filter", "must_not"}:
+        return clause
+    return {"bool": {"filter": [clause]}}
+
+
+def _compile(node):
+    """``(clause, scoring)``: the ES clause for a node and whether it contributes to the score."""
+    kind = node[0]
+    if kind == "and":
+        parts = _clauses(node[1])
+        return {"bool": {key: value for key, value in parts.items() if value}}, bool(parts["must"])
+    if kind == "or":
+        compiled = [_compile(child) for child in node[1]]
+        scoring = any(child_scoring for _, child_scoring in compiled)
+        should = [clause if child_scoring or not scoring else _unscored(clause) for clause, child_scoring in compiled]
+        return {"bool": {"should": should, "minimum_should_match": 1}}, scoring
+    if kind == "not":
+        clause, _ = _compile(node[1])
+        return {"bool": {"must_not": [clause]}}, False
+    return _leaf(node)
+
+
+def _positive(node, negated=False):
+    """Whether any term of the tree must be present (is not under an odd number of NOTs)."""
+    if node[0] == "not":
+        return _positive(node[1], not negated)
+    if node[0] in ("and", "or"):
+        return any(_positive(child, negated) for child in node[1])
+    return not negated
+
+
+@lru_cache(maxsize=QUERY_CACHE_ENTRIES)
+def _compiled(text):
+    # Kept serialized: decoding a fresh copy per call is several times faster than deepcopy
+    tree = parse(text)
+    parts = {"must": [], "filter": [], "must_not": []} if tree is None \
+        else _clauses(tree[1] if tree[0] == "and" else [tree])
+    if tree is None or not _positive(tree):
+        # An empty must would match every document; negations still narrow the vector leg through filter
+        parts["must"].append(MATCH_NONE)
+    return json.dumps(parts)
+
+
+def compile_query(text):
+    """Top-level ``{"must": [...], "filter": [...], "must_not": [...]}`` clauses for a query string.
+
+    Compiled trees are cached by the whitespace-normalized query; callers get their own copy.
+    Queries with nothing positive to match get a ``match_none`` in must.
+    """
+    return json.loads(_compiled(normalize_text(text)))
+
+
+def cache_stats():
+    info = _compiled.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "entries": info.currsize,
+        "max_entries": info.maxsize,
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_rate": round(info.hits / lookups, 3) if lookups else None
+    }
@@ -0,0 +1,81 @@
+import os
+import re
+from datetime import datetime
+
+# === Config ===
+# "per-file": every uploaded file gets its own index (the original behaviour)
+# "shared":   all files live in partition indices behind one alias, routed by file_name
+STORAGE_MODE = os.environ.get("STORAGE_MODE", "per-file")
+SHARED_INDEX_ALIAS = os.environ.get("SHARED_INDEX_ALIAS", "searchiq-docs")
+# "none", "monthly" (by upload month) or "tenant"
+SHARED_INDEX_PARTITION = os.environ.get("SHARED_INDEX_PARTITION", "none")
+SHARED_INDEX_SHARDS = int(os.environ.get("SHARED_INDEX_SHARDS", 3))
+
+PER_FILE = "per-file"
+SHARED = "shared"
+DEFAULT_TENANT = "default"
+
+
+def is_shared():
+    return STORAGE_MODE == SHARED
+
+
+def sanitize_name(name):
+    name = name.lower()
+    name = re.sub(r'[^a-z0-9-]', '-', name)
+    name = re.sub(r'-+', '-', name)
+    return name.strip('-')
+
+
+def partition_index(tenant=None, timestamp=None):
+    """Concrete shared index that new documents are written to."""
+    if SHARED_INDEX_PARTITION == "monthly":
+        return f"{SHARED_INDEX_ALIAS}-{(timestamp or datetime.utcnow()).strftime('%Y.%m')}"
+    if SHARED_INDEX_PARTITION == "tenant":
+        return f"{SHARED_INDEX_ALIAS}-{sanitize_name(tenant or DEFAULT_TENANT) or DEFAULT_TENANT}"
+    return f"{SHARED_INDEX_ALIAS}-000001"
+
+
+def id_prefix(file_name):
+    """Doc ids are unique per index; the shared index namespaces them by file."""
+    return f"{file_name}:" if is_shared() else ""
+
+
+def routing(file_name):
+    """Shared-mode docs of one file all live on one shard, so per-file reads touch a single shard."""
+    return file_name if is_shared() else None
+
+
+def ensure_index(es, index_name, mapping):
+    """Create ``index_name`` if missing; shared partitions also join the read alias."""
+    if es.indices.exists(index=index_name):
+        return False
+    body = {"mappings": mapping}
+    if is_shared():
+        body["settings"] = {"number_of_shards": SHARED_INDEX_SHARDS}
+        body["aliases"] = {SHARED_INDEX_ALIAS: {}}
+    es.indices.create(index=index_name, body=body)
+    return True
+
+
+def concrete_index(es, name):
+    """Resolve an alias to the index writes land in, so bulk results and scans agree on ``_index``."""
+    if not es.indices.exists_alias(name=name):
+        return name
+    targets = es.indices.get_alias(name=name)
+    for index_name, info in targets.items():
+        if info["aliases"][name].get("is_write_index"):
+            return index_name
+    if len(targets) == 1:
+        return next(iter(targets))
+    raise ValueError(f"Alias '{name}' points at several indices and has no write index")
+
+
+def search_params(file_name=None):
+    """Extra ``es.search`` keyword arguments for a query, optionally scoped to one file."""
+    if not is_shared():
+        return {}
+    if file_name:
+        return {"routing": file_name}
+    # Let shards whose date ranges can't match be skipped before the query phase
+    return {"pre_filter_shard_size": 1}
@@ -0,0 +1,128 @@
+"""Typeahead suggestions served from an Elasticsearch completion field.
+
+Every ingested file contributes its section titles, recurring phrases and
+TF-IDF keywords (see ``searchiq.terms``) to one suggestion index, tagged with
+the index names it can be searched under. Completion suggesters answer from an
+in-memory FST, and a file's suggestions are replaced each time it is ingested.
+"""
+import hashlib
+import os
+
+from elasticsearch import TransportError
+
+from searchiq.layout import page_id
+from searchiq.storage import routing
+
+# === Config ===
+SUGGEST_INDEX = os.environ.get("SUGGEST_INDEX", "searchiq-suggest")
+SUGGEST_SIZE = int(os.environ.get("SUGGEST_SIZE", 8))
+SUGGEST_MIN_PREFIX = 2
+FILE_TERMS = int(os.environ.get("SUGGEST_FILE_TERMS", 200))
+FILE_PHRASES = int(os.environ.get("SUGGEST_FILE_PHRASES", 100))
+
+
+def suggest_mapping():
+    return {
+        "properties": {
+            # The standard analyzer keeps digits, so "item 7" completes to "Item 7A. Risk Factors"
+            "suggest": {
+                "type": "completion",
+                "analyzer": "standard",
+                "contexts": [{"name": "index", "type": "category"}]
+            },
+            "text": {"type": "keyword", "index": False},
+            "kind": {"type": "keyword"},
+            "index": {"type": "keyword"},
+            "file_name": {"type": "keyword"}
+        }
+    }
+
+
+def ensure_suggest_index(es):
+    if es.indices.exists(index=SUGGEST_INDEX):
+        return
+    try:
+        es.indices.create(index=SUGGEST_INDEX, body={"mappings": suggest_mapping()})
+    except TransportError as e:
+        # Another worker created it first
+        if e.error != "resource_already_exists_exception":
+            raise
+
+
+def suggestion_id(index_name, file_name, kind, text):
+    return hashlib.sha1(f"{index_name}\0{file_name}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+
+def clear_suggestions(es, index_name, file_name):
+    """Drop what a previous ingest of ``file_name`` into ``index_name`` suggested."""
+    es.delete_by_query(index=SUGGEST_INDEX, conflicts="proceed", body={"query": {"bool": {"filter": [
+        {"term": {"index": index_name}},
+        {"term": {"file_name": file_name}}
+    ]}}})
+
+
+def suggestion_actions(index_name, search_names, file_name, stats,
+                       max_terms=FILE_TERMS, max_phrases=FILE_PHRASES):
+    """Bulk actions for a file's suggestions, findable under any of ``search_names``."""
+    contexts = sorted({index_name, *search_names})
+    for kind, text, weight in stats.suggestions(max_terms, max_phrases):
+        yield {
+            "_index": SUGGEST_INDEX,
+            "_id": suggestion_id(index_name, file_name, kind, text),
+            "_source": {
+                "suggest": {"input": [text], "weight": weight, "contexts": {"index": contexts}},
+                "text": text,
+                "kind": kind,
+                "index": index_name,
+                "file_name": file_name
+            }
+        }
+
+
+def keyword_updates(index_name, file_name, stats):
+    """Partial updates setting each page's TF-IDF keywords, once the whole file has been seen."""
+    for page_index, keywords in stats.page_keywords().items():
+        update = {
+            "_op_type": "update",
+            "_index": index_name,
+            "_id": page_id(file_name, page_index),
+            "doc": {"keywords": keywords}
+        }
+        if routing(file_name):
+            update["_routing"] = routing(file_name)
+        yield update
+
+
+def replace_actions(es, index_name, search_names, file_name, stats):
+    """Clear a file's previous suggestions and yield its new ones."""
+    ensure_suggest_index(es)
+    clear_suggestions(es, index_name, file_name)
+    yield from suggestion_actions(index_name, search_names, file_name, stats)
+
+
+def file_actions(es, index_name, search_names, file_name, stats):
+    """Everything to send once a file's pages are indexed: page keywords, then its fresh suggestions."""
+    yield from keyword_updates(index_name, file_name, stats)
+    yield from replace_actions(es, index_name, search_names, file_name, stats)
+
+
+def suggest(es, prefix, index=None, size=SUGGEST_SIZE):
+    """Completions for ``prefix``, best first, optionally limited to files searchable as ``index``."""
+    prefix = " ".join(prefix.split())
+    if len(prefix) < SUGGEST_MIN_PREFIX:
+        return []
+    completion = {"field": "suggest", "size": size, "skip_duplicates": True}
+    if index:
+        completion["contexts"] = {"index": [index]}
+    try:
+        response = es.search(index=SUGGEST_INDEX, body={
+            "_source": ["text", "kind"],
+            "suggest": {"typeahead": {"prefix": prefix, "completion": completion}}
+        })
+    except TransportError as e:
+        if e.status_code == 404:
+            # Nothing ingested since suggestions were introduced
+            return []
+        raise
+    options = response["suggest"]["typeahead"][0]["options"]
+    return [{"text": option["_source"]["text"], "kind": option["_source"]["kind"]} for option in options]
@@ -0,0 +1,125 @@
+"""Term and phrase statistics for keywords and typeahead suggestions.
+
+``TermStats`` collects one file's statistics page by page, so it works on a
+streamed ingest: document frequency with pages as the documents, each page's
+most frequent terms, multi-page phrases and section titles. Once the file is
+done it ranks every page's keywords by TF-IDF and the file's suggestions.
+"""
+import math
+import re
+from collections import Counter
+
+PAGE_KEYWORDS = 10
+# Per-page term counts kept for TF-IDF ranking, to bound memory on huge files
+PAGE_TERMS_KEPT = 50
+MIN_TERM_LENGTH = 3
+MAX_PHRASE_WORDS = 3
+# Suggestion weight multipliers: a section title beats a phrase, which beats a single term
+KIND_WEIGHTS = {"section": 3, "phrase": 2, "term": 1}
+
+TERM = "term"
+PHRASE = "phrase"
+SECTION = "section"
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each either else etc few for from further
+had has have having he her here hers herself him himself his how however i if in into is it its itself
+just least less let like may me might more most much must my myself neither no nor not now of off on
+once only or other otherwise our ours ourselves out over own per rather same shall she should since so
+some such than that the their theirs them themselves then there these they this those though through
+thus to too under until up upon us very via was we were what when where whether which while who whom
+whose why will with within without would yet you your yours yourself yourselves
+""".split())
+
+_TOKEN = re.compile(r"[a-z][a-z0-9]*(?:['\-][a-z0-9]+)*")
+
+
+def tokens(text):
+    """Lowercased word tokens, in order."""
+    return _TOKEN.findall(text.lower())
+
+
+def is_term(word):
+    return len(word) >= MIN_TERM_LENGTH and word not in STOPWORDS
+
+
+def phrases(words, max_words=MAX_PHRASE_WORDS):
+    """Runs of 2 to ``max_words`` consecutive content words; stopwords break a run."""
+    found = []
+    run = []
+    for word in words + [""]:
+        if is_term(word):
+            run.append(word)
+            continue
+        for size in range(2, max_words + 1):
+            found.extend(" ".join(run[i:i + size]) for i in range(len(run) - size + 1))
+        run = []
+    return found
+
+
+def frequent_terms(text, n=PAGE_KEYWORDS):
+    """A page's ``n`` most frequent content words, for when no file-wide statistics exist."""
+    return [term for term, _ in Counter(w for w in tokens(text) if is_term(w)).most_common(n)]
+
+
+def clean_section(name):
+    name = " ".join(name.split()).strip(" .:-")
+    return name if name and name.lower() != "main" else None
+
+
+class TermStats:
+    """One file's term statistics, with its pages as the documents."""
+
+    def __init__(self, page_terms=PAGE_TERMS_KEPT):
+        self.page_terms = page_terms
+        self.pages = 0
+        self.df = Counter()
+        self.phrase_df = Counter()
+        self.sections = Counter()
+        self._page_tf = {}
+
+    def add_page(self, page_index, text, sections=()):
+        words = tokens(text)
+        tf = Counter(w for w in words if is_term(w))
+        self.pages += 1
+        self.df.update(tf.keys())
+        self.phrase_df.update(set(phrases(words)))
+        self._page_tf[page_index] = tf.most_common(self.page_terms)
+        for name in sections:
+            name = clean_section(name)
+            if name:
+                self.sections[name] += 1
+
+    def add_page_info(self, page_info):
+        """Add a page as produced by ``extract_page``."""
+        self.add_page(page_info["index"], page_info["text"], [s["name"] for s in page_info.get("sections", [])])
+
+    def idf(self, term):
+        return math.log((1 + self.pages) / (1 + self.df[term])) + 1.0
+
+    def page_keywords(self, n=PAGE_KEYWORDS):
+        """``{page_index: keywords}`` ranked by TF-IDF across the file's pages."""
+        return {
+            page_index: [term for term, _ in sorted(
+                ((term, count * self.idf(term)) for term, count in counts),
+                key=lambda item: (-item[1], item[0])
+            )[:n]]
+            for page_index, counts in self._page_tf.items()
+        }
+
+    def suggestions(self, max_terms, max_phrases):
+        """``(kind, text, weight)`` for the file's section titles, phrases and keywords.
+
+        A keyword's weight is how many pages rank it among their top keywords, so
+        both salient and widespread terms rise; phrases need to recur on two pages
+        (unless the file has one page) and are weighted by how many pages have them.
+        """
+        keyword_pages = Counter(term for keywords in self.page_keywords().values() for term in keywords)
+        min_pages = 2 if self.pages > 1 else 1
+        recurring = [(p, df) for p, df in self.phrase_df.most_common(max_phrases) if df >= min_pages]
+        return (
+            [(SECTION, name, count * KIND_WEIGHTS[SECTION]) for name, count in self.sections.items()]
+            + [(PHRASE, phrase, df * KIND_WEIGHTS[PHRASE]) for phrase, df in recurring]
+            + [(TERM, term, count * KIND_WEIGHTS[TERM]) for term, count in keyword_pages.most_common(max_terms)]
+        )
@@ -0,0 +1,186 @@
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# === Config ===
+# "exact": brute-force script_score over every doc (works on any dense_vector mapping)
+# "knn":   approximate HNSW search; needs vectors mapped with "index": true (Elasticsearch 8.4+)
+# "auto":  knn for indices with indexed vectors and at least KNN_MIN_DOCS docs, exact otherwise
+VECTOR_SEARCH_MODE = os.environ.get("VECTOR_SEARCH_MODE", "exact")
+KNN_MIN_DOCS = int(os.environ.get("KNN_MIN_DOCS", 10000))
+KNN_NUM_CANDIDATES_FACTOR = int(os.environ.get("KNN_NUM_CANDIDATES_FACTOR", 10))
+HNSW_M = int(os.environ.get("HNSW_M", 16))
+HNSW_EF_CONSTRUCTION = int(os.environ.get("HNSW_EF_CONSTRUCTION", 100))
+MODE_CACHE_TTL = 60
+# Oldest servers with top-level knn search over HNSW-indexed vectors, and with byte vectors
+KNN_MIN_VERSION = (8, 4)
+BYTE_VECTORS_MIN_VERSION = (8, 6)
+
+EXACT = "exact"
+KNN = "knn"
+AUTO = "auto"
+
+
+def vector_mapping(dims, mode=VECTOR_SEARCH_MODE, element_type="float"):
+    """Mapping for a dense_vector field; indexed with HNSW unless the mode is exact.
+
+    ``element_type="byte"`` (Elasticsearch 8.6+) stores one signed byte per dimension.
+    """
+    mapping = {"type": "dense_vector", "dims": dims}
+    if element_type != "float":
+        mapping["element_type"] = element_type
+    if mode == EXACT:
+        return {**mapping, "index": False}
+    return {
+        **mapping,
+        "index": True,
+        "similarity": "cosine",
+        "index_options": {"type": "hnsw", "m": HNSW_M, "ef_construction": HNSW_EF_CONSTRUCTION},
+    }
+
+
+def exact_vector_query(query_vector, field="vector", filter=None):
+    """Brute-force cosine scoring, restricted to ``filter`` and to docs that have the field."""
+    return {
+        "script_score": {
+            "query": {"bool": {"filter": [{"exists": {"field": field}}, *(filter or [])]}},
+            "script": {
+                "source": f"cosineSimilarity(params.query_vector, '{field}') + 1.0",
+                "params": {"query_vector": query_vector},
+            },
+        }
+    }
+
+
+def knn_clause(query_vector, k, field="vector", filter=None, num_candidates=None):
+    """Top-level ``knn`` search section for approximate nearest neighbour retrieval."""
+    clause = {
+        "field": field,
+        "query_vector": query_vector,
+        "k": k,
+        "num_candidates": max(k, num_candidates or k * KNN_NUM_CANDIDATES_FACTOR),
+    }
+    if filter:
+        clause["filter"] = filter
+    return clause
+
+
+_mode_cache = {}
+_server_versions = {}
+_warned_versions = set()
+
+
+# === Server support ===
+def parse_version(number):
+    return tuple(int(part) for part in re.findall(r"\d+", number)[:3])
+
+
+def _remember_version(es, info):
+    version = parse_version(info["version"]["number"]) if info else None
+    _server_versions[id(es)] = version
+    return version
+
+
+def server_version(es):
+    """The server's ``(major, minor, patch)``, or ``None`` if it can't be read; cached per client."""
+    if id(es) in _server_versions:
+        return _server_versions[id(es)]
+    try:
+        info = es.info()
+    except Exception as e:
+        logger.warning(f"Could not read the Elasticsearch version: {str(e)}")
+        info = None
+    return _remember_version(es, info)
+
+
+async def server_version_async(es):
+    if id(es) in _server_versions:
+        return _server_versions[id(es)]
+    try:
+        info = await es.info()
+    except Exception as e:
+        logger.warning(f"Could not read the Elasticsearch version: {str(e)}")
+        info = None
+    return _remember_version(es, info)
+
+
+def _mode_for_version(mode, version):
+    # An unreadable version is given the benefit of the doubt
+    if mode == EXACT or version is None or version >= KNN_MIN_VERSION:
+        return mode
+    if version not in _warned_versions:
+        _warned_versions.add(version)
+        logger.warning(f"Elasticsearch {'.'.join(map(str, version))} has no knn search "
+                       f"(needs {'.'.join(map(str, KNN_MIN_VERSION))}+); using exact scoring")
+    return EXACT
+
+
+def supported_mode(es, mode=VECTOR_SEARCH_MODE):
+    """``mode``, or exact scoring if the server is too old for knn; use it for new mappings too."""
+    return _mode_for_version(mode, server_version(es))
+
+
+def supports_byte_vectors(es):
+    version = server_version(es)
+    return version is None or version >= BYTE_VECTORS_MIN_VERSION
+
+
+def _has_indexed_vectors(mappings, field):
+    for index_mapping in mappings.values():
+        field_mapping = index_mapping["mappings"].get("properties", {}).get(field, {})
+        if not field_mapping.get("index", False):
+            return False
+    return bool(mappings)
+
+
+def _cached_mode(index, field):
+    cached = _mode_cache.get((index, field))
+    if cached and time.time() - cached[1] < MODE_CACHE_TTL:
+        return cached[0]
+    return None
+
+
+def _remember_mode(index, field, resolved):
+    _mode_cache[(index, field)] = (resolved, time.time())
+    return resolved
+
+
+def resolve_mode(es, index, field="vector", mode=VECTOR_SEARCH_MODE):
+    """Pick exact or knn scoring for ``index``; "auto" checks the mapping and doc count.
+
+    Servers older than ``KNN_MIN_VERSION`` always get exact scoring.
+    """
+    if mode != AUTO:
+        return supported_mode(es, mode)
+    cached = _cached_mode(index, field)
+    if cached:
+        return cached
+    resolved = EXACT
+    if _has_indexed_vectors(es.indices.get_mapping(index=index), field) \
+            and es.count(index=index)["count"] >= KNN_MIN_DOCS:
+        resolved = supported_mode(es, KNN)
+    return _remember_mode(index, field, resolved)
+
+
+async def resolve_mode_async(es, index, field="vector", mode=VECTOR_SEARCH_MODE):
+    """``resolve_mode`` for an ``AsyncElasticsearch`` client, sharing the same cache."""
+    if mode != AUTO:
+        return _mode_for_version(mode, await server_version_async(es))
+    cached = _cached_mode(index, field)
+    if cached:
+        return cached
+    resolved = EXACT
+    if _has_indexed_vectors(await es.indices.get_mapping(index=index), field) \
+            and (await es.count(index=index))["count"] >= KNN_MIN_DOCS:
+        resolved = _mode_for_version(KNN, await server_version_async(es))
+    return _remember_mode(index, field, resolved)
+
+
+def vector_search_body(query_vector, k, mode, field="vector", filter=None):
+    """Search body for a top-k vector retrieval, on its own or as the vector leg of hybrid search."""
+    if mode == KNN:
+        return {"knn": knn_clause(query_vector, k, field=field, filter=filter), "size": k}
+    return {"query": exact_vector_query(query_vector, field=field, filter=filter), "size": k}
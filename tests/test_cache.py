@@ -0,0 +1,51 @@
+"""Cache entries stamped with ingest generations shared between processes."""
+from searchiq.cache import IngestGenerations, TTLCache
+
+
+class FakeIndices:
+    def __init__(self, aliases, fail=False):
+        self.aliases = aliases
+        self.fail = fail
+        self.refreshed = []
+
+    def refresh(self, index):
+        self.refreshed.append(index)
+
+    def get_alias(self, index):
+        if self.fail:
+            raise ConnectionError("unreachable")
+        return {index: {"aliases": {alias: {} for alias in self.aliases.get(index, [])}}}
+
+
+class FakeClient:
+    def __init__(self, aliases=None, fail=False):
+        self.indices = FakeIndices(aliases or {}, fail)
+
+
+def test_ingest_in_another_process_stales_the_entry(tmp_path):
+    path = str(tmp_path / "generations.sqlite3")
+    worker, ingester = IngestGenerations(path), IngestGenerations(path)
+    cache = TTLCache()
+    cache.put("key", "results", stamp=worker.stamp("report-2023"))
+    assert cache.get("key", worker.stamp("report-2023")) == "results"
+
+    ingester.record(FakeClient(), "report-2023")
+    assert cache.get("key", worker.stamp("report-2023")) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_only_covering_stamps_change(tmp_path):
+    generations = IngestGenerations(str(tmp_path / "generations.sqlite3"))
+    before = {index: generations.stamp(index) for index in ["a", "b", "shared", "a,b", "rep*", None]}
+    es = FakeClient({"a": ["shared"]})
+    assert generations.record(es, "a") == {"a", "shared"}
+    assert es.indices.refreshed == ["a"]
+    changed = {index for index, stamp in before.items() if generations.stamp(index) != stamp}
+    assert changed == {"a", "shared", "a,b", "rep*", None}
+
+
+def test_unknown_aliases_stale_everything(tmp_path):
+    generations = IngestGenerations(str(tmp_path / "generations.sqlite3"))
+    before = generations.stamp("unrelated")
+    assert generations.record(FakeClient(fail=True), "a") is None
+    assert generations.stamp("unrelated") != before
@@ -0,0 +1,76 @@
+"""Token windows: overlap between neighbouring chunks and where windows start and end."""
+import pytest
+
+from searchiq.chunking import FIXED, SECTION, SENTENCE, Chunker
+
+
+def words(count, prefix="w"):
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+
+def tokens(chunk):
+    return chunk.split()
+
+
+def test_short_text_is_one_chunk():
+    chunker = Chunker(max_tokens=10, overlap=3, strategy=FIXED)
+    assert chunker.fixed_windows(f"  {words(10)}  ") == [words(10)]
+    assert chunker.fixed_windows("   ") == []
+
+
+@pytest.mark.parametrize("count", [11, 17, 18, 25, 40])
+def test_windows_overlap_and_cover_every_token(count):
+    chunker = Chunker(max_tokens=10, overlap=3, strategy=FIXED)
+    chunks = [tokens(chunk) for chunk in chunker.fixed_windows(words(count))]
+
+    assert all(len(chunk) <= 10 for chunk in chunks)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert previous[-3:] == chunk[:3]
+    # Each window starts max_tokens - overlap tokens after the previous one
+    assert [chunk[0] for chunk in chunks] == [f"w{start}" for start in range(0, 7 * len(chunks), 7)]
+    assert chunks[-1][-1] == f"w{count - 1}"
+
+
+def test_last_window_ends_at_the_text_without_an_extra_tail():
+    # 17 tokens: windows [0, 10) and [7, 17); a third window would only repeat the overlap
+    chunker = Chunker(max_tokens=10, overlap=3, strategy=FIXED)
+    chunks = chunker.fixed_windows(words(17))
+    assert [tokens(chunk)[0] for chunk in chunks] == ["w0", "w7"]
+
+
+def test_overlap_is_capped_at_half_the_window():
+    chunker = Chunker(max_tokens=10, overlap=9, strategy=FIXED)
+    assert chunker.overlap == 5
+    assert [tokens(chunk)[0] for chunk in chunker.fixed_windows(words(20))] == ["w0", "w5", "w10"]
+
+
+def test_sentences_are_packed_without_being_split():
+    sentence = "Revenue grew four percent. "
+    chunker = Chunker(max_tokens=10, overlap=2, strategy=SENTENCE)
+    chunks = chunker.sentence_chunks(sentence * 5)
+    assert chunks == ["Revenue grew four percent. Revenue grew four percent."] * 2 + ["Revenue grew four percent."]
+
+
+def test_overlong_sentence_falls_back_to_windows():
+    chunker = Chunker(max_tokens=10, overlap=2, strategy=SENTENCE)
+    chunks = chunker.sentence_chunks(f"Short one. {words(15, prefix='W')}. Tail here.")
+    assert chunks[0] == "Short one."
+    assert all(len(tokens(chunk)) <= 10 for chunk in chunks)
+    assert tokens(chunks[1])[-2:] == tokens(chunks[2])[:2]
+    assert chunks[-1] == "Tail here."
+
+
+def test_section_strategy_never_crosses_a_boundary():
+    chunker = Chunker(max_tokens=10, overlap=2, strategy=SECTION)
+    sections = [{"name": "Risk", "content": "Debt rose. Rates rose."},
+                {"name": "Outlook", "content": "Guidance holds."}]
+    chunks = chunker.chunk_page("ignored", sections)
+    assert [(chunk["section"], chunk["text"]) for chunk in chunks] == [
+        ("Risk", "Debt rose. Rates rose."), ("Outlook", "Guidance holds.")
+    ]
+    assert [chunk["chunk_index"] for chunk in chunks] == [0, 1]
+
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ValueError):
+        Chunker(strategy="paragraph")
@@ -0,0 +1,44 @@
+"""Moving per-file indices into the shared index."""
+from consolidate_indices import converted_actions, registered, rehome
+from searchiq import storage
+from searchiq.dedup import SignatureIndex, minhash
+from searchiq.layout import DOCUMENT, DUPLICATE, PAGE
+from searchiq.local_index import LocalElasticsearch
+
+TARGET = "searchiq-docs-000001"
+TEXT = " ".join(f"word{i}" for i in range(60))
+
+
+def shared(monkeypatch):
+    monkeypatch.setattr(storage, "STORAGE_MODE", storage.SHARED)
+
+
+def test_rehome_prefixes_ids_and_references(monkeypatch):
+    shared(monkeypatch)
+    action = rehome({"_id": "page-3", "_source": {
+        "file_name": "b.pdf", "doc_type": DUPLICATE, "duplicate_of": "page-1", "duplicate_file": "a.pdf"
+    }}, TARGET)
+    assert action["_id"] == "b.pdf:page-3" and action["_routing"] == "b.pdf"
+    assert action["_source"]["duplicate_of"] == "a.pdf:page-1"
+
+
+def test_legacy_document_fields_are_kept(tmp_path, monkeypatch):
+    shared(monkeypatch)
+    es = LocalElasticsearch(str(tmp_path / "data"))
+    es.indices.create(index="report", body={"mappings": {"properties": {"file_name": {"type": "keyword"}}}})
+    es.index("report").write([("page-0", None, {
+        "file_name": "report.pdf", "title": "Report", "page_number": 1, "content": TEXT,
+        "creation_date": "D:20230101", "modification_date": "D:20230202"
+    })])
+    actions = list(converted_actions(es, "report", TARGET))
+    document = next(a["_source"] for a in actions if a["_source"]["doc_type"] == DOCUMENT)
+    assert document["creation_date"] == "D:20230101" and document["modification_date"] == "D:20230202"
+
+
+def test_copied_pages_are_registered_under_the_alias(tmp_path, monkeypatch):
+    shared(monkeypatch)
+    signatures = SignatureIndex(str(tmp_path / "signatures.sqlite3"))
+    page = rehome({"_id": "page-0", "_source": {"file_name": "a.pdf", "doc_type": PAGE, "content": TEXT}}, TARGET)
+    assert list(registered([page], signatures)) == [page]
+    match = signatures.find(storage.SHARED_INDEX_ALIAS, minhash(TEXT))
+    assert match["doc_id"] == "a.pdf:page-0" and match["file_name"] == "a.pdf"
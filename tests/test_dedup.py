@@ -0,0 +1,77 @@
+"""MinHash/LSH near-duplicate detection: a lightly edited page matches, a different one doesn't."""
+import random
+
+from searchiq.dedup import (
+    REFERENCE, SKIP, Deduplicator, SignatureIndex, buckets, minhash, shingles, similarity
+)
+from searchiq.layout import page_id
+
+WORDS = ["revenue", "growth", "risk", "cloud", "margin", "segment", "liquidity", "guidance", "tax", "debt",
+         "quarter", "customers", "pricing", "capital", "outlook", "demand", "supply", "costs", "cash", "rates"]
+
+
+def page(seed, count=200):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+
+def edited(text, changes=2, seed=0):
+    """``text`` with a few words replaced, like a page re-issued with a corrected figure."""
+    rng = random.Random(seed)
+    words = text.split()
+    for position in rng.sample(range(len(words)), changes):
+        words[position] = "amended"
+    return " ".join(words)
+
+
+def test_near_duplicate_pair_is_similar_and_shares_a_bucket():
+    original = page(1)
+    left, right = minhash(original), minhash(edited(original))
+    assert similarity(left, right) >= 0.9
+    assert set(buckets(left)) & set(buckets(right))
+
+
+def test_distinct_pair_is_not_similar_and_shares_no_bucket():
+    left, right = minhash(page(1)), minhash(page(2))
+    assert similarity(left, right) < 0.3
+    assert not set(buckets(left)) & set(buckets(right))
+
+
+def test_signatures_are_deterministic():
+    assert minhash(page(1)) == minhash(page(1))
+
+
+def test_short_texts_are_never_compared():
+    assert shingles("too short to tell") is None
+    assert minhash("too short to tell") is None
+
+
+def test_index_finds_the_near_duplicate_only(tmp_path):
+    signatures = SignatureIndex(str(tmp_path / "signatures.sqlite3"))
+    original = page(1)
+    signatures.add("docs", "a.pdf-page-0", "a.pdf", minhash(original))
+
+    match = signatures.find("docs", minhash(edited(original)))
+    assert match["doc_id"] == "a.pdf-page-0" and match["file_name"] == "a.pdf"
+    assert match["similarity"] >= 0.9
+    assert signatures.find("docs", minhash(page(2))) is None
+    # Scopes don't see each other's signatures
+    assert signatures.find("other", minhash(original)) is None
+
+
+def test_deduplicator_marks_duplicates_and_keeps_distinct_pages(tmp_path):
+    signatures = SignatureIndex(str(tmp_path / "signatures.sqlite3"))
+    original = page(1)
+    Deduplicator("docs", "a.pdf", mode=REFERENCE, signatures=signatures).register_page({"index": 0, "text": original})
+
+    dedup = Deduplicator("docs", "b.pdf", mode=REFERENCE, signatures=signatures)
+    duplicate = {"index": 0, "text": edited(original)}
+    distinct = {"index": 1, "text": page(2)}
+    assert dedup.keep(duplicate) and duplicate["duplicate_of"]["doc_id"] == page_id("a.pdf", 0)
+    assert dedup.keep(distinct) and "duplicate_of" not in distinct
+    assert dedup.duplicates == 1
+
+    skipping = Deduplicator("docs", "c.pdf", mode=SKIP, signatures=signatures)
+    assert not skipping.keep({"index": 0, "text": edited(original, seed=1)})
+    # b.pdf's distinct page became canonical for later files
+    assert not skipping.keep({"index": 1, "text": page(2)})
@@ -0,0 +1,30 @@
+"""The embedding cache's disk bound holds when several processes share the file."""
+import sqlite3
+
+from searchiq.embeddings import EmbeddingCache
+
+
+def disk_count(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+def test_bound_counts_rows_written_by_other_caches(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    first, second = EmbeddingCache(path, max_entries=4), EmbeddingCache(path, max_entries=4)
+
+    first.put_many([(f"a{i}", [float(i)]) for i in range(3)], memory=False)
+    second.put_many([(f"b{i}", [float(i)]) for i in range(3)], memory=False)
+    assert disk_count(path) == 4
+    first.put_many([("c", [1.0])], memory=False)
+    assert disk_count(path) == 4
+    assert "c" in second.get_many(["c"])
+
+
+def test_least_recently_used_rows_are_evicted(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    cache = EmbeddingCache(path, max_entries=2)
+    cache.put_many([("old", [0.0])], memory=False)
+    cache.put_many([("new", [1.0])], memory=False)
+    cache.put_many([("newest", [2.0])], memory=False)
+    assert set(cache.get_many(["old", "new", "newest"], memory=False)) == {"new", "newest"}
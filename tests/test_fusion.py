@@ -0,0 +1,72 @@
+"""Ordering and ties of reciprocal rank and weighted score fusion."""
+import pytest
+
+from searchiq.fusion import RRF, WEIGHTED, fuse, reciprocal_rank_fusion, weighted_score_fusion
+
+
+def hits(*pairs, index="docs"):
+    return [{"_index": index, "_id": doc_id, "_score": score} for doc_id, score in pairs]
+
+
+def ids(fused):
+    return [hit["_id"] for hit, _ in fused]
+
+
+def test_rrf_ranks_documents_found_by_both_legs_first():
+    lexical = hits(("a", 12.0), ("b", 9.0), ("c", 1.0))
+    vector = hits(("c", 0.9), ("d", 0.8), ("a", 0.7))
+    fused = reciprocal_rank_fusion([lexical, vector], k=60)
+    assert ids(fused) == ["a", "c", "b", "d"]
+    assert fused[0][1] == pytest.approx(1 / 61 + 1 / 63)
+
+
+def test_rrf_ignores_score_scales():
+    # Same ranks, wildly different scores: same fusion
+    small = reciprocal_rank_fusion([hits(("a", 2.0), ("b", 1.0)), hits(("b", 0.2), ("c", 0.1))])
+    large = reciprocal_rank_fusion([hits(("a", 2e6), ("b", 1.0)), hits(("b", 0.9), ("c", 0.89))])
+    assert [(hit["_id"], score) for hit, score in small] == [(hit["_id"], score) for hit, score in large]
+
+
+def test_rrf_weights_favour_a_leg():
+    lexical, vector = hits(("a", 1.0)), hits(("b", 1.0))
+    assert ids(reciprocal_rank_fusion([lexical, vector], weights=[1.0, 2.0])) == ["b", "a"]
+
+
+def test_rrf_ties_keep_first_seen_order():
+    # a and b each hold rank 1 in one leg; the first leg's document stays first
+    fused = reciprocal_rank_fusion([hits(("a", 1.0)), hits(("b", 1.0))])
+    assert ids(fused) == ["a", "b"]
+    assert fused[0][1] == fused[1][1]
+
+
+def test_same_id_in_different_indices_is_not_merged():
+    fused = reciprocal_rank_fusion([hits(("a", 1.0), index="one"), hits(("a", 1.0), index="two")])
+    assert [hit["_index"] for hit, _ in fused] == ["one", "two"]
+
+
+def test_weighted_fusion_normalizes_each_leg():
+    lexical = hits(("a", 30.0), ("b", 20.0), ("c", 10.0))
+    vector = hits(("c", 0.9), ("b", 0.85), ("a", 0.3))
+    fused = dict((hit["_id"], score) for hit, score in weighted_score_fusion([lexical, vector]))
+    assert fused["a"] == pytest.approx(1.0)
+    assert fused["b"] == pytest.approx(0.5 + 0.55 / 0.6)
+    assert fused["c"] == pytest.approx(1.0)
+
+
+def test_weighted_fusion_flat_leg_scores_one():
+    fused = weighted_score_fusion([hits(("a", 5.0), ("b", 5.0)), []])
+    assert [score for _, score in fused] == [1.0, 1.0]
+    assert ids(fused) == ["a", "b"]
+
+
+def test_weighted_fusion_missing_scores_count_as_zero():
+    fused = weighted_score_fusion([hits(("a", None), ("b", 4.0))])
+    assert ids(fused) == ["b", "a"]
+
+
+def test_fuse_dispatches_on_method():
+    legs = [hits(("a", 3.0), ("b", 1.0)), hits(("b", 0.9))]
+    assert fuse(legs, method=RRF) == reciprocal_rank_fusion(legs)
+    assert fuse(legs, method=WEIGHTED) == weighted_score_fusion(legs)
+    with pytest.raises(ValueError):
+        fuse(legs, method="borda")
@@ -0,0 +1,68 @@
+"""Re-uploads: unchanged pages keep their docs, pages that are gone are deleted."""
+from elasticsearch import helpers
+
+from searchiq.incremental import Reconciler
+from searchiq.layout import CHUNK, PAGE, chunk_id, page_id
+from searchiq.local_index import LocalElasticsearch
+
+FILE = "report.pdf"
+MAPPING = {"mappings": {"properties": {
+    "file_name": {"type": "keyword"}, "doc_type": {"type": "keyword"},
+    "page_id": {"type": "keyword"}, "content_hash": {"type": "keyword"}
+}}}
+
+
+def page_docs(page_index, content_hash, chunks=2):
+    docs = [{"_index": "docs", "_id": page_id(FILE, page_index), "_source": {
+        "file_name": FILE, "doc_type": PAGE, "content_hash": content_hash}}]
+    docs += [{"_index": "docs", "_id": chunk_id(FILE, page_index, n), "_source": {
+        "file_name": FILE, "doc_type": CHUNK, "page_id": page_id(FILE, page_index)}} for n in range(chunks)]
+    return docs
+
+
+def indexed_ids(es):
+    return {hit["_id"] for hit in helpers.scan(es, index="docs", query={"query": {"match_all": {}}})}
+
+
+def make_es(tmp_path):
+    es = LocalElasticsearch(str(tmp_path))
+    es.indices.create(index="docs", body=MAPPING)
+    helpers.bulk(es, page_docs(0, "h0") + page_docs(1, "h1") + page_docs(2, "h2"))
+    # Another file's docs are never touched
+    helpers.bulk(es, [{"_index": "docs", "_id": "other.pdf-page-0",
+                       "_source": {"file_name": "other.pdf", "doc_type": PAGE, "content_hash": "h0"}}])
+    return es
+
+
+def test_unchanged_page_is_skipped_and_removed_page_deleted(tmp_path):
+    es = make_es(tmp_path)
+    reconciler = Reconciler.load(es, "docs", FILE)
+
+    # The new upload has page 0 unchanged, page 1 edited and no page 2
+    assert reconciler.unchanged({"index": 0, "content_hash": "h0"})
+    assert not reconciler.unchanged({"index": 1, "content_hash": "h1-edited"})
+    written = list(reconciler.track(page_docs(1, "h1-edited", chunks=1)))
+    helpers.bulk(es, written)
+    helpers.bulk(es, reconciler.delete_actions())
+
+    assert reconciler.pages_skipped == 1
+    assert reconciler.replaced_pages() == [page_id(FILE, 1), page_id(FILE, 2)]
+    assert indexed_ids(es) == {
+        page_id(FILE, 0), chunk_id(FILE, 0, 0), chunk_id(FILE, 0, 1),
+        page_id(FILE, 1), chunk_id(FILE, 1, 0),
+        "other.pdf-page-0"
+    }
+
+
+def test_identical_reupload_deletes_nothing(tmp_path):
+    es = make_es(tmp_path)
+    reconciler = Reconciler.load(es, "docs", FILE)
+    assert all(reconciler.unchanged({"index": n, "content_hash": f"h{n}"}) for n in range(3))
+    assert list(reconciler.delete_actions()) == []
+    assert reconciler.replaced_pages() == []
+
+
+def test_first_upload_to_a_missing_index(tmp_path):
+    reconciler = Reconciler.load(LocalElasticsearch(str(tmp_path)), "docs", FILE)
+    assert not reconciler.unchanged({"index": 0, "content_hash": "h0"})
+    assert list(reconciler.delete_actions()) == []
@@ -0,0 +1,32 @@
+"""Inputs of a directory ingest that would overwrite each other's docs."""
+import pytest
+
+from ingest_dir import colliding_inputs, target_index
+from searchiq import storage
+
+ARCHIVE = ["archive/2023/10-K.pdf", "archive/2024/10-K.pdf", "archive/2024/10-Q.pdf", "archive/2024/10_q.pdf"]
+
+
+def test_target_index():
+    assert target_index("archive/2024/10-K.pdf") == "10-k"
+    assert target_index("archive/2024/10-K.pdf", "filings") == "filings"
+
+
+def test_same_base_name_collides_per_file():
+    assert colliding_inputs(ARCHIVE) == [ARCHIVE[:2], ARCHIVE[2:]]
+
+
+def test_same_base_name_collides_in_shared_storage(monkeypatch):
+    monkeypatch.setattr(storage, "STORAGE_MODE", storage.SHARED)
+    # Ids are namespaced by file name there, so only identical base names clash
+    assert colliding_inputs(ARCHIVE, "searchiq-docs-000001") == [ARCHIVE[:2]]
+
+
+def test_one_index_without_namespaced_ids_collides():
+    assert colliding_inputs(ARCHIVE[1:3], "filings") == [ARCHIVE[1:3]]
+
+
+@pytest.mark.parametrize("index_name", [None, "filings"])
+def test_single_or_distinct_inputs_are_fine(index_name):
+    assert colliding_inputs(["a/one.pdf"], index_name) == []
+    assert colliding_inputs(["a/one.pdf", "b/two.pdf"]) == []
@@ -0,0 +1,63 @@
+"""Job state shared through the SQLite job store, as between worker processes."""
+import subprocess
+import sys
+import threading
+import time
+
+from searchiq.jobs import CANCELLED, COMPLETED, FAILED, RUNNING, Job, JobManager, JobStore, StoredJob
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_other_manager_sees_progress_and_result(tmp_path):
+    store_path = str(tmp_path / "jobs.sqlite3")
+    owner, other = JobManager(store=JobStore(store_path)), JobManager(store=JobStore(store_path))
+    job = owner.submit(lambda job: job.increment(pages_done=3) or "ok", file_name="a.pdf")
+
+    wait_for(lambda: other.get(job.id) is not None and other.get(job.id).finished)
+    state = other.get(job.id).to_dict()
+    assert state["status"] == COMPLETED and state["result"] == "ok"
+    assert state["pages_done"] == 3 and state["file_name"] == "a.pdf"
+    assert [listed.id for listed in other.list()] == [job.id]
+
+
+def test_cancel_through_other_manager(tmp_path):
+    store_path = str(tmp_path / "jobs.sqlite3")
+    owner, other = JobManager(store=JobStore(store_path)), JobManager(store=JobStore(store_path))
+    started = threading.Event()
+
+    def work(job):
+        started.set()
+        while True:
+            job.check_cancelled()
+
+    job = owner.submit(work)
+    started.wait(5)
+    assert other.cancel(job.id).to_dict()["cancel_requested"]
+    wait_for(lambda: other.get(job.id).finished)
+    assert job.status == CANCELLED
+    assert other.get(job.id).to_dict()["status"] == CANCELLED
+
+
+def test_job_of_exited_process_reads_as_failed(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    job = Job()
+    job.status = RUNNING
+    store.save(job.to_dict(), owner_pid=exited.pid)
+
+    view = JobManager(store=store).get(job.id)
+    assert isinstance(view, StoredJob) and view.finished
+    assert view.to_dict()["status"] == FAILED
+    assert store.load(job.id)["status"] == FAILED
+
+
+def test_unknown_job(tmp_path):
+    manager = JobManager(store=JobStore(str(tmp_path / "jobs.sqlite3")))
+    assert manager.get("missing") is None and manager.cancel("missing") is None
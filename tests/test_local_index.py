@@ -0,0 +1,67 @@
+"""Crash safety and single-writer locking of local backend writes: meta.json is the commit point."""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from searchiq.local_index import LocalElasticsearch, LocalIndex
+
+MAPPING = {"mappings": {"properties": {"name": {"type": "keyword"}, "vector": {"type": "dense_vector", "dims": 2}}}}
+
+
+def crash_before_commit(monkeypatch, local, docs):
+    with monkeypatch.context() as patched:
+        patched.setattr(LocalIndex, "save_meta", lambda self: (_ for _ in ()).throw(OSError("crash")))
+        with pytest.raises(OSError):
+            local.write(docs)
+
+
+def vectors(es):
+    hits = es.search(index="docs", body={"query": {"match_all": {}}, "size": 10})["hits"]["hits"]
+    local = es.index("docs")
+    return {hit["_id"]: [round(float(value), 3) for value in local.vector("vector", local.raw(local.row_of[hit["_id"]])["vector"])]
+            for hit in hits}
+
+
+def test_vectors_of_an_uncommitted_write_are_dropped(tmp_path, monkeypatch):
+    es = LocalElasticsearch(str(tmp_path))
+    es.indices.create(index="docs", body=MAPPING)
+    es.index("docs").write([("a", None, {"name": "a", "vector": [1.0, 0.0]})])
+    crash_before_commit(monkeypatch, es.index("docs"), [("b", None, {"name": "b", "vector": [0.0, 1.0]})])
+
+    es = LocalElasticsearch(str(tmp_path))
+    es.index("docs").write([("c", None, {"name": "c", "vector": [0.6, 0.8]})])
+    es = LocalElasticsearch(str(tmp_path))
+    assert vectors(es) == {"a": [1.0, 0.0], "c": [0.6, 0.8]}
+
+
+def test_replaced_doc_survives_an_uncommitted_replacement(tmp_path, monkeypatch):
+    es = LocalElasticsearch(str(tmp_path))
+    es.indices.create(index="docs", body=MAPPING)
+    es.index("docs").write([("a", None, {"name": "old", "vector": [1.0, 0.0]})])
+    crash_before_commit(monkeypatch, es.index("docs"), [("a", None, {"name": "new", "vector": [0.0, 1.0]})])
+
+    es = LocalElasticsearch(str(tmp_path))
+    assert es.get(index="docs", id="a")["_source"]["name"] == "old"
+    assert vectors(es) == {"a": [1.0, 0.0]}
+
+
+def write_from_another_process(path):
+    script = ("import sys; from searchiq.local_index import LocalElasticsearch, WriterLocked\n"
+              "es = LocalElasticsearch(sys.argv[1])\n"
+              "try:\n    es.index('docs').write([('x', None, {'name': 'x', 'vector': [1.0, 0.0]})])\n"
+              "except WriterLocked as e:\n    print(e)\n")
+    return subprocess.run([sys.executable, "-c", script, path], capture_output=True, text=True, check=True).stdout
+
+
+def test_second_process_cannot_write(tmp_path):
+    es = LocalElasticsearch(str(tmp_path))
+    es.indices.create(index="docs", body=MAPPING)
+    assert f"pid {os.getpid()}" in write_from_another_process(str(tmp_path))
+    assert vectors(LocalElasticsearch(str(tmp_path))) == {}
+
+
+def test_readers_do_not_take_the_lock(tmp_path):
+    LocalElasticsearch(str(tmp_path / "other")).indices.exists(index="docs")
+    assert not os.path.exists(tmp_path / "other" / "writer.lock")
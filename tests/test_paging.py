@@ -0,0 +1,56 @@
+"""Point-in-time paging: page 2 continues the snapshot page 1 was served from."""
+from searchiq.local_index import LocalElasticsearch
+from searchiq.paging import decode_cursor, search_page, snapshot_cursor
+
+MAPPING = {"mappings": {"properties": {"name": {"type": "keyword"}, "rank": {"type": "integer"}}}}
+BODY = {"query": {"match_all": {}}}
+
+
+def make_es(tmp_path, count):
+    es = LocalElasticsearch(str(tmp_path))
+    es.indices.create(index="docs", body=MAPPING)
+    es.index("docs").write([(f"d{i}", None, {"name": f"d{i}", "rank": i}) for i in range(count)])
+    return es
+
+
+def ids(response):
+    return [hit["_id"] for hit in response["hits"]["hits"]]
+
+
+def test_first_page_cursor_holds_a_point_in_time(tmp_path):
+    es = make_es(tmp_path, 5)
+    _, cursor = search_page(es, "docs", BODY, 2)
+    pit_id, search_after, _ = decode_cursor(cursor)
+    assert pit_id is not None and search_after
+
+
+def test_docs_indexed_after_page_one_do_not_shift_page_two(tmp_path):
+    es = make_es(tmp_path, 4)
+    first, cursor = search_page(es, "docs", BODY, 2)
+    es.index("docs").write([(f"new{i}", None, {"name": f"new{i}", "rank": 9}) for i in range(3)])
+
+    second, cursor = search_page(es, "docs", BODY, 2, cursor)
+    third, cursor = search_page(es, "docs", BODY, 2, cursor)
+    assert sorted(ids(first) + ids(second) + ids(third)) == ["d0", "d1", "d2", "d3"]
+    assert cursor is None
+
+
+def test_single_page_closes_its_point_in_time(tmp_path):
+    es = make_es(tmp_path, 2)
+    opened = []
+    open_pit = es.open_point_in_time
+    es.open_point_in_time = lambda **kwargs: opened.append(open_pit(**kwargs)["id"]) or {"id": opened[-1]}
+
+    response, cursor = search_page(es, "docs", BODY, 5)
+    assert cursor is None and len(ids(response)) == 2
+    assert opened and all(pit_id not in es._contexts for pit_id in opened)
+
+
+def test_cached_first_pages_get_their_own_snapshot(tmp_path):
+    es = make_es(tmp_path, 4)
+    first, _ = search_page(es, "docs", BODY, 2)
+    cursors = [snapshot_cursor(es, "docs", 2) for _ in range(2)]
+    assert decode_cursor(cursors[0])[0] != decode_cursor(cursors[1])[0]
+
+    second, _ = search_page(es, "docs", BODY, 2, cursors[0])
+    assert sorted(ids(first) + ids(second)) == ["d0", "d1", "d2", "d3"]
@@ -0,0 +1,98 @@
+"""int8 quantization: round-trip error of quantized vectors and exact rescoring of the candidates."""
+import math
+import random
+
+import pytest
+from elasticsearch import helpers
+
+from searchiq import quantization
+from searchiq.local_index import LocalElasticsearch
+from searchiq.quantization import (
+    INT8, INT8_MAX, QUANTIZED_FIELD, calibrate, pageable, quantize, quantize_query, quantized_actions,
+    quantized_search_body
+)
+from searchiq.vectors import exact_vector_query, vector_mapping
+
+DIMS = 16
+
+
+def random_vectors(count, dims=DIMS, seed=0):
+    rng = random.Random(seed)
+    return [[rng.gauss(0, 1) for _ in range(dims)] for _ in range(count)]
+
+
+def cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    return dot / (math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b)))
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(quantization, "_write_state", {})
+    monkeypatch.setattr(quantization, "_search_state", {})
+
+
+def test_round_trip_error_is_at_most_half_a_step():
+    vectors = random_vectors(200)
+    scale = calibrate(vectors, quantile=1.0)
+    for vector in vectors:
+        restored = [value / scale for value in quantize(vector, scale)]
+        assert max(abs(a - b) for a, b in zip(vector, restored)) <= 0.5 / scale + 1e-12
+        assert cosine(vector, restored) > 0.999
+
+
+def test_values_past_the_quantile_are_clipped():
+    vectors = random_vectors(100)
+    scale = calibrate(vectors, quantile=0.9)
+    quantized = [value for vector in vectors for value in quantize(vector, scale)]
+    assert min(quantized) == -INT8_MAX and max(quantized) == INT8_MAX
+    clipped = sum(abs(value) == INT8_MAX for value in quantized)
+    assert 0 < clipped <= 0.12 * len(quantized)
+
+
+def test_calibration_of_empty_or_zero_vectors():
+    assert calibrate([]) == 1.0
+    assert calibrate([[0.0, 0.0]]) == 1.0
+
+
+def test_query_uses_the_full_range():
+    quantized = quantize_query([0.02, -0.01, 0.005])
+    assert quantized == [127, -64, 32]
+    assert quantize_query([0.0, 0.0]) == [0, 0]
+
+
+def make_index(tmp_path, vectors, sample_size):
+    es = LocalElasticsearch(str(tmp_path))
+    es.indices.create(index="docs", body={"mappings": {
+        "properties": {"vector": vector_mapping(DIMS, mode="exact"),
+                       QUANTIZED_FIELD: vector_mapping(DIMS, mode="exact", element_type="byte")},
+        "_meta": {"quantization": {"type": INT8}}
+    }})
+    actions = [{"_index": "docs", "_id": f"d{n}", "_source": {"vector": vector}} for n, vector in enumerate(vectors)]
+    helpers.bulk(es, quantized_actions(es, actions, sample_size=sample_size))
+    return es
+
+
+def test_index_is_calibrated_on_its_first_vectors(tmp_path):
+    vectors = random_vectors(30)
+    es = make_index(tmp_path, vectors, sample_size=10)
+    meta = es.indices.get_mapping(index="docs")["docs"]["mappings"]["_meta"]["quantization"]
+    assert meta["sample_size"] == 10
+    assert meta["scale"] == pytest.approx(calibrate(vectors[:10]))
+    stored = es.get(index="docs", id="d29")["_source"][QUANTIZED_FIELD]
+    assert stored == quantize(vectors[29], meta["scale"])
+
+
+def test_rescoring_returns_the_exact_top_k_and_scores(tmp_path):
+    es = make_index(tmp_path, random_vectors(80), sample_size=20)
+    for query in random_vectors(5, seed=1):
+        exact = es.search(index="docs", body={"query": exact_vector_query(query), "size": 5})["hits"]["hits"]
+        body = quantized_search_body(query, 5, "exact", window=40)
+        rescored = es.search(index="docs", body=body)["hits"]["hits"]
+        assert [(hit["_id"], hit["_score"]) for hit in rescored] == [(hit["_id"], hit["_score"]) for hit in exact]
+        assert not pageable(body)
+
+
+def test_rescore_window_is_never_smaller_than_k():
+    body = quantized_search_body([1.0] * DIMS, 20, "exact", window=5)
+    assert body["size"] == 20 and body["rescore"]["window_size"] == 20
@@ -0,0 +1,99 @@
+"""Property tests for the boolean query parser, over seeded random queries."""
+import json
+import random
+
+import pytest
+
+from searchiq.query import MATCH_NONE, TEXT_FIELDS, compile_query, parse
+
+SEEDS = range(200)
+WORDS = ["revenue", "growth", "risk", "cloud", "margin", "segment", "liquidity", "guidance", "tax", "debt"]
+# Everything the tokenizer treats specially, plus noise
+PIECES = ["AND", "OR", "NOT", "and", "(", ")", '"', "section:", "file:", "type:", "title:", "content:",
+          "file:", ":", " ", "  ", "\t", "é", "∑", "-", "*", "\\", "'"] + WORDS
+
+
+def random_text(rng):
+    return "".join(rng.choice(PIECES) + rng.choice(["", " "]) for _ in range(rng.randint(0, 30)))
+
+
+def random_expression(rng, depth=0):
+    """A well-formed query string: words, phrases and field constraints joined by operators."""
+    roll = rng.random()
+    if depth > 3 or roll < 0.4:
+        kind = rng.choice(["word", "phrase", "field"])
+        if kind == "word":
+            return rng.choice(WORDS)
+        if kind == "phrase":
+            return '"%s"' % " ".join(rng.sample(WORDS, 2))
+        return f"{rng.choice(['section', 'file', 'type', 'title'])}:{rng.choice(WORDS)}"
+    if roll < 0.55:
+        return f"NOT {random_expression(rng, depth + 1)}"
+    operator = rng.choice(["AND", "OR"])
+    return f"({random_expression(rng, depth + 1)} {operator} {random_expression(rng, depth + 1)})"
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_any_string_compiles(seed):
+    rng = random.Random(seed)
+    for _ in range(25):
+        compiled = compile_query(random_text(rng))
+        assert set(compiled) == {"must", "filter", "must_not"}
+        json.dumps(compiled)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_and_binds_tighter_than_or(seed):
+    x, y, z = random.Random(seed).sample(WORDS, 3)
+    assert parse(f"{x} OR {y} AND {z}") == parse(f"{x} OR ({y} AND {z})")
+    assert parse(f"{x} AND {y} OR {z}") == parse(f"({x} AND {y}) OR {z}")
+    assert parse(f"{x} OR {y} AND {z}") == ("or", (("text", x), ("and", (("text", y), ("text", z)))))
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_double_negation_cancels(seed):
+    expression = random_expression(random.Random(seed))
+    assert compile_query(f"NOT NOT ({expression})") == compile_query(expression)
+    assert parse(f"NOT NOT {expression}") == parse(expression)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_clauses_land_in_the_right_place(seed):
+    rng = random.Random(seed)
+    words = rng.sample(WORDS, 6)
+    texts = words[:rng.randint(1, 2)]
+    fields = [f"file:{word}.pdf" for word in words[2:2 + rng.randint(0, 2)]]
+    negated = [f"NOT {word}" for word in words[4:4 + rng.randint(0, 2)]]
+    parts = texts + fields + negated
+    rng.shuffle(parts)
+
+    compiled = compile_query(" AND ".join(parts))
+    assert compiled["must"] == [{"multi_match": {"query": word, "fields": TEXT_FIELDS}}
+                                for word in [p for p in parts if p in texts]]
+    assert compiled["filter"] == [{"term": {"file_name": p.split(":", 1)[1]}} for p in parts if p in fields]
+    assert compiled["must_not"] == [{"multi_match": {"query": p.split()[1], "fields": TEXT_FIELDS}}
+                                    for p in parts if p in negated]
+
+
+def test_field_prefixes():
+    compiled = compile_query('type:pdf section:"risk factors" title:growth')
+    assert compiled["filter"] == [{"term": {"file_type": "PDF"}}, {"match_phrase": {"section": "risk factors"}}]
+    assert compiled["must"] == [{"multi_match": {"query": "growth", "fields": ["title", "doc_title"]}}]
+
+
+@pytest.mark.parametrize("query", ["NOT foo", "NOT foo AND NOT bar", "NOT foo OR NOT bar", "AND OR NOT", "()", '""'])
+def test_nothing_positive_matches_nothing(query):
+    assert MATCH_NONE in compile_query(query)["must"]
+
+
+def test_negations_still_filter():
+    assert compile_query("NOT foo") == {
+        "must": [MATCH_NONE],
+        "filter": [],
+        "must_not": [{"multi_match": {"query": "foo", "fields": TEXT_FIELDS}}]
+    }
+
+
+@pytest.mark.parametrize("query", ["foo", "foo AND NOT bar", "NOT bar OR foo", "NOT NOT foo", "file:a.pdf"])
+def test_positive_queries_can_match(query):
+    assert MATCH_NONE not in compile_query(query)["must"]
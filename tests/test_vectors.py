@@ -0,0 +1,48 @@
+"""Vector search modes gated on the Elasticsearch version."""
+import pytest
+
+from searchiq import vectors
+from searchiq.layout import QUANTIZED_FIELD, supported_index_mapping
+from searchiq.vectors import EXACT, KNN, parse_version, resolve_mode, supported_mode
+
+
+class FakeServer:
+    def __init__(self, number):
+        self.number = number
+
+    def info(self):
+        if self.number is None:
+            raise ConnectionError("unreachable")
+        return {"version": {"number": self.number}}
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches(monkeypatch):
+    monkeypatch.setattr(vectors, "_server_versions", {})
+    monkeypatch.setattr(vectors, "_mode_cache", {})
+
+
+def test_parse_version():
+    assert parse_version("8.6.2") == (8, 6, 2)
+    assert parse_version("8.11.0-SNAPSHOT") == (8, 11, 0)
+
+
+@pytest.mark.parametrize("number, expected", [("7.17.9", EXACT), ("8.3.3", EXACT), ("8.4.0", KNN),
+                                              ("8.11.1", KNN), (None, KNN)])
+def test_knn_needs_8_4(number, expected):
+    es = FakeServer(number)
+    assert supported_mode(es, KNN) == expected
+    assert resolve_mode(es, "index", mode=KNN) == expected
+    assert supported_mode(es, EXACT) == EXACT
+
+
+@pytest.mark.parametrize("number, quantized", [("8.5.3", False), ("8.6.0", True)])
+def test_byte_vectors_need_8_6(number, quantized):
+    mapping = supported_index_mapping(FakeServer(number), 4, quantization="int8")
+    assert (QUANTIZED_FIELD in mapping["properties"]) == quantized
+
+
+@pytest.mark.parametrize("number, indexed", [("8.2.0", False), ("8.4.0", True)])
+def test_old_server_gets_exact_mapping(number, indexed):
+    mapping = supported_index_mapping(FakeServer(number), 4, mode=KNN)
+    assert mapping["properties"]["vector"]["index"] is indexed
@@ -0,0 +1,132 @@
+# vector_recall.py
+#
+# Recall and footprint report for an int8-quantized index, measured against
+# the exact full-precision path. For a sample of queries it compares the
+# top-k of exact cosine scoring on ``vector`` with the int8 first pass alone
+# and with rescoring windows of several sizes, then reports per-field disk
+# usage and how much the int8 copy adds: the float ``vector`` stays on disk
+# for rescoring, so quantizing grows the index rather than shrinking it.
+#
+#   python vector_recall.py report-2024 --k 10 --windows 10,50,100,200
+#   python vector_recall.py report-2024 --query-file queries.txt --output recall.json
+#
+# Without --query-file, queries are the opening words of randomly sampled chunks.
+
+import argparse
+import json
+
+from elasticsearch import Elasticsearch
+from searchiq.embedding_service import get_encoder
+from searchiq.layout import CHUNK
+from searchiq.quantization import (
+    QUANTIZED_FIELD, is_quantized, quantize_query, quantized_search_body
+)
+from searchiq.vectors import exact_vector_query, resolve_mode, vector_search_body
+
+ES_HOST = "http://localhost:9200"
+QUERY_WORDS = 12
+
+
+def sample_queries(es, index, count, seed):
+    """Opening words of ``count`` random chunks, standing in for user queries."""
+    response = es.search(index=index, body={
+        "size": count,
+        "_source": ["content"],
+        "query": {"function_score": {
+            "query": {"term": {"doc_type": CHUNK}},
+            "random_score": {"seed": seed, "field": "_seq_no"}
+        }}
+    })
+    return [" ".join(hit["_source"]["content"].split()[:QUERY_WORDS]) for hit in response["hits"]["hits"]]
+
+
+def top_ids(es, index, body):
+    response = es.search(index=index, body={**body, "_source": False})
+    return [hit["_id"] for hit in response["hits"]["hits"]], response["took"]
+
+
+def field_bytes(es, index):
+    """On-disk bytes of the vector fields and the whole index, or None if the cluster can't report them."""
+    try:
+        usage = es.indices.disk_usage(index=index, params={"run_expensive_tasks": "true"})
+    except Exception as e:
+        print(f"⚠️ Disk usage unavailable: {str(e)}")
+        return None
+    sizes = {"vector": 0, QUANTIZED_FIELD: 0, "index": 0}
+    for name, stats in usage.items():
+        if name.startswith("_"):
+            continue
+        sizes["index"] += stats.get("store_size_in_bytes", 0)
+        for field in ("vector", QUANTIZED_FIELD):
+            if field in stats.get("fields", {}):
+                sizes[field] += stats["fields"][field]["total_in_bytes"]
+    return sizes
+
+
+def int8_overhead(sizes):
+    """What the int8 copy adds, relative to the float vectors and to the index without it."""
+    if not sizes or not sizes["vector"] or sizes["index"] <= sizes[QUANTIZED_FIELD]:
+        return None
+    return {
+        "vs_float_vectors": round(sizes[QUANTIZED_FIELD] / sizes["vector"], 3),
+        "vs_index": round(sizes[QUANTIZED_FIELD] / (sizes["index"] - sizes[QUANTIZED_FIELD]), 3)
+    }
+
+
+def report(es, index, encoder, queries, k, windows):
+    mode = resolve_mode(es, index, field=QUANTIZED_FIELD)
+    variants = {"int8": lambda v: vector_search_body(quantize_query(v), k, mode, field=QUANTIZED_FIELD)}
+    for window in windows:
+        variants[f"int8+rescore@{window}"] = lambda v, window=window: quantized_search_body(v, k, mode, window=window)
+
+    recall = {name: 0.0 for name in variants}
+    took = {name: 0 for name in ["exact", *variants]}
+    for vector in encoder.encode(queries):
+        truth, exact_took = top_ids(es, index, {"query": exact_vector_query(vector), "size": k})
+        took["exact"] += exact_took
+        for name, body in variants.items():
+            ids, variant_took = top_ids(es, index, body(vector))
+            took[name] += variant_took
+            if truth:
+                recall[name] += len(set(ids) & set(truth)) / len(truth)
+
+    sizes = field_bytes(es, index)
+    return {
+        "index": index,
+        "mode": mode,
+        "k": k,
+        "queries": len(queries),
+        f"recall@{k}": {name: round(total / len(queries), 4) for name, total in recall.items()},
+        "mean_took_ms": {name: round(total / len(queries), 1) for name, total in took.items()},
+        "field_bytes": sizes,
+        "int8_overhead": int8_overhead(sizes)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall@k of int8 quantized search against exact scoring.")
+    parser.add_argument("index", help="quantized index or alias")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--windows", default="10,50,100,200", help="comma-separated rescore window sizes")
+    parser.add_argument("--queries", type=int, default=100, help="chunks to sample as queries")
+    parser.add_argument("--query-file", help="one query per line instead of sampled chunks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--es-host", default=ES_HOST)
+    args = parser.parse_args()
+
+    es = Elasticsearch(args.es_host)
+    if not is_quantized(es, args.index):
+        raise SystemExit(f"'{args.index}' isn't quantized; migrate it with --quantize int8 first")
+    if args.query_file:
+        with open(args.query_file) as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = sample_queries(es, args.index, args.queries, args.seed)
+
+    windows = [int(w) for w in args.windows.split(",")]
+    result = report(es, args.index, get_encoder(), queries, args.k, windows)
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)